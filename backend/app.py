@@ -2,17 +2,32 @@ from __future__ import annotations
 
 import os
 import json
-import difflib
 import logging
-from typing import List, Dict, Any
+import time
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Tuple
 
-from flask import Flask, request, jsonify, abort, make_response
+from flask import Flask, current_app, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 from config import get_settings
 from routes import api_bp
+from routes.blobs import missing_blob_response, request_code
+from services.ai_cache import SemanticCache
+from services.ai_scheduler import AIScheduler, QuotaExceeded, estimate_tokens
+from services.blob_store import BlobMissing, create_blob_store
 from services.firebase_client import init_firebase_app
+from services.job_queue import JobQueue
+from services.lint_service import run_lint_checks
+from services.patch import make_patch
+from services.suggestion_service import request_suggestions
+from utils.compression import init_compression
+from utils.deadline import Deadline, DeadlineExceeded, current_deadline, init_deadlines
+from utils.profiling import init_profiling, parse_sample_rates, profiled
+from utils.supersede import CancelToken, Superseded, current_cancel_token, init_supersede, supersedable
+from utils.jwt_utils import is_admin, require_jwt
+from utils.metrics import REGISTRY, init_metrics, labels, record_stage, stage
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -59,98 +74,304 @@ def extract_assistant(resp: Any) -> str:
         return str(resp)
 
 
-def make_patch(original: str, fixed: str) -> str:
-    return "".join(
-        difflib.unified_diff(
-            original.splitlines(keepends=True),
-            fixed.splitlines(keepends=True),
-            fromfile="a/file",
-            tofile="b/file",
-        )
+def chat_completion(
+    prompt: List[Dict[str, str]],
+    temperature: float,
+    timeout: Optional[float] = None,
+    cancel: Optional[CancelToken] = None,
+) -> Any:
+    if openai_new_sdk:
+        # The SDK retries timeouts on its own; under a deadline there is no time for that
+        client = openai_client.with_options(timeout=timeout, max_retries=0) if timeout is not None else openai_client
+        if cancel is None:
+            return client.chat.completions.create(
+                model="gpt-4o",
+                messages=prompt,
+                temperature=temperature
+            )
+        # Streamed so a newer revision can stop generation (and its billing) by closing the connection
+        parts = []
+        with client.chat.completions.create(model="gpt-4o", messages=prompt, temperature=temperature, stream=True) as stream:
+            for chunk in stream:
+                cancel.check("openai")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(parts)))])
+    extra = {"request_timeout": timeout} if timeout is not None else {}
+    response = openai_client.ChatCompletion.create(
+        model="gpt-4o",
+        messages=prompt,
+        temperature=temperature,
+        **extra
     )
+    if cancel is not None:
+        cancel.check("openai")
+    return response
+
+
+def scheduled_completion(
+    current_user: Dict[str, Any],
+    code: str,
+    prompt: List[Dict[str, str]],
+    temperature: float,
+    deadline: Optional[Deadline] = None,
+    cancel: Optional[CancelToken] = None,
+) -> Any:
+    scheduler: AIScheduler = current_app.config["AI_SCHEDULER"]
+    uid = current_user.get("uid") or "anonymous"
+    # Prompt plus an equally sized reply is what a formatting call typically costs.
+    cost = estimate_tokens(code, *(m["content"] for m in prompt)) + estimate_tokens(code)
+    queued_at = time.perf_counter()
+
+    def run():
+        record_stage("ai_queue", time.perf_counter() - queued_at)
+        timeout = deadline.timeout("openai") if deadline else None
+        if cancel is not None:
+            cancel.check("openai")
+        try:
+            with stage("openai", upstream="openai"):
+                return chat_completion(prompt, temperature, timeout, cancel)
+        except Superseded:
+            raise
+        except Exception as exc:
+            # Both SDKs raise their own timeout types; the deadline tells us what happened
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded("openai") from exc
+            raise
+
+    return scheduler.submit(uid, cost, run, deadline, cancel)
+
+
+def quota_response(exc: QuotaExceeded):
+    response = jsonify({
+        "error": "AI quota exceeded",
+        "reason": exc.reason,
+        "retryAfter": exc.retry_after,
+    })
+    response.status_code = 429
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+# responseMode -> fields dropped from the lint result (explanation is prose the caller did not ask for)
+RESPONSE_MODES = {
+    "full": (),
+    "patch": ("formatted_code", "explanation"),
+    "formatted": ("patch", "explanation"),
+}
+
+AI_TASKS = {
+    # name -> (prompt task, temperature, attach a unified diff of formatted_code, use the result cache)
+    # Only the deterministic (temperature 0) task is cached.
+    "lint": ("Fix formatting & lint issues", 0.0, True, True),
+    "suggest": ("Provide suggestions & improvements", 0.2, False, False),
+}
+
+
+def run_ai_task(current_user: Dict[str, Any], body: Dict[str, Any], name: str) -> Tuple[Dict[str, Any], int]:
+    """Run one AI task and return ``(response body, status)``; raises ``QuotaExceeded``."""
+    code = body.get("code", "")
+    language = body.get("language", "python")
+    mode = body.get("responseMode", "full")
+
+    if not code:
+        return {"error": "code is required"}, 400
+    if mode not in RESPONSE_MODES:
+        return {"error": f"responseMode must be one of: {', '.join(RESPONSE_MODES)}"}, 400
+
+    task, temperature, with_patch, cacheable = AI_TASKS[name]
+    deadline = current_deadline()
+    cache: SemanticCache = current_app.config["AI_CACHE"]
+    owner = current_user.get("uid") or "anonymous"
+    hit = None
+    if cacheable:
+        with stage("ai_cache"):
+            hit = cache.lookup(code, language, owner)
+
+    if hit is not None:
+        output, level = hit
+        output["cache"] = level
+    else:
+        prompt = build_prompt(code, task, language)
+        try:
+            resp = scheduled_completion(current_user, code, prompt, temperature, deadline, current_cancel_token())
+        except DeadlineExceeded as exc:
+            return {"error": "Deadline exceeded", "partial": True, "skipped": [exc.stage]}, 504
+        raw = extract_assistant(resp)
 
+        try:
+            with stage("parse"):
+                output = json.loads(
+                    raw.strip().removeprefix("```json").removesuffix("```").strip()
+                )
+        except Exception:
+            return {"error": "Bad response from AI", "raw": raw}, 500
+        if cacheable:
+            cache.store(code, language, output, owner)
 
-# ------------------ Flask App ------------------
-def create_app() -> Flask:
-    app = Flask(__name__)
-    settings = get_settings()
-    app.config["SETTINGS"] = settings
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    if with_patch and mode != "formatted" and output.get("formatted_code"):
+        try:
+            with stage("patch"):
+                output["patch"] = make_patch(code, output["formatted_code"], deadline)
+        except DeadlineExceeded as exc:
+            output["partial"] = True
+            output["skipped"] = [exc.stage]
 
-    app.register_blueprint(api_bp)
+    for dropped in RESPONSE_MODES[mode]:
+        output.pop(dropped, None)
+    return output, 200
 
-    @app.route("/api/lint", methods=["POST"])
-    def lint():
-        body = request.get_json(force=True)
-        code = body.get("code", "")
-        language = body.get("language", "python")
 
-        if not code:
-            return abort(make_response(jsonify({"error": "code is required"}), 400))
+def _ai_job(name: str):
+    def handler(current_user: Dict[str, Any], body: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        try:
+            return run_ai_task(current_user, body, name)
+        except QuotaExceeded as exc:
+            return {"error": "AI quota exceeded", "reason": exc.reason, "retryAfter": exc.retry_after}, 429
 
-        prompt = build_prompt(code, "Fix formatting & lint issues", language)
+    return handler
 
-        if openai_new_sdk:
-            resp = openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=prompt,
-                temperature=0.0
-            )
-        else:
-            resp = openai_client.ChatCompletion.create(
-                model="gpt-4o",
-                messages=prompt,
-                temperature=0.0
-            )
 
-        raw = extract_assistant(resp)
+def _lint_job(current_user: Dict[str, Any], body: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    return {"lintReport": run_lint_checks(body["code"], body.get("language", "javascript"))}, 200
 
-        try:
-            output = json.loads(
-                raw.strip().removeprefix("```json").removesuffix("```").strip()
-            )
-        except Exception:
-            return jsonify({"error": "Bad response from AI", "raw": raw}), 500
 
-        if output.get("formatted_code"):
-            output["patch"] = make_patch(code, output["formatted_code"])
+def _suggestion_job(current_user: Dict[str, Any], body: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    suggestions = request_suggestions(body["code"], body.get("lintReport", []), body.get("language", "javascript"))
+    return {"suggestions": suggestions}, 200
 
-        return jsonify(output)
 
-    @app.route("/api/suggest", methods=["POST"])
-    def suggest():
-        body = request.get_json(force=True)
-        code = body.get("code", "")
-        language = body.get("language", "python")
+def _register_scheduler_metrics(scheduler: AIScheduler) -> None:
+    REGISTRY.gauge_callback(
+        "kingpins_ai_queue_depth",
+        "AI calls waiting for a slot.",
+        lambda: {labels(): scheduler.stats()["queued"]},
+    )
+    REGISTRY.gauge_callback(
+        "kingpins_ai_active_calls",
+        "AI calls currently running.",
+        lambda: {labels(): scheduler.stats()["active"]},
+    )
+    REGISTRY.gauge_callback(
+        "kingpins_ai_rejections_total",
+        "AI calls rejected for quota.",
+        lambda: {labels(): scheduler.stats()["rejected"]},
+        kind="counter",
+    )
 
-        if not code:
-            return abort(make_response(jsonify({"error": "code is required"}), 400))
 
-        prompt = build_prompt(code, "Provide suggestions & improvements", language)
+def _register_cache_metrics(cache: SemanticCache) -> None:
+    REGISTRY.gauge_callback(
+        "kingpins_ai_cache_lookups_total",
+        "AI lint cache lookups by result (exact, normalized, miss, rejected).",
+        lambda: {
+            labels(result=result): cache.stats()[key]
+            for result, key in (("exact", "exactHits"), ("normalized", "normalizedHits"), ("miss", "misses"), ("rejected", "rejected"))
+        },
+        kind="counter",
+    )
 
-        if openai_new_sdk:
-            resp = openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=prompt,
-                temperature=0.2
-            )
-        else:
-            resp = openai_client.ChatCompletion.create(
-                model="gpt-4o",
-                messages=prompt,
-                temperature=0.2
-            )
 
-        raw = extract_assistant(resp)
+def _register_job_metrics(job_queue: JobQueue) -> None:
+    REGISTRY.gauge_callback(
+        "kingpins_jobs",
+        "Background jobs held by this process, by status.",
+        lambda: {labels(status=status): count for status, count in job_queue.stats()["jobs"].items()},
+    )
 
-        try:
-            output = json.loads(
-                raw.strip().removeprefix("```json").removesuffix("```").strip()
-            )
-        except Exception:
-            return jsonify({"error": "Bad response from AI", "raw": raw}), 500
 
-        return jsonify(output)
+# ------------------ Flask App ------------------
+def create_app() -> Flask:
+    app = Flask(__name__)
+    settings = get_settings()
+    settings.assert_debug_allowed(app.debug)
+    app.config["SETTINGS"] = settings
+    app.config["AI_SCHEDULER"] = AIScheduler(
+        max_concurrency=settings.ai_max_concurrency,
+        requests_per_minute=settings.ai_user_requests_per_minute,
+        tokens_per_minute=settings.ai_user_tokens_per_minute,
+        max_queue_per_user=settings.ai_user_max_queue,
+        queue_timeout=settings.ai_queue_timeout,
+    )
+    app.config["AI_CACHE"] = SemanticCache(
+        max_entries=settings.ai_cache_entries,
+        rename_identifiers=settings.ai_cache_rename_identifiers,
+    )
+    job_queue = JobQueue(
+        workers=settings.job_workers,
+        result_ttl=settings.job_result_ttl,
+        max_pending=settings.job_max_pending,
+        context_factory=app.app_context,
+    )
+    job_queue.register("lint", _lint_job)
+    job_queue.register("suggest", _suggestion_job)
+    job_queue.register("ai_lint", _ai_job("lint"))
+    job_queue.register("ai_suggest", _ai_job("suggest"))
+    app.config["JOB_QUEUE"] = job_queue
+    app.config["BLOB_STORE"] = create_blob_store(
+        settings.blob_store_backend,
+        max_bytes=settings.blob_max_bytes,
+        ttl=settings.blob_ttl,
+        path=settings.blob_store_path,
+        redis_url=settings.preview_redis_url,
+    )
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    init_metrics(app, "api")
+    init_deadlines(app, settings.request_deadline, settings.request_deadline_max)
+    init_profiling(
+        app,
+        max_entries=settings.profile_max_entries,
+        sample_rates=parse_sample_rates(settings.profile_sample_rates),
+        sample_mode=settings.profile_sample_mode,
+    )
+    init_supersede(app)
+    # Registered after metrics so compression time lands in Server-Timing
+    init_compression(app, settings.compress_min_bytes)
+    _register_scheduler_metrics(app.config["AI_SCHEDULER"])
+    _register_cache_metrics(app.config["AI_CACHE"])
+    _register_job_metrics(job_queue)
+
+    app.register_blueprint(api_bp)
+
+    # The blueprint owns /api/lint and /api/suggest (linters and CodeT5); the OpenAI-backed
+    # variants get their own paths so the scheduler, cache and cancellation actually run.
+    @app.route("/api/ai/lint", methods=["POST"])
+    @require_jwt
+    @profiled("ai_lint")
+    @supersedable("ai_lint")
+    def ai_lint(current_user):
+        body = request.get_json(force=True)
+        try:
+            body = {**body, "code": request_code(current_user, body)}
+            output, status = run_ai_task(current_user, body, "lint")
+        except BlobMissing as exc:
+            return missing_blob_response(exc)
+        except QuotaExceeded as exc:
+            return quota_response(exc)
+        return jsonify(output), status
+
+    @app.route("/api/ai/suggest", methods=["POST"])
+    @require_jwt
+    @profiled("ai_suggest")
+    @supersedable("ai_suggest")
+    def ai_suggest(current_user):
+        body = request.get_json(force=True)
+        try:
+            body = {**body, "code": request_code(current_user, body)}
+            output, status = run_ai_task(current_user, body, "suggest")
+        except BlobMissing as exc:
+            return missing_blob_response(exc)
+        except QuotaExceeded as exc:
+            return quota_response(exc)
+        return jsonify(output), status
+
+    @app.route("/api/ai/stats")
+    @require_jwt
+    def ai_stats(current_user):
+        scheduler: AIScheduler = app.config["AI_SCHEDULER"]
+        if is_admin(current_user):
+            return jsonify({**scheduler.stats(), "cache": app.config["AI_CACHE"].stats()})
+        return jsonify(scheduler.stats(current_user.get("uid")))
 
     @app.route("/api/health")
     def health():
@@ -165,4 +386,7 @@ def create_app() -> Flask:
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Development only; production runs under gunicorn via ``python serve.py api``.
+    from serve import run_development_server
+
+    run_development_server(app, port=5000)
@@ -0,0 +1,331 @@
+"""Local stand-ins for every upstream the backend talks to, with configurable latency.
+
+* ``FakeOpenAIServer`` - HTTP server answering ``POST /v1/chat/completions``
+  (streamed as server-sent events when the request asks for ``stream``).
+* ``FakeSuggestionServer`` - the CodeT5 service behind ``SUGGESTION_SERVICE_URL``.
+* ``FakeRespServer`` - a Redis-protocol server for the ``redis`` preview store.
+* ``FakeFirebaseAuth`` / ``FakeFirestore`` - in-process Admin SDK replacements,
+  installed with ``install_fake_firebase``.
+"""
+
+from __future__ import annotations
+
+import json
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+class _Latency:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def sleep(self) -> None:
+        if self.seconds > 0:
+            time.sleep(self.seconds)
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_FakeHTTPServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - silence access log
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self, status: int, events: List[Dict[str, Any]]) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for event in events:
+                self.wfile.write(b"data: %s\n\n" % json.dumps(event).encode("utf-8"))
+                self.wfile.flush()
+                self.server.stream_latency.sleep()
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.streams_aborted += 1
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+        self.server.latency.sleep()
+        self.server.requests += 1
+        status, response = self.server.respond(self.path, payload)
+        if isinstance(response, list):
+            self._send_events(status, response)
+        else:
+            self._send_json(status, response)
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float, stream_interval: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _JsonHandler)
+        self.latency = _Latency(latency)
+        # Pause between streamed events
+        self.stream_latency = _Latency(stream_interval)
+        self.requests = 0
+        self.streams_aborted = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(self, path: str, payload: Dict[str, Any]):
+        raise NotImplementedError
+
+    def start(self) -> "_FakeHTTPServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class FakeOpenAIServer(_FakeHTTPServer):
+    """Returns a well-formed lint/format reply for any chat completion request."""
+
+    # Characters of the reply per streamed chunk
+    STREAM_CHUNK = 16
+
+    def respond(self, path: str, payload: Dict[str, Any]):
+        if not path.endswith("/chat/completions"):
+            return 404, {"error": {"message": f"unknown path {path}"}}
+        prompt = "\n".join(message.get("content", "") for message in payload.get("messages", []))
+        content = json.dumps({
+            "formatted_code": prompt.split("CODE:", 1)[-1].strip() + "\n",
+            "issues": [],
+            "suggestions": ["Benchmark stand-in suggestion"],
+            "explanation": "Generated by the fake OpenAI server.",
+        })
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        if payload.get("stream"):
+            return 200, [
+                {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": payload.get("model", "gpt-4o"),
+                    "choices": [{"index": 0, "finish_reason": None, "delta": {"content": content[start:start + self.STREAM_CHUNK]}}],
+                }
+                for start in range(0, len(content), self.STREAM_CHUNK)
+            ]
+        return 200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(prompt) + len(content)) // 4},
+        }
+
+
+class FakeSuggestionServer(_FakeHTTPServer):
+    """CodeT5 inference stand-in answering ``POST /api/generate``."""
+
+    def respond(self, path: str, payload: Dict[str, Any]):
+        code = payload.get("code", "")
+        return 200, {
+            "suggestions": [{
+                "line": 1,
+                "message": "Benchmark stand-in suggestion",
+                "replacement": code.splitlines()[0] if code else "",
+            }],
+            "metadata": {"status": "ok", "model": payload.get("model")},
+        }
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    server: "FakeRespServer"
+
+    def _bulk(self, value: Optional[bytes]) -> bytes:
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self) -> None:
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.server.latency.sleep()
+            self.wfile.write(self.server.execute(args, self._bulk))
+
+
+class FakeRespServer(socketserver.ThreadingTCPServer):
+    """Tiny in-memory Redis-protocol server supporting what ``RedisPreviewStore`` uses."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _RespHandler)
+        self.latency = _Latency(latency)
+        self._data: Dict[bytes, bytes] = {}
+        self._expires: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    def execute(self, args, bulk) -> bytes:
+        command = args[0].upper()
+        with self._lock:
+            if command == b"PING":
+                return b"+PONG\r\n"
+            if command == b"SET":
+                self._data[args[1]] = args[2]
+                self._expires.pop(args[1], None)
+                if len(args) >= 5 and args[3].upper() == b"PX":
+                    self._expires[args[1]] = time.time() + int(args[4]) / 1000
+                return b"+OK\r\n"
+            if command == b"GET":
+                return bulk(self._live(args[1]))
+            if command == b"MGET":
+                return b"*%d\r\n" % (len(args) - 1) + b"".join(bulk(self._live(key)) for key in args[1:])
+            if command == b"DEL":
+                removed = sum(self._data.pop(key, None) is not None for key in args[1:])
+                return b":%d\r\n" % removed
+            if command in (b"INCR", b"INCRBY"):
+                value = int(self._live(args[1]) or b"0") + (int(args[2]) if command == b"INCRBY" else 1)
+                self._data[args[1]] = str(value).encode()
+                return b":%d\r\n" % value
+            if command == b"INFO":
+                used = sum(len(key) + len(value) for key, value in self._data.items())
+                return bulk(f"# Memory\r\nused_memory:{used}\r\n".encode())
+        return b"-ERR unknown command '%s'\r\n" % command
+
+    def start(self) -> "FakeRespServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _FakeDocument:
+    def __init__(self, store: "FakeFirestore", path: str):
+        self._store = store
+        self._path = path
+
+    def get(self):
+        self._store.latency.sleep()
+        with self._store.lock:
+            data = self._store.documents.get(self._path)
+        return SimpleNamespace(exists=data is not None, to_dict=lambda: dict(data or {}))
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        self._store.latency.sleep()
+        with self._store.lock:
+            existing = self._store.documents.get(self._path, {}) if merge else {}
+            self._store.documents[self._path] = {**existing, **data}
+
+
+class _FakeCollection:
+    def __init__(self, store: "FakeFirestore", name: str):
+        self._store = store
+        self._name = name
+
+    def document(self, doc_id: str) -> _FakeDocument:
+        return _FakeDocument(self._store, f"{self._name}/{doc_id}")
+
+
+class FakeFirestore:
+    """Dict-backed Firestore client covering ``collection().document().get/set``."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = _Latency(latency)
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def collection(self, name: str) -> _FakeCollection:
+        return _FakeCollection(self, name)
+
+
+class FakeFirebaseAuth:
+    """Admin SDK ``auth`` stand-in; ID tokens are simply ``"fake-id-token:<uid>"``."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = _Latency(latency)
+
+    @staticmethod
+    def id_token_for(uid: str) -> str:
+        return f"fake-id-token:{uid}"
+
+    def verify_id_token(self, id_token: str) -> Dict[str, Any]:
+        self.latency.sleep()
+        prefix, _, uid = id_token.partition(":")
+        if prefix != "fake-id-token" or not uid:
+            from firebase_admin import auth as fb_auth
+
+            raise fb_auth.InvalidIdTokenError("Token was not issued by the benchmark stand-in")
+        return {"uid": uid, "auth_time": int(time.time())}
+
+    def get_user(self, uid: str):
+        self.latency.sleep()
+        return SimpleNamespace(
+            uid=uid,
+            email=f"{uid}@bench.local",
+            display_name=f"Bench {uid}",
+            email_verified=True,
+            user_metadata=SimpleNamespace(creation_timestamp=int(time.time() * 1000)),
+        )
+
+    def create_user(self, email: str, password: str, display_name: str):
+        return self.get_user(email.split("@", 1)[0])
+
+
+def install_fake_firebase(auth_latency: float = 0.0, firestore_latency: float = 0.0):
+    """Point the Firebase helpers (and the modules that imported them) at local fakes.
+
+    Must run before ``app`` is imported, because importing it initializes Firebase.
+    """
+    import routes.auth as auth_routes
+    import services.firebase_client as firebase_client
+
+    fake_auth = FakeFirebaseAuth(auth_latency)
+    fake_firestore = FakeFirestore(firestore_latency)
+    firebase_client.init_firebase_app = lambda: None
+    firebase_client.get_auth_client = lambda: fake_auth
+    firebase_client.get_firestore_client = lambda: fake_firestore
+    auth_routes.get_auth_client = firebase_client.get_auth_client
+    return fake_auth, fake_firestore
@@ -0,0 +1,376 @@
+"""Offline throughput benchmark for the lint engines behind ``run_lint_checks``.
+
+Generates a deterministic corpus of Python, JavaScript, CSS and HTML files from
+1 KB to 1 MB (or reads a real directory with ``--corpus``), lints every file with
+each engine in a fresh process and prints a JSON report per engine: files/sec,
+per-file latency distribution (overall, cold first run, warm repeats, per
+language and per size), CPU time of the process and of the linters it spawned,
+and peak RSS. Warm repeats show what the shared ``Document`` cache saves.
+
+Run from ``backend/``::
+
+    python -m benchmarks.lint_engines --output lint-engines.json
+    python -m benchmarks.lint_engines --engines native --sizes 1k,1m --repeat 5
+    python -m benchmarks.lint_engines --corpus ../frontend/src --baseline lint-engines.json
+    python -m benchmarks.lint_engines --write-corpus /tmp/corpus   # dump the corpus and exit
+
+Without pylint/eslint on ``PATH`` the ``subprocess`` engine answers with its
+placeholder result; those files are counted under ``placeholders`` so such runs
+are not mistaken for real linter numbers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.load import _git_revision, percentile
+from lint_cli import DEFAULT_EXCLUDES, iter_source_files
+from services.lint_service import ENGINES, TOOLS, is_placeholder, language_for_path, run_lint_checks
+
+try:
+    import resource
+except ImportError:  # Windows: no rusage, CPU and RSS are reported as null
+    resource = None
+
+LANGUAGES = ("python", "javascript", "css", "html")
+SUFFIXES = {"python": ".py", "javascript": ".js", "css": ".css", "html": ".html"}
+DEFAULT_SIZES = "1k,16k,128k,1m"
+SEED = 2024
+
+# One file is several of these blocks, varied by index and a seeded choice of issues
+_PYTHON_BLOCK = (
+    "import os\n"
+    "import json as json_{n}\n\n\n"
+    "class Handler{n}:\n"
+    "    def __init__(self, items):\n"
+    "        self.items = list(items)\n\n"
+    "    def total(self, factor={n}):\n"
+    "        unused_{n} = factor * 2\n"
+    "        result = 0\n"
+    "        for item in self.items:\n"
+    "           result += item * factor\n"
+    "        return result{trailing}\n\n\n"
+    "def build_{n}(values):\n"
+    "    return Handler{n}(value for value in values if value % {m} == 0)\n\n\n"
+)
+_JAVASCRIPT_BLOCK = (
+    "var counter{n} = {n};\n"
+    "function handler{n}(items) {{\n"
+    "  let total = 0;\n"
+    "  for (const item of items) {{\n"
+    "    if (item == {m}) {{\n"
+    "      console.log('matched', item);{trailing}\n"
+    "    }}\n"
+    "    total += item * counter{n};\n"
+    "  }}\n"
+    "  {debugger}return total;\n"
+    "}}\n"
+    "module.exports.handler{n} = handler{n}; // \"debugger\" in a comment is ignored\n\n"
+)
+_CSS_BLOCK = (
+    "/* section {n} {{ not a rule }} */\n"
+    ".card-{n} {{\n"
+    "  display: flex;\n"
+    "  margin: {m}px auto;{trailing}\n"
+    "  color: #{n:06x};\n"
+    "}}\n"
+    ".card-{n} .title {{ font-weight: bold; }}\n"
+    ".card-{n}:hover {{{empty}}}\n\n"
+)
+_HTML_BLOCK = (
+    "<section id=\"s{n}\" class=\"card\">\n"
+    "  <h2>Section {n}</h2>{trailing}\n"
+    "  <p>Paragraph {m} with <a href=\"#s{n}\">a link</a> and <em>emphasis</em>.</p>\n"
+    "  <img src=\"/img/{n}.png\"{alt}>\n"
+    "  <ul><li>one<li>two</ul>\n"
+    "  <div class=\"row\"><span>cell {n}</span>{unclosed}</div>\n"
+    "</section>\n"
+)
+
+
+def parse_size(value: str) -> int:
+    """``"16k"`` -> 16384, ``"1m"`` -> 1048576, plain numbers are bytes."""
+    value = value.strip().lower()
+    multiplier = {"k": 1024, "m": 1024 * 1024}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * multiplier)
+
+
+def _block(language: str, n: int, rng: random.Random) -> str:
+    trailing = "  " if rng.random() < 0.2 else ""
+    m = rng.randint(2, 9)
+    if language == "python":
+        return _PYTHON_BLOCK.format(n=n, m=m, trailing=trailing)
+    if language == "javascript":
+        return _JAVASCRIPT_BLOCK.format(n=n, m=m, trailing=trailing, debugger="debugger;\n  " if rng.random() < 0.1 else "")
+    if language == "css":
+        return _CSS_BLOCK.format(n=n, m=m, trailing=trailing, empty="" if rng.random() < 0.3 else " opacity: 0.9; ")
+    return _HTML_BLOCK.format(
+        n=n,
+        m=m,
+        trailing=trailing,
+        alt="" if rng.random() < 0.3 else f" alt=\"Figure {n}\"",
+        unclosed="<b>open" if rng.random() < 0.1 else "",
+    )
+
+
+def generate_source(language: str, size: int, seed: int) -> str:
+    """Deterministic ``language`` source of about ``size`` bytes with a sprinkling of lint findings."""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    length = 0
+    if language == "html":
+        parts.append("<!DOCTYPE html>\n<html>\n<head><title>Benchmark</title></head>\n<body>\n")
+    n = 0
+    while length < size:
+        block = _block(language, n, rng)
+        parts.append(block)
+        length += len(block)
+        n += 1
+    if language == "html":
+        parts.append("</body>\n</html>\n")
+    return "".join(parts)
+
+
+def build_corpus(sizes: List[int], files_per_size: int, languages: List[str]) -> List[Dict[str, Any]]:
+    corpus = []
+    for language in languages:
+        for size in sizes:
+            for index in range(files_per_size):
+                code = generate_source(language, size, seed=SEED + size * 31 + index * 7 + LANGUAGES.index(language))
+                corpus.append({
+                    "name": f"{language}-{size}-{index}{SUFFIXES[language]}",
+                    "language": language,
+                    "sizeBucket": size,
+                    "code": code,
+                })
+    return corpus
+
+
+def load_corpus(root: Path, languages: List[str]) -> List[Dict[str, Any]]:
+    """Real files under ``root``, bucketed by the smallest default size that holds them."""
+    buckets = sorted(parse_size(size) for size in DEFAULT_SIZES.split(","))
+    corpus = []
+    for path, _ in iter_source_files([root], DEFAULT_EXCLUDES):
+        language = language_for_path(path)
+        if language not in languages:
+            continue
+        code = path.read_text(encoding="utf-8", errors="replace")
+        size = len(code.encode("utf-8"))
+        corpus.append({
+            "name": str(path.relative_to(root)) if path != root else path.name,
+            "language": language,
+            "sizeBucket": next((bucket for bucket in buckets if size <= bucket), buckets[-1]),
+            "code": code,
+        })
+    return corpus
+
+
+def _summary(seconds: List[float]) -> Dict[str, float]:
+    ordered = sorted(seconds)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50": round(percentile(ordered, 50) * 1000, 3),
+        "p95": round(percentile(ordered, 95) * 1000, 3),
+        "p99": round(percentile(ordered, 99) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def _rss_bytes(kilobytes_or_bytes: int) -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return kilobytes_or_bytes if sys.platform == "darwin" else kilobytes_or_bytes * 1024
+
+
+def _usage() -> Optional[Tuple[Any, Any]]:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def measure_engine(engine: str, corpus: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    """Lint every file ``repeat`` times with ``engine`` in this process and summarize; run in a fresh process."""
+    before = _usage()
+    samples: List[Tuple[int, Dict[str, Any], float]] = []
+    findings = 0
+    placeholders = 0
+    started = time.perf_counter()
+    for item in corpus:
+        # Back-to-back repeats of the same text, like an editor re-linting an unchanged file
+        for run in range(repeat):
+            file_started = time.perf_counter()
+            report = run_lint_checks(item["code"], item["language"], engine=engine)
+            samples.append((run, item, time.perf_counter() - file_started))
+            if run == 0:
+                findings += len(report)
+                placeholders += is_placeholder(report)
+    wall = time.perf_counter() - started
+    after = _usage()
+
+    def select(**match: Any) -> List[float]:
+        return [elapsed for run, item, elapsed in samples if all(item[key] == value for key, value in match.items())]
+
+    result: Dict[str, Any] = {
+        "files": len(corpus),
+        "runs": len(samples),
+        "wallSeconds": round(wall, 4),
+        "filesPerSecond": round(len(samples) / wall, 2) if wall else 0.0,
+        "bytesPerSecond": round(sum(len(item["code"]) for _, item, _ in samples) / wall) if wall else 0,
+        "findings": findings,
+        "placeholders": placeholders,
+        "latencyMs": _summary([elapsed for _, _, elapsed in samples]),
+        "coldLatencyMs": _summary([elapsed for run, _, elapsed in samples if run == 0]),
+        "warmLatencyMs": _summary([elapsed for run, _, elapsed in samples if run > 0]),
+        "byLanguage": {
+            language: _summary(select(language=language))
+            for language in sorted({item["language"] for item in corpus})
+        },
+        "bySize": {
+            str(size): _summary(select(sizeBucket=size))
+            for size in sorted({item["sizeBucket"] for item in corpus})
+        },
+        "cpuSeconds": None,
+        "peakRssBytes": None,
+    }
+    if before is not None and after is not None:
+        (self_before, children_before), (self_after, children_after) = before, after
+        result["cpuSeconds"] = {
+            "user": round(self_after.ru_utime - self_before.ru_utime, 4),
+            "system": round(self_after.ru_stime - self_before.ru_stime, 4),
+            "childrenUser": round(children_after.ru_utime - children_before.ru_utime, 4),
+            "childrenSystem": round(children_after.ru_stime - children_before.ru_stime, 4),
+        }
+        result["peakRssBytes"] = {
+            # The corpus itself is already loaded at baseline
+            "baseline": _rss_bytes(self_before.ru_maxrss),
+            "process": _rss_bytes(self_after.ru_maxrss),
+            # Counts pages shared with this process at fork, so it is never below roughly ``baseline``
+            "largestChild": _rss_bytes(children_after.ru_maxrss) or None,
+        }
+    return result
+
+
+def _measure_in_child(engine: str, args: argparse.Namespace, queue: "multiprocessing.Queue") -> None:
+    try:
+        queue.put(("ok", measure_engine(engine, corpus_from_args(args), args.repeat)))
+    except Exception as exc:  # noqa: BLE001 - report the failure instead of hanging the parent
+        queue.put(("error", f"{type(exc).__name__}: {exc}"))
+
+
+def run_engine(engine: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Measure ``engine`` in a spawned process so caches and peak RSS do not carry over between engines."""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure_in_child, args=(engine, args, queue))
+    process.start()
+    status, payload = queue.get()
+    process.join()
+    if status != "ok":
+        raise RuntimeError(f"{engine} benchmark failed: {payload}")
+    return payload
+
+
+def corpus_from_args(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    languages = [language.strip() for language in args.languages.split(",") if language.strip()]
+    if args.corpus:
+        return load_corpus(Path(args.corpus), languages)
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    return build_corpus(sizes, args.files, languages)
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    lines = []
+    for name, current in report["engines"].items():
+        previous = baseline.get("engines", {}).get(name)
+        if not previous:
+            continue
+        fps_delta = (current["filesPerSecond"] / previous["filesPerSecond"] - 1) * 100 if previous["filesPerSecond"] else 0.0
+        p95_delta = (current["latencyMs"]["p95"] / previous["latencyMs"]["p95"] - 1) * 100 if previous["latencyMs"]["p95"] else 0.0
+        lines.append(
+            f"{name:12s} files/s {previous['filesPerSecond']:>9.1f} -> {current['filesPerSecond']:>9.1f} ({fps_delta:+6.1f}%)"
+            f"   p95 {previous['latencyMs']['p95']:>9.2f} -> {current['latencyMs']['p95']:>9.2f} ms ({p95_delta:+6.1f}%)"
+        )
+    return lines
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma-separated subset of " + ",".join(ENGINES))
+    parser.add_argument("--languages", default=",".join(LANGUAGES), help="comma-separated subset of " + ",".join(LANGUAGES))
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="file sizes of the generated corpus (k/m suffixes)")
+    parser.add_argument("--files", type=int, default=2, help="generated files per language and size")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per file; runs after the first are warm")
+    parser.add_argument("--corpus", help="benchmark the source files under this directory instead")
+    parser.add_argument("--write-corpus", metavar="DIR", help="write the generated corpus to DIR and exit")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+    unknown = (set(engines) - set(ENGINES)) | ({language.strip() for language in args.languages.split(",") if language.strip()} - set(LANGUAGES))
+    if unknown:
+        print(f"Unknown engines/languages: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    corpus = corpus_from_args(args)
+    if args.write_corpus:
+        target = Path(args.write_corpus)
+        target.mkdir(parents=True, exist_ok=True)
+        for item in corpus:
+            (target / item["name"]).write_text(item["code"], encoding="utf-8")
+        print(f"Wrote {len(corpus)} files to {target}", file=sys.stderr)
+        return 0
+    if not corpus:
+        print("No lintable files in the corpus", file=sys.stderr)
+        return 2
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "corpus": args.corpus or "generated",
+            "files": len(corpus),
+            "corpusBytes": sum(len(item["code"]) for item in corpus),
+            "repeat": args.repeat,
+            "tools": {tool: shutil.which(tool) for tool in TOOLS.values()},
+        },
+        "engines": {},
+    }
+    for engine in engines:
+        report["engines"][engine] = run_engine(engine, args)
+        result = report["engines"][engine]
+        note = f" ({result['placeholders']} placeholder results)" if result["placeholders"] else ""
+        print(f"{engine}: {result['filesPerSecond']} files/s, p95 {result['latencyMs']['p95']} ms{note}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            for line in compare(report, json.load(handle)):
+                print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""End-to-end load benchmark for the API app and the preview server.
+
+Boots ``create_app()`` and the preview server in-process on ephemeral ports with
+local stand-ins for OpenAI, the CodeT5 service and Firebase/Firestore, drives
+concurrent load against each endpoint and prints a JSON report (throughput and
+p50/p95/p99 latency per scenario) that can be diffed between releases. The
+``ai_lint``/``ai_suggest`` scenarios send distinct code each time so every request
+reaches the OpenAI stand-in.
+
+Run from ``backend/``::
+
+    python -m benchmarks.load --concurrency 16 --requests 500 --output bench.json
+    python -m benchmarks.load --baseline bench.json   # print deltas against a previous run
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from werkzeug.serving import make_server
+
+from benchmarks.fakes import FakeOpenAIServer, FakeRespServer, FakeSuggestionServer, install_fake_firebase
+
+SCENARIOS = ["auth_session", "lint", "suggest", "ai_lint", "ai_suggest", "preview_post", "preview_view", "preview_revalidate"]
+# Scenarios that must reach the OpenAI stand-in; the run fails if none of their requests did
+AI_SCENARIOS = {"ai_lint", "ai_suggest"}
+
+
+def sample_code(size: int) -> str:
+    """Python source of roughly ``size`` bytes with a few lint-worthy issues."""
+    block = (
+        "import os\n"
+        "def handler_{n}(items):\n"
+        "    unused_{n} = 1\n"
+        "    total = 0\n"
+        "    for item in items:\n"
+        "        total += item * {n}\n"
+        "    return total\n\n"
+    )
+    parts = []
+    n = 0
+    while sum(map(len, parts)) < size:
+        parts.append(block.format(n=n))
+        n += 1
+    return "".join(parts)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class _ServerThread:
+    def __init__(self, wsgi_app):
+        self.server = make_server("127.0.0.1", 0, wsgi_app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "_ServerThread":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+
+def run_scenario(
+    total: int,
+    concurrency: int,
+    request_fn: Callable[[requests.Session, int], requests.Response],
+    setup_fn: Optional[Callable[[requests.Session, int], None]] = None,
+) -> Dict[str, Any]:
+    """Issue ``total`` requests from ``concurrency`` workers and summarize latencies."""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker(worker_id: int) -> None:
+        session = requests.Session()
+        if setup_fn:
+            setup_fn(session, worker_id)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            started = time.perf_counter()
+            try:
+                response = request_fn(session, worker_id)
+                status = response.status_code
+                response.content  # noqa: B018 - make sure the whole body was received
+            except requests.RequestException as exc:
+                status = type(exc).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not isinstance(status, int) or status >= 400:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        "errorsByStatus": errors,
+        "wallSeconds": round(wall, 4),
+        "throughputRps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latencyMs": {
+            "mean": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+            "p50": round(percentile(ordered, 50) * 1000, 3),
+            "p95": round(percentile(ordered, 95) * 1000, 3),
+            "p99": round(percentile(ordered, 99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    lines = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        rps_delta = (current["throughputRps"] / previous["throughputRps"] - 1) * 100 if previous["throughputRps"] else 0.0
+        p95_delta = (current["latencyMs"]["p95"] / previous["latencyMs"]["p95"] - 1) * 100 if previous["latencyMs"]["p95"] else 0.0
+        lines.append(
+            f"{name:20s} rps {previous['throughputRps']:>9.1f} -> {current['throughputRps']:>9.1f} ({rps_delta:+6.1f}%)"
+            f"   p95 {previous['latencyMs']['p95']:>8.2f} -> {current['latencyMs']['p95']:>8.2f} ms ({p95_delta:+6.1f}%)"
+        )
+    return lines
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--users", type=int, default=8, help="distinct JWT users spread over the workers")
+    parser.add_argument("--code-size", type=int, default=4096, help="bytes of source per request")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--suggestion-latency", type=float, default=0.02, help="seconds")
+    parser.add_argument("--firebase-latency", type=float, default=0.01, help="seconds per Auth/Firestore call")
+    parser.add_argument("--preview-store", choices=["memory", "sqlite", "redis"], default="memory")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    # Per-request access logs would dominate the run time.
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    openai_fake = FakeOpenAIServer(args.openai_latency).start()
+    suggestion_fake = FakeSuggestionServer(args.suggestion_latency).start()
+    resp_fake = FakeRespServer().start() if args.preview_store == "redis" else None
+
+    # Configuration is read at import time, so the environment must be set first.
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["OPENAI_BASE_URL"] = f"{openai_fake.url}/v1"
+    os.environ["SUGGESTION_SERVICE_URL"] = f"{suggestion_fake.url}/api/generate"
+    os.environ["PREVIEW_STORE"] = args.preview_store
+    # Measure the AI path, not the per-user quotas: without these most AI requests would be 429s
+    os.environ.setdefault("AI_USER_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("AI_USER_TOKENS_PER_MINUTE", "1000000000")
+    os.environ.setdefault("AI_USER_MAX_QUEUE", str(max(4, args.concurrency)))
+    if resp_fake is not None:
+        os.environ["PREVIEW_REDIS_URL"] = resp_fake.url
+    fake_auth, _ = install_fake_firebase(args.firebase_latency, args.firebase_latency)
+
+    import app as api_module
+    import preview_server
+    from utils.jwt_utils import generate_jwt
+
+    api = _ServerThread(api_module.app).start()
+    preview = _ServerThread(preview_server.app).start()
+
+    with api_module.app.app_context():
+        tokens = [generate_jwt({"uid": f"bench-user-{i}"}) for i in range(max(1, args.users))]
+
+    code = sample_code(args.code_size)
+
+    def auth_headers(worker_id: int) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {tokens[worker_id % len(tokens)]}"}
+
+    serial = itertools.count()
+
+    def unique_code() -> str:
+        # A distinct token stream per request, so the AI lint cache cannot answer instead of OpenAI
+        return f"{code}REQUEST_{next(serial)} = 1\n"
+
+    def post_ai(session: requests.Session, worker_id: int, task: str) -> requests.Response:
+        return session.post(f"{api.url}/api/ai/{task}", json={"code": unique_code(), "language": "python"}, headers=auth_headers(worker_id))
+
+    def post_preview(session: requests.Session, worker_id: int) -> requests.Response:
+        return session.post(
+            f"{preview.url}/preview",
+            json={"code": code, "filename": "bench.html", "type": "html", "preview_id": f"bench-{worker_id}"},
+            headers=auth_headers(worker_id),
+        )
+
+    def setup_view(session: requests.Session, worker_id: int) -> None:
+        preview_ids[worker_id] = post_preview(session, worker_id).json()["preview_id"]
+
+    preview_ids: Dict[int, str] = {}
+    etags: Dict[int, str] = {}
+
+    def setup_revalidate(session: requests.Session, worker_id: int) -> None:
+        setup_view(session, worker_id)
+        response = session.get(f"{preview.url}/view", params={"preview_id": preview_ids[worker_id]})
+        etags[worker_id] = response.headers.get("ETag", "")
+
+    plans = {
+        "auth_session": (lambda s, w: s.post(f"{api.url}/api/auth/session", json={"idToken": fake_auth.id_token_for(f"bench-user-{w}")}), None),
+        "lint": (lambda s, w: s.post(f"{api.url}/api/lint", json={"code": code, "language": "python"}, headers=auth_headers(w)), None),
+        "suggest": (lambda s, w: s.post(f"{api.url}/api/suggest", json={"code": code, "language": "python", "lintReport": []}, headers=auth_headers(w)), None),
+        "ai_lint": (lambda s, w: post_ai(s, w, "lint"), None),
+        "ai_suggest": (lambda s, w: post_ai(s, w, "suggest"), None),
+        "preview_post": (post_preview, None),
+        "preview_view": (
+            lambda s, w: s.get(f"{preview.url}/view", params={"preview_id": preview_ids[w]}, headers={"Accept-Encoding": "gzip"}),
+            setup_view,
+        ),
+        "preview_revalidate": (
+            lambda s, w: s.get(f"{preview.url}/view", params={"preview_id": preview_ids[w]}, headers={"If-None-Match": etags[w]}),
+            setup_revalidate,
+        ),
+    }
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "requestsPerScenario": args.requests,
+            "codeBytes": len(code),
+            "previewStore": args.preview_store,
+            "upstreamLatency": {
+                "openai": args.openai_latency,
+                "suggestion": args.suggestion_latency,
+                "firebase": args.firebase_latency,
+            },
+            "aiQuota": {
+                "requestsPerMinute": float(os.environ["AI_USER_REQUESTS_PER_MINUTE"]),
+                "tokensPerMinute": float(os.environ["AI_USER_TOKENS_PER_MINUTE"]),
+                "maxQueue": int(os.environ["AI_USER_MAX_QUEUE"]),
+            },
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in scenarios:
+            request_fn, setup_fn = plans[name]
+            report["scenarios"][name] = run_scenario(args.requests, args.concurrency, request_fn, setup_fn)
+            print(f"{name}: {report['scenarios'][name]['throughputRps']} req/s", file=sys.stderr)
+        report["meta"]["upstreamRequests"] = {"openai": openai_fake.requests, "suggestion": suggestion_fake.requests}
+    finally:
+        api.stop()
+        preview.stop()
+        openai_fake.stop()
+        suggestion_fake.stop()
+        if resp_fake is not None:
+            resp_fake.stop()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            for line in compare(report, json.load(handle)):
+                print(line, file=sys.stderr)
+    if AI_SCENARIOS & set(scenarios) and not openai_fake.requests:
+        print("The AI scenarios never reached the OpenAI stand-in; the AI path was not measured", file=sys.stderr)
+        return 1
+    return 0 if all(result["errors"] == 0 for result in report["scenarios"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -28,12 +28,55 @@ class Settings:
     firebase_credentials_json: Optional[Dict[str, Any]]
     firebase_api_key: Optional[str]
     firestore_default_collection: str = "projects"
+    app_env: str = field(default_factory=lambda: os.getenv("APP_ENV", "development").lower())
     jwt_secret: str = field(default_factory=lambda: os.getenv("JWT_SECRET", "change-me"))
     jwt_expires_in: int = field(default_factory=lambda: int(os.getenv("JWT_EXPIRES_IN", "3600")))
     cors_origins: List[str] = field(
         default_factory=lambda: os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:3000").split(",")
     )
     suggestion_service_url: str = field(default_factory=lambda: os.getenv("SUGGESTION_SERVICE_URL", "http://localhost:8000/api/generate"))
+    admin_uids: List[str] = field(
+        default_factory=lambda: [uid for uid in os.getenv("ADMIN_UIDS", "").split(",") if uid]
+    )
+    preview_max_bytes: int = field(default_factory=lambda: int(os.getenv("PREVIEW_MAX_BYTES", str(64 * 1024 * 1024))))
+    preview_ttl: float = field(default_factory=lambda: float(os.getenv("PREVIEW_TTL", "3600")))
+    preview_store_backend: str = field(default_factory=lambda: os.getenv("PREVIEW_STORE", "memory"))
+    preview_store_path: Optional[str] = field(default_factory=lambda: os.getenv("PREVIEW_STORE_PATH"))
+    preview_events_poll: float = field(default_factory=lambda: float(os.getenv("PREVIEW_EVENTS_POLL", "1.0")))
+    preview_events_max_streams: int = field(default_factory=lambda: int(os.getenv("PREVIEW_EVENTS_MAX_STREAMS", "24")))
+    preview_events_max_age: float = field(default_factory=lambda: float(os.getenv("PREVIEW_EVENTS_MAX_AGE", "300")))
+    preview_redis_url: str = field(default_factory=lambda: os.getenv("PREVIEW_REDIS_URL", "redis://localhost:6379/0"))
+    blob_store_backend: str = field(default_factory=lambda: os.getenv("BLOB_STORE", "memory"))
+    blob_store_path: Optional[str] = field(default_factory=lambda: os.getenv("BLOB_STORE_PATH"))
+    blob_max_bytes: int = field(default_factory=lambda: int(os.getenv("BLOB_MAX_BYTES", str(32 * 1024 * 1024))))
+    blob_ttl: float = field(default_factory=lambda: float(os.getenv("BLOB_TTL", "900")))
+    ai_max_concurrency: int = field(default_factory=lambda: int(os.getenv("AI_MAX_CONCURRENCY", "4")))
+    ai_user_requests_per_minute: float = field(default_factory=lambda: float(os.getenv("AI_USER_REQUESTS_PER_MINUTE", "30")))
+    ai_user_tokens_per_minute: float = field(default_factory=lambda: float(os.getenv("AI_USER_TOKENS_PER_MINUTE", "60000")))
+    ai_user_max_queue: int = field(default_factory=lambda: int(os.getenv("AI_USER_MAX_QUEUE", "4")))
+    ai_queue_timeout: float = field(default_factory=lambda: float(os.getenv("AI_QUEUE_TIMEOUT", "60")))
+    ai_cache_entries: int = field(default_factory=lambda: int(os.getenv("AI_CACHE_ENTRIES", "512")))
+    ai_cache_rename_identifiers: bool = field(
+        default_factory=lambda: os.getenv("AI_CACHE_RENAME_IDENTIFIERS", "0").lower() in ("1", "true", "yes")
+    )
+    request_deadline: float = field(default_factory=lambda: float(os.getenv("REQUEST_DEADLINE", "30")))
+    request_deadline_max: float = field(default_factory=lambda: float(os.getenv("REQUEST_DEADLINE_MAX", "120")))
+    profile_sample_rates: str = field(default_factory=lambda: os.getenv("PROFILE_SAMPLE_RATES", ""))
+    profile_sample_mode: str = field(default_factory=lambda: os.getenv("PROFILE_SAMPLE_MODE", "cpu"))
+    profile_max_entries: int = field(default_factory=lambda: int(os.getenv("PROFILE_MAX_ENTRIES", "100")))
+    compress_min_bytes: int = field(default_factory=lambda: int(os.getenv("COMPRESS_MIN_BYTES", "1024")))
+    job_workers: int = field(default_factory=lambda: int(os.getenv("JOB_WORKERS", "4")))
+    job_result_ttl: float = field(default_factory=lambda: float(os.getenv("JOB_RESULT_TTL", "600")))
+    job_max_pending: int = field(default_factory=lambda: int(os.getenv("JOB_MAX_PENDING", "100")))
+
+    @property
+    def is_production(self) -> bool:
+        return self.app_env == "production"
+
+    def assert_debug_allowed(self, debug: bool) -> None:
+        """The Werkzeug debugger executes arbitrary code, so it must never run in production."""
+        if debug and self.is_production:
+            raise RuntimeError("Debug mode is not allowed with APP_ENV=production; start the server with serve.py.")
 
 
 def get_settings() -> Settings:
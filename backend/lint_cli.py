@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Headless lint runner for CI and pre-commit, using the same engine as ``/api/lint``.
+
+    python lint_cli.py ../frontend ../backend
+    python lint_cli.py src --format sarif --output lint.sarif
+    python lint_cli.py src --engine native --jobs 8 --fail-on warning
+
+Files are linted in parallel worker processes. Results are cached on disk by
+content hash (``.kingpins-lint-cache.json`` in the current directory by default),
+and files whose size and modification time are unchanged are not even re-read,
+so a warm rerun only has to stat the tree.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.lint_service import ENGINES, TOOLS, is_placeholder, language_for_path, resolve_engine, run_lint_checks
+from services.native_lint import ENGINE_VERSION
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT = 1
+DEFAULT_CACHE = ".kingpins-lint-cache.json"
+DEFAULT_EXCLUDES = [".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", "dist", "build", ".tox", ".mypy_cache"]
+SEVERITY_RANK = {"info": 0, "warning": 1, "error": 2}
+SARIF_LEVELS = {"error": "error", "warning": "warning", "info": "note"}
+# Below this many files a process pool costs more to start than it saves
+MIN_PARALLEL_FILES = 8
+
+
+def iter_source_files(roots: List[Path], excludes: List[str]) -> Iterator[Tuple[Path, os.stat_result]]:
+    """Yield lintable files under ``roots`` with their stat, skipping excluded names."""
+    for root in roots:
+        if root.is_file():
+            if language_for_path(root):
+                yield root, root.stat()
+            continue
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as exc:
+                logger.warning(f"Skipping {directory}: {exc}")
+                continue
+            for entry in entries:
+                if any(fnmatch.fnmatch(entry.name, pattern) for pattern in excludes):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.is_file() and language_for_path(entry.name):
+                    yield Path(entry.path), entry.stat()
+
+
+def engine_fingerprint(engine: str) -> str:
+    """Cache namespace: results from another engine, rule set or tool install are not reused."""
+    parts = [f"format={CACHE_FORMAT}", f"engine={engine}", f"native={ENGINE_VERSION}"]
+    if engine != "native":
+        for tool in sorted(TOOLS.values()):
+            location = shutil.which(tool)
+            parts.append(f"{tool}={location}:{os.stat(location).st_mtime_ns}" if location else f"{tool}=missing")
+    return ";".join(parts)
+
+
+class LintCache:
+    """``{path: [mtime_ns, size, sha256]}`` plus ``{sha256:language: diagnostics}`` in one JSON file."""
+
+    def __init__(self, path: Optional[Path], fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.files: Dict[str, List[Any]] = {}
+        self.results: Dict[str, List[Dict[str, Any]]] = {}
+        self.dirty = False
+        if path is None or not path.exists():
+            return
+        try:
+            with open(path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, json.JSONDecodeError) as exc:
+            logger.warning(f"Ignoring unreadable lint cache {path}: {exc}")
+            return
+        if data.get("fingerprint") == fingerprint:
+            self.files = data.get("files", {})
+            self.results = data.get("results", {})
+
+    def known_hash(self, key: str, stat: os.stat_result) -> Optional[str]:
+        record = self.files.get(key)
+        if record and record[0] == stat.st_mtime_ns and record[1] == stat.st_size:
+            return record[2]
+        return None
+
+    def store(self, key: str, stat: os.stat_result, digest: str, result_key: str, diagnostics: List[Dict[str, Any]]) -> None:
+        self.files[key] = [stat.st_mtime_ns, stat.st_size, digest]
+        self.results[result_key] = diagnostics
+        self.dirty = True
+
+    def save(self, live_keys: set) -> None:
+        if self.path is None:
+            return
+        stale = set(self.files) - live_keys
+        if not self.dirty and not stale:
+            return
+        for key in stale:
+            del self.files[key]
+        live_results = {f"{record[2]}:{language_for_path(key)}" for key, record in self.files.items()}
+        self.results = {key: value for key, value in self.results.items() if key in live_results}
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump({"fingerprint": self.fingerprint, "files": self.files, "results": self.results}, handle, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+
+def _lint_file(task: Tuple[str, str, str]) -> Tuple[str, str, List[Dict[str, Any]]]:
+    """Worker: read, hash and lint one file. Returns ``(path, sha256, diagnostics)``."""
+    path, language, engine = task
+    data = Path(path).read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    code = data.decode("utf-8", errors="replace")
+    return path, digest, run_lint_checks(code, language, engine)
+
+
+def lint_paths(roots: List[Path], engine: str, jobs: int, cache: LintCache, excludes: List[str], base: Path) -> Dict[str, Any]:
+    started = time.perf_counter()
+    files: Dict[str, Dict[str, Any]] = {}
+    pending: List[Tuple[str, str, str]] = []
+    stats: Dict[str, os.stat_result] = {}
+    cached = 0
+
+    for path, stat in iter_source_files(roots, excludes):
+        key = os.path.relpath(path, base).replace(os.sep, "/")
+        language = language_for_path(path)
+        stats[key] = stat
+        digest = cache.known_hash(key, stat)
+        if digest is None:
+            # Touched but possibly unchanged (checkout, rebase): hashing is far cheaper than linting
+            digest = hashlib.sha256(path.read_bytes()).hexdigest()
+            if f"{digest}:{language}" in cache.results:
+                cache.store(key, stat, digest, f"{digest}:{language}", cache.results[f"{digest}:{language}"])
+        result_key = f"{digest}:{language}"
+        if result_key in cache.results:
+            files[key] = {"path": key, "language": language, "diagnostics": cache.results[result_key], "cached": True}
+            cached += 1
+        else:
+            pending.append((str(path), language, resolve_engine(engine, language)))
+
+    def collect(results: Iterator[Tuple[str, str, List[Dict[str, Any]]]]) -> None:
+        for path, digest, diagnostics in results:
+            key = os.path.relpath(path, base).replace(os.sep, "/")
+            language = language_for_path(path)
+            # A linter that failed to run says nothing about the file; try again next time
+            if not is_placeholder(diagnostics):
+                cache.store(key, stats[key], digest, f"{digest}:{language}", diagnostics)
+            files[key] = {"path": key, "language": language, "diagnostics": diagnostics, "cached": False}
+
+    if jobs > 1 and len(pending) >= MIN_PARALLEL_FILES:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            collect(pool.map(_lint_file, pending, chunksize=max(1, len(pending) // (jobs * 4))))
+    else:
+        collect(map(_lint_file, pending))
+
+    cache.save(set(stats))
+    ordered = [files[key] for key in sorted(files)]
+    summary = {severity: 0 for severity in SEVERITY_RANK}
+    for item in ordered:
+        for finding in item["diagnostics"]:
+            summary[finding.get("severity", "info")] = summary.get(finding.get("severity", "info"), 0) + 1
+    return {
+        "tool": "kingpins-lint",
+        "engine": engine,
+        "files": len(ordered),
+        "linted": len(pending),
+        "cached": cached,
+        "durationSeconds": round(time.perf_counter() - started, 4),
+        "summary": summary,
+        "results": ordered,
+    }
+
+
+def to_sarif(report: Dict[str, Any]) -> Dict[str, Any]:
+    rules: Dict[str, Dict[str, Any]] = {}
+    results = []
+    for item in report["results"]:
+        for finding in item["diagnostics"]:
+            rule_id = str(finding.get("ruleId") or "lint")
+            rules.setdefault(rule_id, {"id": rule_id})
+            results.append({
+                "ruleId": rule_id,
+                "level": SARIF_LEVELS.get(finding.get("severity"), "note"),
+                "message": {"text": finding.get("message", "")},
+                "locations": [{
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": item["path"], "uriBaseId": "SRCROOT"},
+                        "region": {"startLine": finding.get("line") or 1, "startColumn": finding.get("column") or 1},
+                    }
+                }],
+            })
+    return {
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [{
+            "tool": {"driver": {"name": "kingpins-lint", "rules": [rules[key] for key in sorted(rules)]}},
+            "results": results,
+        }],
+    }
+
+
+def to_text(report: Dict[str, Any]) -> str:
+    lines = []
+    for item in report["results"]:
+        for finding in item["diagnostics"]:
+            lines.append(
+                f"{item['path']}:{finding.get('line', 1)}:{finding.get('column', 1)}: "
+                f"{finding.get('severity', 'info')} [{finding.get('ruleId')}] {finding.get('message', '')}"
+            )
+    summary = report["summary"]
+    lines.append(
+        f"{report['files']} files ({report['cached']} cached) in {report['durationSeconds']}s: "
+        f"{summary['error']} errors, {summary['warning']} warnings, {summary['info']} info"
+    )
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="*", default=["."], help="files or directories to lint")
+    parser.add_argument("--engine", choices=ENGINES, default="auto", help="auto uses pylint/eslint when installed, native checks otherwise")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="parallel worker processes")
+    parser.add_argument("--format", choices=["text", "json", "sarif"], default="text")
+    parser.add_argument("--output", "-o", help="write the report here instead of stdout")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="cache file path")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--exclude", action="append", default=[], help="extra file/directory name glob to skip (repeatable)")
+    parser.add_argument("--fail-on", choices=["error", "warning", "never"], default="error", help="exit 1 when findings reach this severity")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+    args = parse_args(argv)
+    roots = [Path(path) for path in args.paths]
+    missing = [str(root) for root in roots if not root.exists()]
+    if missing:
+        print(f"No such file or directory: {', '.join(missing)}", file=sys.stderr)
+        return 2
+
+    cache = LintCache(None if args.no_cache else Path(args.cache), engine_fingerprint(args.engine))
+    report = lint_paths(roots, args.engine, max(1, args.jobs), cache, DEFAULT_EXCLUDES + args.exclude, Path.cwd())
+
+    if args.format == "sarif":
+        output = json.dumps(to_sarif(report), indent=2)
+    elif args.format == "json":
+        output = json.dumps(report, indent=2)
+    else:
+        output = to_text(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.fail_on == "never":
+        return 0
+    threshold = SEVERITY_RANK[args.fail_on]
+    failed = any(report["summary"].get(severity, 0) for severity, rank in SEVERITY_RANK.items() if rank >= threshold)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
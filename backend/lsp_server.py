@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""Language Server Protocol front end (stdio) for editor integrations.
+
+    python lsp_server.py
+    python lsp_server.py --engine native --debounce 0.1
+
+Documents are kept in memory and synced incrementally (``didChange`` ranges), so an
+edit costs a few list operations instead of an HTTP round trip with the whole file,
+a JSON parse and a JWT check. The in-process checks from ``services/native_lint.py``
+re-run once typing pauses for ``--debounce`` seconds. With ``--engine auto`` (default)
+or ``subprocess``, pylint/eslint run on open and save only; between saves their
+findings are moved along with the edits and dropped only in the lines that changed.
+``publishDiagnostics`` is sent only when the merged set actually differs. Code actions
+come from the CodeT5 suggestion service (``SUGGESTION_SERVICE_URL``) once per document
+version, answered from a worker thread so edits keep flowing while it runs;
+``textDocument/formatting`` uses the in-process formatters of ``/api/format``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import re
+import sys
+import threading
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from flask import Flask
+
+from config import get_settings
+from services.formatter import FORMATTERS, FormatError, format_code
+from services.lint_service import ENGINES, language_for_path, resolve_engine, run_lint_checks
+from services.suggestion_service import request_suggestions
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_IDS = {
+    "python": "python",
+    "javascript": "javascript",
+    "javascriptreact": "javascript",
+    "css": "css",
+    "html": "html",
+}
+SEVERITIES = {"error": 1, "warning": 2, "info": 3}
+# LSP TextDocumentSyncKind.Incremental
+SYNC_INCREMENTAL = 2
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+SERVER_NOT_INITIALIZED = -32002
+# Edits remembered per document to move slow-engine findings that finish after newer edits
+MAX_EDIT_LOG = 1000
+
+_WORD = re.compile(r"[\w$]+")
+# LSP positions only count \n, \r\n and \r as line breaks (str.splitlines also splits on \f, \x1c, U+2028, ...)
+_LINE_BREAK = re.compile(r"(?<=\r\n)|(?<=\n)|(?<=\r)(?!\n)")
+
+# (version after the edit, first old line, last old line, number of new lines)
+Edit = Tuple[int, int, int, int]
+
+
+def read_message(stream: BinaryIO) -> Optional[Dict[str, Any]]:
+    """Read one ``Content-Length`` framed JSON-RPC message; ``None`` at end of input."""
+    length = None
+    while True:
+        header = stream.readline()
+        if not header:
+            return None
+        header = header.strip()
+        if not header:
+            break
+        name, _, value = header.decode("ascii").partition(":")
+        if name.lower() == "content-length":
+            length = int(value.strip())
+    if length is None:
+        return None
+    return json.loads(stream.read(length).decode("utf-8"))
+
+
+def _utf16_index(line: str, character: int) -> int:
+    """Python index of an LSP character offset, which counts UTF-16 code units."""
+    if line.isascii():
+        return min(character, len(line))
+    units = 0
+    for index, char in enumerate(line):
+        if units >= character:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(line)
+
+
+def _utf16_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-16-le")) // 2
+
+
+def _content(line: str) -> str:
+    return line.rstrip("\r\n")
+
+
+def split_lines(text: str) -> List[str]:
+    """Lines of ``text`` with their terminators, split where LSP clients count a new line."""
+    lines = _LINE_BREAK.split(text)
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+class TextDocument:
+    def __init__(self, uri: str, language: str, version: int, text: str):
+        self.uri = uri
+        self.language = language
+        self.version = version
+        self.lines: List[str] = split_lines(text)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.lines)
+
+    def apply_change(self, change: Dict[str, Any]) -> Tuple[int, int, int]:
+        """Apply one ``TextDocumentContentChangeEvent``; returns ``(first line, last old line, new line count)``."""
+        if "range" not in change:
+            old_count = len(self.lines)
+            self.lines = split_lines(change["text"])
+            return 0, max(old_count - 1, 0), len(self.lines)
+        start, end = change["range"]["start"], change["range"]["end"]
+        first, last = start["line"], end["line"]
+        while len(self.lines) <= last:
+            self.lines.append("")
+        first_line, last_line = self.lines[first], self.lines[last]
+        head = first_line[:_utf16_index(_content(first_line), start["character"])]
+        tail = last_line[_utf16_index(_content(last_line), end["character"]):]
+        replacement = split_lines(head + change["text"] + tail)
+        self.lines[first:last + 1] = replacement
+        return first, last, len(replacement)
+
+
+def _shift(diagnostics: List[Dict[str, Any]], edits: List[Edit]) -> List[Dict[str, Any]]:
+    """Move diagnostics through ``edits``; those on edited lines are dropped as stale."""
+    for _, first, last, count in edits:
+        delta = count - (last - first + 1)
+        moved = []
+        for item in diagnostics:
+            line = item["range"]["start"]["line"]
+            if line < first:
+                moved.append(item)
+            elif line > last:
+                moved.append({
+                    **item,
+                    "range": {
+                        "start": {**item["range"]["start"], "line": line + delta},
+                        "end": {**item["range"]["end"], "line": item["range"]["end"]["line"] + delta},
+                    },
+                })
+        diagnostics = moved
+    return diagnostics
+
+
+def to_lsp_diagnostic(finding: Dict[str, Any], lines: List[str]) -> Dict[str, Any]:
+    line = max((finding.get("line") or 1) - 1, 0)
+    text = _content(lines[line]) if line < len(lines) else ""
+    column = min(max((finding.get("column") or 1) - 1, 0), len(text))
+    word = _WORD.match(text, column)
+    end = word.end() if word else min(column + 1, len(text))
+    return {
+        "range": {
+            "start": {"line": line, "character": _utf16_length(text[:column])},
+            "end": {"line": line, "character": _utf16_length(text[:end])},
+        },
+        "severity": SEVERITIES.get(finding.get("severity"), 3),
+        "code": finding.get("ruleId"),
+        "source": "kingpins",
+        "message": finding.get("message", ""),
+    }
+
+
+def _from_lsp_diagnostic(item: Dict[str, Any]) -> Dict[str, Any]:
+    severity = {value: key for key, value in SEVERITIES.items()}.get(item.get("severity"), "info")
+    return {
+        "ruleId": item.get("code"),
+        "severity": severity,
+        "message": item.get("message", ""),
+        "line": item["range"]["start"]["line"] + 1,
+        "column": item["range"]["start"]["character"] + 1,
+    }
+
+
+class LanguageServer:
+    def __init__(self, output: BinaryIO, engine: str = "auto", debounce: float = 0.15):
+        self.output = output
+        self.engine = engine
+        self.debounce = debounce
+        self.documents: Dict[str, TextDocument] = {}
+        self.initialized = False
+        self.shutdown_requested = False
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._timers: Dict[str, threading.Timer] = {}
+        self._native: Dict[str, List[Dict[str, Any]]] = {}
+        # Slow-engine findings plus the document version they were computed for
+        self._full: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+        self._edits: Dict[str, List[Edit]] = {}
+        self._published: Dict[str, List[Dict[str, Any]]] = {}
+        self._actions: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+        # One suggestion fetch per document at a time; later requests reuse its result
+        self._action_locks: Dict[str, threading.Lock] = {}
+        # request_suggestions reads its settings from the Flask app context
+        self._app = Flask("kingpins-lsp")
+        self._app.config["SETTINGS"] = get_settings()
+        self._requests: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "initialize": self.initialize,
+            "shutdown": self.shutdown,
+            "textDocument/codeAction": self.code_action,
+            "textDocument/formatting": self.formatting,
+        }
+        # Answered from a worker thread so a slow upstream does not hold up didChange and friends
+        self._background = {"textDocument/codeAction"}
+        self._notifications: Dict[str, Callable[[Dict[str, Any]], None]] = {
+            "initialized": lambda params: None,
+            "textDocument/didOpen": self.did_open,
+            "textDocument/didChange": self.did_change,
+            "textDocument/didSave": self.did_save,
+            "textDocument/didClose": self.did_close,
+        }
+
+    # ---------- transport ----------
+    def send(self, payload: Dict[str, Any]) -> None:
+        body = json.dumps({"jsonrpc": "2.0", **payload}, separators=(",", ":")).encode("utf-8")
+        with self._write_lock:
+            self.output.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+            self.output.flush()
+
+    def serve(self, stream: BinaryIO) -> int:
+        while True:
+            message = read_message(stream)
+            if message is None:
+                return 0 if self.shutdown_requested else 1
+            if message.get("method") == "exit":
+                return 0 if self.shutdown_requested else 1
+            self.handle(message)
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        method = message.get("method")
+        params = message.get("params") or {}
+        if "id" not in message:
+            handler = self._notifications.get(method)
+            if handler is not None and (self.initialized or method == "initialized"):
+                try:
+                    handler(params)
+                except Exception:  # noqa: BLE001 - a bad notification must not stop the server
+                    logger.exception(f"Failed to handle {method}")
+            return
+        handler = self._requests.get(method)
+        if handler is None:
+            self.send({"id": message["id"], "error": {"code": METHOD_NOT_FOUND, "message": f"Unsupported method {method}"}})
+            return
+        if not self.initialized and method != "initialize":
+            self.send({"id": message["id"], "error": {"code": SERVER_NOT_INITIALIZED, "message": "Server not initialized"}})
+            return
+        if method in self._background:
+            threading.Thread(target=self._respond, args=(message["id"], method, handler, params), daemon=True).start()
+            return
+        self._respond(message["id"], method, handler, params)
+
+    def _respond(self, message_id: Any, method: str, handler: Callable[[Dict[str, Any]], Any], params: Dict[str, Any]) -> None:
+        try:
+            self.send({"id": message_id, "result": handler(params)})
+        except Exception as exc:  # noqa: BLE001 - reported to the client instead
+            logger.exception(f"Failed to handle {method}")
+            self.send({"id": message_id, "error": {"code": INTERNAL_ERROR, "message": str(exc)}})
+
+    # ---------- lifecycle ----------
+    def initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.initialized = True
+        return {
+            "capabilities": {
+                "textDocumentSync": {"openClose": True, "change": SYNC_INCREMENTAL, "save": {"includeText": False}},
+                "codeActionProvider": True,
+                "documentFormattingProvider": True,
+            },
+            "serverInfo": {"name": "kingpins-lsp"},
+        }
+
+    def shutdown(self, params: Dict[str, Any]) -> None:
+        self.shutdown_requested = True
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+
+    # ---------- document sync ----------
+    def _language(self, uri: str, language_id: str) -> Optional[str]:
+        return LANGUAGE_IDS.get(language_id) or language_for_path(unquote(urlparse(uri).path))
+
+    def did_open(self, params: Dict[str, Any]) -> None:
+        item = params["textDocument"]
+        language = self._language(item["uri"], item.get("languageId", ""))
+        if language is None:
+            return
+        with self._lock:
+            self.documents[item["uri"]] = TextDocument(item["uri"], language, item.get("version", 0), item["text"])
+            self._edits[item["uri"]] = []
+        self._schedule(item["uri"], full=True, delay=0.0)
+
+    def did_change(self, params: Dict[str, Any]) -> None:
+        uri = params["textDocument"]["uri"]
+        with self._lock:
+            document = self.documents.get(uri)
+            if document is None:
+                return
+            version = params["textDocument"].get("version", document.version + 1)
+            edits = [(version, *document.apply_change(change)) for change in params["contentChanges"]]
+            document.version = version
+            log = self._edits.setdefault(uri, [])
+            log.extend(edits)
+            del log[:-MAX_EDIT_LOG]
+            self._native[uri] = _shift(self._native.get(uri, []), edits)
+        self._schedule(uri, full=False, delay=self.debounce)
+
+    def did_save(self, params: Dict[str, Any]) -> None:
+        self._schedule(params["textDocument"]["uri"], full=True, delay=0.0)
+
+    def did_close(self, params: Dict[str, Any]) -> None:
+        uri = params["textDocument"]["uri"]
+        with self._lock:
+            timer = self._timers.pop(uri, None)
+            if timer is not None:
+                timer.cancel()
+            for table in (self.documents, self._native, self._full, self._edits, self._published, self._actions, self._action_locks):
+                table.pop(uri, None)
+        self.send({"method": "textDocument/publishDiagnostics", "params": {"uri": uri, "diagnostics": []}})
+
+    # ---------- linting ----------
+    def _schedule(self, uri: str, full: bool, delay: float) -> None:
+        with self._lock:
+            previous = self._timers.pop(uri, None)
+            if previous is not None:
+                previous.cancel()
+                # A pending save/open run must not be downgraded by a later keystroke
+                full = full or getattr(previous, "full", False)
+            timer = threading.Timer(delay, self._lint, args=(uri, full))
+            timer.full = full  # type: ignore[attr-defined]
+            timer.daemon = True
+            self._timers[uri] = timer
+            timer.start()
+
+    def _lint(self, uri: str, full: bool) -> None:
+        with self._lock:
+            document = self.documents.get(uri)
+            if document is None:
+                return
+            if self._timers.get(uri) is not threading.current_thread():
+                return  # superseded by a newer schedule
+            del self._timers[uri]
+            version, language, lines = document.version, document.language, list(document.lines)
+        text = "".join(lines)
+        engine = resolve_engine(self.engine, language)
+
+        native = [to_lsp_diagnostic(item, lines) for item in run_lint_checks(text, language, engine="native")]
+        slow = None
+        if full and engine != "native":
+            slow = [to_lsp_diagnostic(item, lines) for item in run_lint_checks(text, language, engine=engine)]
+
+        with self._lock:
+            document = self.documents.get(uri)
+            if document is None:
+                return
+            if document.version == version:
+                self._native[uri] = native
+            if slow is not None:
+                self._full[uri] = (version, slow)
+        self._publish(uri)
+
+    def _merged(self, uri: str) -> Tuple[int, List[Dict[str, Any]]]:
+        document = self.documents[uri]
+        merged = list(self._native.get(uri, []))
+        if uri in self._full:
+            computed_at, slow = self._full[uri]
+            later = [edit for edit in self._edits.get(uri, []) if edit[0] > computed_at]
+            seen = {(item["range"]["start"]["line"], item["code"]) for item in merged}
+            merged.extend(
+                item for item in _shift(slow, later)
+                if (item["range"]["start"]["line"], item["code"]) not in seen
+            )
+        merged.sort(key=lambda item: (item["range"]["start"]["line"], item["range"]["start"]["character"]))
+        return document.version, merged
+
+    def _publish(self, uri: str) -> None:
+        with self._lock:
+            if uri not in self.documents:
+                return
+            version, diagnostics = self._merged(uri)
+            if self._published.get(uri) == diagnostics:
+                return
+            self._published[uri] = diagnostics
+        self.send({
+            "method": "textDocument/publishDiagnostics",
+            "params": {"uri": uri, "version": version, "diagnostics": diagnostics},
+        })
+
+    # ---------- code actions ----------
+    def _suggestions(self, uri: str) -> Optional[Tuple[List[str], List[Dict[str, Any]]]]:
+        """Lines of the current version of ``uri`` and the suggestions for them, fetched at most once per version.
+
+        ``None`` if the document is closed or edited while waiting; the editor asks again.
+        """
+        with self._lock:
+            if uri not in self.documents:
+                return None
+            fetch_lock = self._action_locks.setdefault(uri, threading.Lock())
+        # Editors ask for code actions on every cursor move; the model runs once per version
+        with fetch_lock:
+            with self._lock:
+                document = self.documents.get(uri)
+                if document is None or self._action_locks.get(uri) is not fetch_lock:
+                    return None
+                version, language, lines = document.version, document.language, list(document.lines)
+                cached = self._actions.get(uri)
+                report = [_from_lsp_diagnostic(item) for item in self._published.get(uri, [])]
+            if cached is None or cached[0] != version:
+                with self._app.app_context():
+                    response = request_suggestions("".join(lines), report, language)
+                cached = (version, response.get("suggestions") or [])
+                with self._lock:
+                    if uri not in self.documents:
+                        return None
+                    self._actions[uri] = cached
+        with self._lock:
+            document = self.documents.get(uri)
+            if document is None or document.version != version:
+                return None
+        return lines, cached[1]
+
+    def code_action(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        uri = params["textDocument"]["uri"]
+        fetched = self._suggestions(uri)
+        if fetched is None:
+            return []
+        lines, suggestions = fetched
+
+        first, last = params["range"]["start"]["line"], params["range"]["end"]["line"]
+        actions = []
+        for suggestion in suggestions:
+            line = (suggestion.get("line") or 0) - 1
+            if not first <= line <= last or line >= len(lines) or suggestion.get("replacement") is None:
+                continue
+            actions.append({
+                "title": suggestion.get("message") or "Apply suggestion",
+                "kind": "quickfix",
+                "edit": {"changes": {uri: [{
+                    "range": {
+                        "start": {"line": line, "character": 0},
+                        "end": {"line": line, "character": _utf16_length(_content(lines[line]))},
+                    },
+                    "newText": suggestion["replacement"],
+                }]}},
+            })
+        return actions
+
+    # ---------- formatting ----------
+    def formatting(self, params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """One edit replacing the whole document; ``None`` when it cannot be parsed."""
+        with self._lock:
+            document = self.documents.get(params["textDocument"]["uri"])
+            if document is None or document.language not in FORMATTERS:
+                return None
+            language, lines = document.language, list(document.lines)
+        text = "".join(lines)
+        try:
+            formatted = format_code(text, language).formatted
+        except FormatError as exc:
+            logger.info(f"Not formatting {params['textDocument']['uri']}: {exc}")
+            return None
+        if formatted == text:
+            return []
+        return [{
+            "range": {"start": {"line": 0, "character": 0}, "end": {"line": len(lines), "character": 0}},
+            "newText": formatted,
+        }]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--engine", choices=ENGINES, default="auto", help="engine run on open/save; native checks always run while typing")
+    parser.add_argument("--debounce", type=float, default=0.15, help="seconds to wait after the last edit before linting")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    # stdout carries the protocol, so logs go to stderr
+    logging.basicConfig(stream=sys.stderr, level=args.log_level.upper(), format="%(levelname)s: %(message)s")
+    server = LanguageServer(sys.stdout.buffer, engine=args.engine, debounce=args.debounce)
+    return server.serve(sys.stdin.buffer)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,20 +2,110 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
+import mimetypes
+import time
 from pathlib import Path
+from urllib.parse import quote
 
-from flask import Flask, Response, request
+import jwt
+from flask import Flask, Response, jsonify, redirect, request, stream_with_context
 from flask_cors import CORS
 
+from config import get_settings
+from services.blob_store import MAX_CHECK_HASHES, BlobMissing, BlobTooLarge, create_blob_store, is_digest
+from services.document import load_document
+from services.preview_bundle import (
+    FILE_KEY_SEPARATOR,
+    MAX_BUNDLE_FILES,
+    BundleError,
+    asset_version,
+    content_hash,
+    decode_file,
+    file_key,
+    fingerprint_asset_refs,
+    manifest_etag,
+    normalize_path,
+)
+from services.preview_events import (
+    PreviewEventHub,
+    css_only_change,
+    format_event,
+    inject_live_reload,
+    style_blocks,
+)
+from services.preview_store import (
+    PreviewEntry,
+    PreviewTooLarge,
+    create_preview_store,
+    resolve_preview_id,
+    scoped_preview_id,
+)
+from utils.compression import init_compression, negotiate_encoding, precompress
+from utils.jwt_utils import decode_jwt
+from utils.metrics import REGISTRY, init_metrics, labels, record_cache, stage
+
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+init_metrics(app, "preview")
+
+settings = get_settings()
+settings.assert_debug_allowed(app.debug)
+init_compression(app, settings.compress_min_bytes)
+# Bounded preview storage; use the sqlite or redis backend when running several workers
+_preview_store = create_preview_store(
+    settings.preview_store_backend,
+    max_bytes=settings.preview_max_bytes,
+    ttl=settings.preview_ttl,
+    path=settings.preview_store_path,
+    redis_url=settings.preview_redis_url,
+)
+_blob_store = create_blob_store(
+    settings.blob_store_backend,
+    max_bytes=settings.blob_max_bytes,
+    ttl=settings.blob_ttl,
+    path=settings.blob_store_path,
+    redis_url=settings.preview_redis_url,
+)
+_preview_events = PreviewEventHub(max_streams=settings.preview_events_max_streams)
+
+
+def _store_samples(*names: str) -> dict:
+    store_stats = _preview_store.stats()
+    return {labels(kind=name): store_stats.get(name) for name in names}
+
+
+REGISTRY.gauge_callback("kingpins_preview_store", "Preview store size (entries, bytes).", lambda: _store_samples("entries", "bytes"))
+REGISTRY.gauge_callback(
+    "kingpins_preview_store_events_total",
+    "Preview store lookups and removals.",
+    lambda: _store_samples("hits", "misses", "evictions", "expirations"),
+    kind="counter",
+)
+REGISTRY.gauge_callback(
+    "kingpins_preview_event_streams", "Open live-reload streams in this process.", lambda: {labels(): _preview_events.open_streams()}
+)
+_COMPRESSIBLE_TYPES = {"application/javascript", "application/json", "image/svg+xml", "application/xml"}
+# Comment lines keep idle SSE connections from being closed by proxies.
+_SSE_HEARTBEAT_SECONDS = 15
+# Milliseconds browsers wait before reconnecting a stream that ended, or that was turned away
+_SSE_RETRY_MS = 2000
+_SSE_BUSY_RETRY_MS = 10000
 
-# In-memory storage for preview content
-_preview_cache: dict[str, dict] = {}
+
+def _request_owner() -> str:
+    """Namespace previews by JWT uid when the caller sends one, else by client address."""
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.startswith("Bearer "):
+        try:
+            return decode_jwt(auth_header.split(" ", 1)[1])["uid"]
+        except (jwt.PyJWTError, KeyError):
+            pass
+    return request.remote_addr or "anonymous"
 
 
 @app.route("/preview", methods=["POST"])
@@ -23,47 +113,238 @@ def set_preview():
     """Set preview content."""
     try:
         data = request.get_json(force=True)
-        code = data.get("code", "")
-        filename = data.get("filename", "preview.html")
-        file_type = data.get("type", "html")
+        if not data:
+            logger.warning("No JSON data received")
+            return jsonify({"error": "No data received"}), 400
+            
+        # Store under the caller's namespace so users cannot overwrite each other
+        raw_id = str(data.get("preview_id", "default"))
+        if FILE_KEY_SEPARATOR in raw_id:
+            return jsonify({"error": f"preview_id may not contain {FILE_KEY_SEPARATOR!r}."}), 400
+        owner = _request_owner()
+        preview_id = scoped_preview_id(raw_id, owner)
+        
+        if "delta" in data:
+            # Incremental update against the version the client last uploaded
+            base = _preview_store.get(preview_id)
+            if base is None or base.code_hash != data.get("base_hash"):
+                return jsonify({"status": "send_full", "error": "Base version not found; send the full code."}), 409
+            try:
+                code = apply_line_delta(base.code, data["delta"])
+            except (TypeError, ValueError, KeyError) as exc:
+                return jsonify({"status": "send_full", "error": f"Invalid delta: {exc}"}), 409
+            if data.get("code_hash") and _code_hash(code) != data["code_hash"]:
+                return jsonify({"status": "send_full", "error": "Delta result does not match code_hash."}), 409
+            filename = data.get("filename", base.filename)
+            file_type = data.get("type", base.type)
+        else:
+            try:
+                code = _blob_store.resolve(owner, data)
+            except BlobMissing as exc:
+                return jsonify({"status": "send_full", "error": "Unknown code_ref; send the code inline.", "missing": [exc.digest]}), 409
+            filename = data.get("filename", "preview.html")
+            file_type = data.get("type", "html")
+        
+        logger.info(f"Received preview request for {filename}, type: {file_type}, code length: {len(code)}")
         
         if not code:
-            return {"error": "Code content is required."}, 400
+            return jsonify({"error": "Code content is required."}), 400
         
-        # Store in cache with a simple key
-        preview_id = data.get("preview_id", "default")
-        _preview_cache[preview_id] = {
-            "code": code,
-            "filename": filename,
-            "type": file_type
-        }
+        try:
+            entry = _build_entry(preview_id, code, filename, file_type)
+            with stage("store"):
+                _preview_store.put(preview_id, entry)
+        except PreviewTooLarge as exc:
+            return jsonify({"error": str(exc)}), 413
+        _preview_events.publish()
+        
+        logger.info(f"Stored preview with ID: {preview_id}")
         
-        return {"status": "ok", "preview_id": preview_id, "url": f"http://localhost:4000/view?preview_id={preview_id}"}
+        return jsonify({
+            "status": "ok", 
+            "preview_id": preview_id, 
+            "code_hash": _code_hash(code),
+            "url": f"http://localhost:50000/view?preview_id={preview_id}"
+        })
     except Exception as exc:  # noqa: BLE001
         logger.exception("Failed to set preview")
-        return {"error": str(exc)}, 500
+        return jsonify({"error": str(exc)}), 500
 
 
-@app.route("/view", methods=["GET"])
-def view_preview():
-    """View preview content."""
-    preview_id = request.args.get("preview_id", "default")
-    
-    if preview_id not in _preview_cache:
-        return Response(
-            "<html><body><h1>No preview available</h1><p>Please upload a file first.</p></body></html>",
-            mimetype="text/html"
-        )
-    
-    preview_data = _preview_cache[preview_id]
-    code = preview_data["code"]
-    filename = preview_data["filename"]
-    file_type = preview_data["type"]
-    
-    if file_type.lower() == "html" or filename.endswith(".html"):
+@app.route("/preview/bundle", methods=["POST"])
+def set_bundle():
+    """Store a multi-file preview; unchanged files can be sent as ``{"hash": ...}``."""
+    try:
+        data = request.get_json(force=True)
+        if not data or not isinstance(data.get("files"), dict) or not data["files"]:
+            return jsonify({"error": "files is required."}), 400
+        if len(data["files"]) > MAX_BUNDLE_FILES:
+            return jsonify({"error": f"A bundle holds at most {MAX_BUNDLE_FILES} files."}), 400
+        
+        raw_id = str(data.get("preview_id", "default"))
+        if FILE_KEY_SEPARATOR in raw_id:
+            return jsonify({"error": f"preview_id may not contain {FILE_KEY_SEPARATOR!r}."}), 400
+        preview_id = scoped_preview_id(raw_id, _request_owner())
+        
+        previous = _preview_store.get(preview_id)
+        previous_files = json.loads(previous.code)["files"] if previous and previous.type == "bundle" else {}
+        uploads: dict[str, bytes] = {}
+        hashes: dict[str, str] = {}
+        missing = []
+        try:
+            for raw_path, spec in data["files"].items():
+                path = normalize_path(raw_path)
+                content, known_hash = decode_file(spec)
+                if content is not None:
+                    uploads[path] = content
+                    hashes[path] = content_hash(content)
+                elif previous_files.get(path) == known_hash:
+                    hashes[path] = known_hash
+                else:
+                    missing.append(raw_path)
+            entry = normalize_path(data.get("entry", "index.html"))
+        except BundleError as exc:
+            return jsonify({"error": str(exc)}), 400
+        if entry not in hashes and entry not in missing:
+            return jsonify({"error": f"Entry file {entry!r} is not part of the bundle."}), 400
+        
+        version = manifest_etag(entry, hashes)
+        # HTML pages embed asset fingerprints and the bundle version, so they are
+        # re-rendered from their stored source whenever anything in the bundle changes
+        for path in hashes:
+            if path in uploads or not _is_html(path, ""):
+                continue
+            stored = _preview_store.get(file_key(preview_id, path))
+            if stored is None:
+                missing.append(path)
+            else:
+                uploads[path] = stored.code.encode("utf-8")
+        for path in hashes:
+            if path not in uploads and not _preview_store.get(file_key(preview_id, path)):
+                missing.append(path)
+        if missing:
+            return jsonify({"status": "missing", "missing": sorted(set(missing)), "error": "Upload the listed files in full."}), 409
+        
+        try:
+            for path, content in uploads.items():
+                _preview_store.put(
+                    file_key(preview_id, path),
+                    _build_bundle_file(preview_id, path, content, hashes, version),
+                )
+            manifest = json.dumps({"entry": entry, "files": hashes}, sort_keys=True)
+            _preview_store.put(preview_id, PreviewEntry(
+                code=manifest,
+                filename=entry,
+                type="bundle",
+                code_hash=_code_hash(manifest),
+                etag=version,
+            ))
+        except PreviewTooLarge as exc:
+            return jsonify({"error": str(exc)}), 413
+        for path in set(previous_files) - set(hashes):
+            _preview_store.delete(file_key(preview_id, path))
+        _preview_events.publish()
+        
+        logger.info(f"Stored bundle {preview_id}: {len(hashes)} files, {len(uploads)} updated")
+        
+        return jsonify({
+            "status": "ok",
+            "preview_id": preview_id,
+            "files": hashes,
+            "updated": sorted(uploads),
+            "url": f"http://localhost:50000/view/{quote(preview_id)}/{quote(entry)}"
+        })
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Failed to set preview bundle")
+        return jsonify({"error": str(exc)}), 500
+
+
+def _code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def apply_line_delta(code: str, delta: list) -> str:
+    """Apply line-range replacements to ``code``.
+
+    Each edit is ``{"start": int, "end": int, "text": str}`` and replaces base
+    lines ``[start, end)`` (0-based, line endings included in ``text``). Edits
+    refer to the base version and must be sorted and non-overlapping. Lines are
+    split on line feeds only, matching what the dashboard produces.
+    """
+    lines = load_document(code).lines
+    parts = []
+    position = 0
+    for edit in delta:
+        start, end, text = int(edit["start"]), int(edit["end"]), edit["text"]
+        if not isinstance(text, str):
+            raise TypeError("edit text must be a string")
+        if start < position or end < start or end > len(lines):
+            raise ValueError(f"edit range [{start}, {end}) is out of order or out of bounds")
+        parts.extend(lines[position:start])
+        parts.append(text)
+        position = end
+    parts.extend(lines[position:])
+    return "".join(parts)
+
+
+def _is_css(filename: str, file_type: str) -> bool:
+    return not _is_html(filename, file_type) and (file_type.lower() == "css" or filename.endswith(".css"))
+
+
+def _is_html(filename: str, file_type: str) -> bool:
+    return file_type.lower() == "html" or filename.endswith(".html")
+
+
+def _build_entry(preview_id: str, code: str, filename: str, file_type: str) -> PreviewEntry:
+    """Render a preview once at upload time, with its ETag and compressed variants.
+
+    The ETag hashes the rendered document before the live-reload script is added;
+    the script carries it as the version the open tab is showing.
+    """
+    with stage("render"):
+        document = _render_preview(code, filename, file_type)
+        etag = hashlib.sha256(document.encode("utf-8")).hexdigest()[:32]
+        body = inject_live_reload(document, preview_id, etag).encode("utf-8")
+    with stage("compress"):
+        encoded = precompress(body)
+    return PreviewEntry(
+        code=code,
+        filename=filename,
+        type=file_type,
+        code_hash=_code_hash(code),
+        body=body,
+        etag=etag,
+        encoded=encoded,
+    )
+
+
+def _build_bundle_file(bundle_key: str, path: str, content: bytes, files: dict[str, str], version: str) -> PreviewEntry:
+    """Prepare one bundle file for serving; HTML pages get fingerprinted asset links."""
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    code = ""
+    body = content
+    if _is_html(path, ""):
+        # Keep the source so the page can be re-rendered when its assets change
+        code = content.decode("utf-8", errors="replace")
+        with stage("render"):
+            body = inject_live_reload(fingerprint_asset_refs(code, path, files), bundle_key, version).encode("utf-8")
+    compressible = mimetype.startswith("text/") or mimetype in _COMPRESSIBLE_TYPES
+    return PreviewEntry(
+        code=code,
+        filename=path,
+        type=mimetype,
+        code_hash=files[path],
+        body=body,
+        etag=content_hash(body)[:32],
+        encoded=precompress(body) if compressible else {},
+    )
+
+
+def _render_preview(code: str, filename: str, file_type: str) -> str:
+    """Build the HTML document shown for a preview."""
+    if _is_html(filename, file_type):
         content = code
-        content_type = "text/html"
-    elif file_type.lower() == "css" or filename.endswith(".css"):
+    elif _is_css(filename, file_type):
         # Wrap CSS in HTML for preview
         content = f"""<!DOCTYPE html>
 <html lang="en">
@@ -73,7 +354,8 @@ def view_preview():
     <title>CSS Preview</title>
     <style>
         {code}
-        
+    </style>
+    <style>
         /* Default preview container */
         body {{
             font-family: Arial, sans-serif;
@@ -118,7 +400,6 @@ def view_preview():
     </div>
 </body>
 </html>"""
-        content_type = "text/html"
     else:
         # For other file types, show as code
         content = f"""<!DOCTYPE html>
@@ -158,28 +439,203 @@ def view_preview():
     </div>
 </body>
 </html>"""
-        content_type = "text/html"
     
-    return Response(
-        content,
-        mimetype=content_type,
-        headers={
-            "Content-Type": content_type,
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0"
-        }
-    )
+    return content
+
+
+_NO_PREVIEW_HTML = "<html><body><h1>No preview available</h1><p>Please upload a file first.</p></body></html>"
+
+
+def _serve_entry(entry: PreviewEntry, mimetype: str, immutable: bool = False) -> Response:
+    """Send a stored rendering, honouring If-None-Match and Accept-Encoding."""
+    headers = {
+        "ETag": f'"{entry.etag}"',
+        # Fingerprinted bundle assets never change under the same URL; everything
+        # else is revalidated on every load, which costs only a 304 when unchanged
+        "Cache-Control": "public, max-age=31536000, immutable" if immutable else "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if request.if_none_match.contains_weak(entry.etag):
+        record_cache("browser_etag", hit=True)
+        return Response(status=304, headers=headers)
+    record_cache("browser_etag", hit=False)
+    
+    body = entry.body
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""), entry.encoded)
+    if encoding:
+        body = entry.encoded[encoding]
+        headers["Content-Encoding"] = encoding
+    
+    return Response(body, mimetype=mimetype, headers=headers)
+
+
+@app.route("/blobs/check", methods=["POST"])
+def check_blobs():
+    """Which of ``hashes`` the caller still has to upload."""
+    hashes = (request.get_json(force=True) or {}).get("hashes")
+    if not isinstance(hashes, list) or not hashes or len(hashes) > MAX_CHECK_HASHES:
+        return jsonify({"error": f"hashes must be a list of 1 to {MAX_CHECK_HASHES} SHA-256 digests."}), 400
+    missing = _blob_store.missing(_request_owner(), hashes)
+    return jsonify({"missing": missing, "present": [digest for digest in hashes if digest not in missing]})
+
+
+@app.route("/blobs/<digest>", methods=["GET"])
+def has_blob(digest: str):
+    if _blob_store.missing(_request_owner(), [digest]):
+        return jsonify({"present": False}), 404
+    return jsonify({"present": True})
+
+
+@app.route("/blobs/<digest>", methods=["PUT"])
+def put_blob(digest: str):
+    """Upload raw UTF-8 source under its SHA-256 for later ``code_ref`` use."""
+    if not is_digest(digest):
+        return jsonify({"error": "Blob id must be a lowercase hex SHA-256."}), 400
+    try:
+        with stage("store"):
+            _blob_store.put(_request_owner(), request.get_data().decode("utf-8"), digest)
+    except BlobTooLarge as exc:  # a ValueError too, so it must come first
+        return jsonify({"error": str(exc)}), 413
+    except ValueError as exc:  # also bad UTF-8
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"code_ref": digest}), 201
+
+
+@app.route("/view", methods=["GET"])
+def view_preview():
+    """View preview content."""
+    preview_id = resolve_preview_id(request.args.get("preview_id", "default"), _request_owner())
+    with stage("store"):
+        preview_data = _preview_store.get(preview_id)
+    
+    if preview_data is None:
+        return Response(_NO_PREVIEW_HTML, mimetype="text/html")
+    
+    if preview_data.type == "bundle":
+        # Serve bundles from a path so the entry page's relative links resolve
+        return redirect(f"/view/{quote(preview_id)}/{quote(preview_data.filename)}", code=302)
+    
+    return _serve_entry(preview_data, "text/html")
+
+
+@app.route("/view/<preview_id>/<path:path>", methods=["GET"])
+def view_bundle_file(preview_id: str, path: str):
+    """Serve one file of a bundle preview from the virtual filesystem."""
+    bundle_key = resolve_preview_id(preview_id, _request_owner())
+    with stage("store"):
+        manifest = _preview_store.get(bundle_key)
+        try:
+            path = normalize_path(path)
+        except BundleError:
+            manifest = None
+        file_entry = _preview_store.get(file_key(bundle_key, path)) if manifest and manifest.type == "bundle" else None
+    if file_entry is None:
+        return Response(_NO_PREVIEW_HTML, status=404, mimetype="text/html")
+    
+    immutable = request.args.get("v") == asset_version(file_entry.code_hash)
+    return _serve_entry(file_entry, file_entry.type, immutable=immutable)
+
+
+def _update_event(previous: PreviewEntry | None, current: PreviewEntry) -> dict:
+    """Describe an update as a stylesheet hot-swap when possible, else a reload."""
+    if current.type == "bundle":
+        return {"version": current.etag, "mode": "reload"}
+    if previous is not None and (previous.filename, previous.type) == (current.filename, current.type):
+        html_css_only = _is_html(current.filename, current.type) and css_only_change(previous.code, current.code) is not None
+        if html_css_only or _is_css(current.filename, current.type):
+            return {"version": current.etag, "mode": "css", "css": style_blocks(current.body.decode("utf-8"))}
+    return {"version": current.etag, "mode": "reload"}
+
+
+@app.route("/events", methods=["GET"])
+def preview_events():
+    """Server-Sent Events stream announcing new content for one preview.
+
+    Each stream parks a server thread, so a process serves at most
+    ``PREVIEW_EVENTS_MAX_STREAMS`` at once and ends each one after
+    ``PREVIEW_EVENTS_MAX_AGE`` seconds; the browser's ``EventSource`` reconnects on
+    its own (after ``retry:``) and resumes from the version it already shows.
+    """
+    preview_id = resolve_preview_id(request.args.get("preview_id", "default"), _request_owner())
+    client_version = request.args.get("version")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if not _preview_events.open_stream():
+        # A non-200 answer would stop EventSource for good; an empty stream makes it retry later
+        return Response(f"retry: {_SSE_BUSY_RETRY_MS}\n\n", mimetype="text/event-stream", headers=headers)
+
+    def stream():
+        yield f"retry: {_SSE_RETRY_MS}\n\n"
+        last = _preview_store.get(preview_id)
+        if last is not None and client_version and last.etag != client_version:
+            yield format_event("update", {"version": last.etag, "mode": "reload"})
+        last_etag = last.etag if last is not None else None
+        opened = last_sent = time.monotonic()
+        while not _preview_events.closed and time.monotonic() - opened < settings.preview_events_max_age:
+            sequence = _preview_events.sequence()
+            # Only the ETag is polled; the entry is loaded once it has changed
+            etag = _preview_store.etag(preview_id)
+            if etag is not None and etag != last_etag:
+                current = _preview_store.get(preview_id)
+                if current is not None:
+                    yield format_event("update", _update_event(last, current))
+                    last, last_etag = current, current.etag
+                    last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= _SSE_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            _preview_events.wait(sequence, settings.preview_events_poll)
+
+    response = Response(stream_with_context(stream()), mimetype="text/event-stream", headers=headers)
+    # Runs even if the client goes away before the generator starts
+    response.call_on_close(_preview_events.close_stream)
+    return response
 
 
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint."""
-    return {"status": "ok", "port": 4000}
+    return jsonify({"status": "ok", "port": 50000})
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    """Preview store usage: entries, bytes and evictions."""
+    return jsonify(_preview_store.stats())
+
+
+@app.route("/", methods=["GET"])
+def index():
+    """Root endpoint for testing."""
+    return jsonify({
+        "message": "Preview server is running",
+        "endpoints": {
+            "POST /preview": "Set preview content",
+            "POST /preview/bundle": "Set a multi-file preview",
+            "GET /view?preview_id=<id>": "View preview content",
+            "GET /view/<id>/<path>": "View a file of a bundle preview",
+            "GET /events?preview_id=<id>": "Live-reload event stream",
+            "GET /health": "Health check",
+            "GET /stats": "Preview store statistics",
+            "GET /metrics": "Prometheus metrics"
+        }
+    })
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
     logger.info("Starting preview server on port 50000...")
-    app.run(host="0.0.0.0", port=4000, debug=True)
+    logger.info("Preview server will be available at http://localhost:50000")
+    # Development only; production runs under gunicorn via ``python serve.py preview``.
+    from serve import run_development_server
 
+    try:
+        run_development_server(app, port=50000)
+    except OSError as e:
+        if "Address already in use" in str(e):
+            logger.error(f"Port 50000 is already in use. Please stop the other process or use a different port.")
+        else:
+            logger.error(f"Failed to start preview server: {e}")
+        raise
@@ -1,11 +1,19 @@
 from flask import Blueprint
 
 from .auth import auth_bp
+from .blobs import blobs_bp
+from .format import format_bp
+from .jobs import jobs_bp
 from .lint import lint_bp
+from .profiles import profiles_bp
 from .suggestion import suggestion_bp
 
 api_bp = Blueprint("api", __name__)
 api_bp.register_blueprint(auth_bp)
+api_bp.register_blueprint(blobs_bp)
+api_bp.register_blueprint(format_bp)
+api_bp.register_blueprint(jobs_bp)
 api_bp.register_blueprint(lint_bp)
+api_bp.register_blueprint(profiles_bp)
 api_bp.register_blueprint(suggestion_bp)
 
@@ -8,6 +8,7 @@ from firebase_admin import auth as fb_auth
 from firebase_admin.exceptions import FirebaseError
 from services.firebase_client import ensure_user_document, get_auth_client
 from utils.jwt_utils import generate_jwt
+from utils.metrics import stage
 
 logger = logging.getLogger(__name__)
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
@@ -156,7 +157,8 @@ def exchange_token():
         
         try:
             logger.info("Verifying Firebase ID token...")
-            decoded = auth_client.verify_id_token(id_token)
+            with stage("firebase_verify", upstream="firebase_auth"):
+                decoded = auth_client.verify_id_token(id_token)
             logger.info(f"Token verified for user: {decoded['uid']}")
             
         except (fb_auth.InvalidIdTokenError, fb_auth.ExpiredIdTokenError, fb_auth.RevokedIdTokenError) as exc:
@@ -168,7 +170,8 @@ def exchange_token():
 
         # Get user record to check if user exists and get additional info
         try:
-            user_record = auth_client.get_user(decoded["uid"])
+            with stage("firebase_user", upstream="firebase_auth"):
+                user_record = auth_client.get_user(decoded["uid"])
             logger.info(f"User record retrieved: {user_record.uid}")
         except Exception as exc:
             logger.error(f"Error getting user record: {str(exc)}")
@@ -184,7 +187,8 @@ def exchange_token():
                 "role": "user",  # Default role
                 "emailVerified": user_record.email_verified,
             }
-            ensure_user_document(decoded["uid"], user_data)
+            with stage("firestore", upstream="firestore"):
+                ensure_user_document(decoded["uid"], user_data)
             logger.info("User document ensured successfully")
         except Exception as exc:
             logger.error(f"Error ensuring user document: {str(exc)}")
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from flask import Blueprint, current_app, jsonify, request
+
+from services.blob_store import MAX_CHECK_HASHES, BlobMissing, BlobStore, BlobTooLarge, is_digest
+from utils.jwt_utils import require_jwt
+
+blobs_bp = Blueprint("blobs", __name__, url_prefix="/api/blobs")
+
+
+def _blob_store() -> BlobStore:
+    return current_app.config["BLOB_STORE"]
+
+
+def _owner(current_user) -> str:
+    return current_user.get("uid") or "anonymous"
+
+
+def request_code(current_user: Dict[str, Any], payload: Dict[str, Any]) -> str:
+    """Inline ``code`` or the blob named by ``code_ref``; raises ``BlobMissing``."""
+    return _blob_store().resolve(_owner(current_user), payload)
+
+
+def missing_blob_response(exc: BlobMissing):
+    return jsonify({"status": "send_full", "error": "Unknown code_ref; send the code inline.", "missing": [exc.digest]}), 409
+
+
+@blobs_bp.route("/check", methods=["POST"])
+@require_jwt
+def check_blobs(current_user):
+    hashes = (request.get_json(force=True) or {}).get("hashes")
+    if not isinstance(hashes, list) or not hashes:
+        return jsonify({"error": "hashes must be a non-empty list."}), 400
+    if len(hashes) > MAX_CHECK_HASHES:
+        return jsonify({"error": f"At most {MAX_CHECK_HASHES} hashes per check."}), 400
+    missing = _blob_store().missing(_owner(current_user), hashes)
+    return jsonify({"missing": missing, "present": [digest for digest in hashes if digest not in missing]})
+
+
+@blobs_bp.route("/<digest>", methods=["GET"])
+@require_jwt
+def has_blob(current_user, digest: str):
+    """``HEAD``/``GET``: 200 if the server holds ``digest`` for this user, else 404."""
+    if _blob_store().missing(_owner(current_user), [digest]):
+        return jsonify({"present": False}), 404
+    return jsonify({"present": True})
+
+
+@blobs_bp.route("/<digest>", methods=["PUT"])
+@require_jwt
+def put_blob(current_user, digest: str):
+    """Upload raw UTF-8 source (no JSON envelope) under its SHA-256."""
+    if not is_digest(digest):
+        return jsonify({"error": "Blob id must be a lowercase hex SHA-256."}), 400
+    try:
+        code = request.get_data().decode("utf-8")
+    except UnicodeDecodeError:
+        return jsonify({"error": "Blob content must be UTF-8 text."}), 400
+    try:
+        _blob_store().put(_owner(current_user), code, digest)
+    except BlobTooLarge as exc:  # a ValueError too, so it must come first
+        return jsonify({"error": str(exc)}), 413
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"code_ref": digest}), 201
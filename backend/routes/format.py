@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from flask import Blueprint, jsonify, request
+
+from routes.blobs import missing_blob_response, request_code
+from services.blob_store import BlobMissing
+from services.formatter import FORMATTERS, FormatError, format_code
+from services.patch import make_patch
+from utils.deadline import DeadlineExceeded, current_deadline
+from utils.jwt_utils import require_jwt
+from utils.metrics import stage
+from utils.profiling import profiled
+
+format_bp = Blueprint("format", __name__, url_prefix="/api/format")
+
+# responseMode -> fields dropped from the result (same modes as /api/ai/lint)
+RESPONSE_MODES = {
+    "full": (),
+    "patch": ("formatted_code",),
+    "formatted": ("patch",),
+}
+
+
+@format_bp.route("", methods=["POST"])
+@require_jwt
+@profiled("format")
+def format_source(current_user):
+    payload = request.get_json(force=True)
+    try:
+        code = request_code(current_user, payload)
+    except BlobMissing as exc:
+        return missing_blob_response(exc)
+    language = payload.get("language", "javascript")
+    mode = payload.get("responseMode", "full")
+
+    if not code:
+        return jsonify({"error": "Code payload is required."}), 400
+    if language not in FORMATTERS:
+        return jsonify({"error": f"language must be one of: {', '.join(FORMATTERS)}"}), 400
+    if mode not in RESPONSE_MODES:
+        return jsonify({"error": f"responseMode must be one of: {', '.join(RESPONSE_MODES)}"}), 400
+
+    try:
+        with stage("format"):
+            result = format_code(code, language)
+    except FormatError as exc:
+        return jsonify({"error": str(exc), "line": exc.line, "column": exc.column}), 422
+
+    output = {
+        "formatted_code": result.formatted,
+        "changed": result.formatted != code,
+        "formatter": result.formatter,
+        "language": language,
+    }
+    if mode != "formatted":
+        try:
+            with stage("patch"):
+                output["patch"] = make_patch(code, result.formatted, current_deadline())
+        except DeadlineExceeded as exc:
+            output["partial"] = True
+            output["skipped"] = [exc.stage]
+    for dropped in RESPONSE_MODES[mode]:
+        output.pop(dropped, None)
+    return jsonify(output)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import time
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+from routes.blobs import missing_blob_response, request_code
+from services.blob_store import BlobMissing
+from services.job_queue import JobQueue, QueueFull
+from services.preview_events import format_event
+from utils.jwt_utils import is_admin, require_jwt
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api/jobs")
+
+_SSE_HEARTBEAT_SECONDS = 15
+
+
+def _job_queue() -> JobQueue:
+    return current_app.config["JOB_QUEUE"]
+
+
+def _owner(current_user) -> str:
+    return current_user.get("uid") or "anonymous"
+
+
+@jobs_bp.route("", methods=["POST"])
+@require_jwt
+def submit_job(current_user):
+    payload = request.get_json(force=True)
+    kind = payload.get("kind", "")
+
+    try:
+        code = request_code(current_user, payload)
+    except BlobMissing as exc:
+        return missing_blob_response(exc)
+    if not code:
+        return jsonify({"error": "Code payload is required."}), 400
+    # Workers get the resolved source; the blob may be evicted before the job runs
+    payload = {**payload, "code": code}
+
+    try:
+        job = _job_queue().submit(current_user, kind, payload)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    except QueueFull as exc:
+        response = jsonify({"error": "Job queue is full", "details": str(exc)})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+
+    response = jsonify({
+        "jobId": job.id,
+        "status": job.status,
+        "statusUrl": f"/api/jobs/{job.id}",
+        "eventsUrl": f"/api/jobs/{job.id}/events",
+    })
+    response.status_code = 202
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return response
+
+
+@jobs_bp.route("/<job_id>", methods=["GET"])
+@require_jwt
+def job_status(current_user, job_id: str):
+    job = _job_queue().get(job_id, _owner(current_user))
+    if job is None:
+        return jsonify({"error": "Job not found or expired."}), 404
+    return jsonify(job)
+
+
+@jobs_bp.route("/<job_id>/events", methods=["GET"])
+@require_jwt
+def job_events(current_user, job_id: str):
+    """Server-Sent Events: one ``status`` event per state change, closed once the job is done."""
+    job_queue = _job_queue()
+    owner = _owner(current_user)
+    job = job_queue.get(job_id, owner)
+    if job is None:
+        return jsonify({"error": "Job not found or expired."}), 404
+
+    def stream():
+        current = job
+        yield format_event("status", current)
+        last_sent = time.monotonic()
+        while current["status"] not in ("succeeded", "failed"):
+            update = job_queue.wait(job_id, owner, current["version"], _SSE_HEARTBEAT_SECONDS)
+            if update is None:
+                yield format_event("error", {"error": "Job expired."})
+                return
+            if update["version"] != current["version"]:
+                current = update
+                yield format_event("status", current)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= _SSE_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@jobs_bp.route("/stats", methods=["GET"])
+@require_jwt
+def job_stats(current_user):
+    if not is_admin(current_user):
+        return jsonify({"error": "Admin access required."}), 403
+    return jsonify(_job_queue().stats())
@@ -2,22 +2,37 @@ from __future__ import annotations
 
 from flask import Blueprint, jsonify, request
 
+from routes.blobs import missing_blob_response, request_code
+from services.blob_store import BlobMissing
 from services.lint_service import run_lint_checks
+from utils.deadline import DeadlineExceeded, current_deadline
 from utils.jwt_utils import require_jwt
+from utils.profiling import profiled
+from utils.supersede import current_cancel_token, supersedable
 
 lint_bp = Blueprint("lint", __name__, url_prefix="/api/lint")
 
 
 @lint_bp.route("", methods=["POST"])
 @require_jwt
+@profiled("lint")
+@supersedable("lint")
 def lint_code(current_user):
     payload = request.get_json(force=True)
-    code = payload.get("code", "")
+    try:
+        code = request_code(current_user, payload)
+    except BlobMissing as exc:
+        return missing_blob_response(exc)
     language = payload.get("language", "javascript")
 
     if not code:
         return jsonify({"error": "Code payload is required."}), 400
 
-    lint_report = run_lint_checks(code, language)
+    try:
+        lint_report = run_lint_checks(code, language, deadline=current_deadline(), cancel=current_cancel_token())
+    except DeadlineExceeded as exc:
+        # Out of time for the external linter: fall back to the in-process checks
+        lint_report = run_lint_checks(code, language, engine="native")
+        return jsonify({"lintReport": lint_report, "user": current_user, "partial": True, "skipped": [exc.stage]})
     return jsonify({"lintReport": lint_report, "user": current_user})
 
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from flask import Blueprint, Response, current_app, jsonify, request
+
+from utils.jwt_utils import is_admin, require_jwt
+from utils.profiling import RequestProfiler
+
+profiles_bp = Blueprint("profiles", __name__, url_prefix="/api/profiles")
+
+
+def _profiler() -> RequestProfiler:
+    return current_app.config["PROFILER"]
+
+
+@profiles_bp.route("", methods=["GET"])
+@require_jwt
+def list_profiles(current_user):
+    if not is_admin(current_user):
+        return jsonify({"error": "Admin access required."}), 403
+    profiler = _profiler()
+    return jsonify({
+        "profiles": profiler.store.summaries(),
+        "sampleRates": profiler.sample_rates,
+        "sampleMode": profiler.sample_mode,
+    })
+
+
+@profiles_bp.route("/<profile_id>", methods=["GET"])
+@require_jwt
+def get_profile(current_user, profile_id: str):
+    if not is_admin(current_user):
+        return jsonify({"error": "Admin access required."}), 403
+    profile = _profiler().store.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found or evicted."}), 404
+    if request.args.get("format") == "collapsed":
+        if "collapsed" not in profile:
+            return jsonify({"error": "Profile has no CPU samples (memory mode)."}), 404
+        return Response("\n".join(profile["collapsed"]) + "\n", mimetype="text/plain")
+    return jsonify(profile)
@@ -2,23 +2,36 @@ from __future__ import annotations
 
 from flask import Blueprint, jsonify, request
 
+from routes.blobs import missing_blob_response, request_code
+from services.blob_store import BlobMissing
 from services.suggestion_service import request_suggestions
+from utils.deadline import DeadlineExceeded, current_deadline
 from utils.jwt_utils import require_jwt
+from utils.profiling import profiled
+from utils.supersede import current_cancel_token, supersedable
 
 suggestion_bp = Blueprint("suggestion", __name__, url_prefix="/api/suggest")
 
 
 @suggestion_bp.route("", methods=["POST"])
 @require_jwt
+@profiled("suggest")
+@supersedable("suggest")
 def suggest_code(current_user):
     payload = request.get_json(force=True)
-    code = payload.get("code", "")
+    try:
+        code = request_code(current_user, payload)
+    except BlobMissing as exc:
+        return missing_blob_response(exc)
     lint_report = payload.get("lintReport", [])
     language = payload.get("language", "javascript")
 
     if not code:
         return jsonify({"error": "Code payload is required."}), 400
 
-    suggestions = request_suggestions(code, lint_report, language)
+    try:
+        suggestions = request_suggestions(code, lint_report, language, deadline=current_deadline(), cancel=current_cancel_token())
+    except DeadlineExceeded as exc:
+        return jsonify({"error": "Deadline exceeded", "partial": True, "skipped": [exc.stage]}), 504
     return jsonify({"suggestions": suggestions, "user": current_user})
 
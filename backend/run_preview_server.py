@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
-"""Helper script to run the preview server."""
+"""Helper script to run the preview server (port 50000) for local development.
+
+Use ``python serve.py preview`` in production.
+"""
 
 import subprocess
 import sys
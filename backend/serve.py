@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Production entry point: runs the API or the preview server under gunicorn.
+
+    python serve.py api                      # 0.0.0.0:5000
+    python serve.py preview                  # 0.0.0.0:50000
+    python serve.py api --threads 64 --bind 127.0.0.1:8000
+
+Workers are forked from a master that has already imported the app
+(``preload_app``), each serving requests on a thread pool (``gthread``).
+``kill -TERM <master>`` drains in-flight requests before exiting and
+``kill -HUP <master>`` replaces the workers one by one without dropping
+connections. Because the code is preloaded, deploying new code needs a fresh
+master: send ``USR2`` to start one, then ``QUIT`` to the old master.
+
+``python app.py`` / ``python preview_server.py`` remain for local development
+with the Werkzeug debugger and reloader; they refuse to start when
+``APP_ENV=production``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import logging
+import os
+import signal
+import sys
+from typing import Any, Dict, List, Optional
+
+from flask import Flask
+from flask.helpers import get_debug_flag
+
+from config import get_settings
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn is POSIX-only and optional in development
+    BaseApplication = None
+
+logger = logging.getLogger(__name__)
+
+TARGETS = {"api": ("app", 5000), "preview": ("preview_server", 50000)}
+
+
+def default_workers(target: str) -> int:
+    cores = os.cpu_count() or 1
+    if target == "preview":
+        # Preview requests are short and cache-heavy; SSE streams are parked on threads
+        return cores
+    # Background jobs live in the API process that accepted them
+    return 1
+
+
+def default_threads(target: str) -> int:
+    if target == "preview":
+        # Every open live-reload stream holds a preview thread (up to PREVIEW_EVENTS_MAX_STREAMS per worker)
+        return 32
+    # The single API process serves on threads; most of its time is spent waiting on upstreams
+    return max(16, 8 * (os.cpu_count() or 1))
+
+
+def end_event_streams_on_exit(worker: Any) -> None:
+    """Gunicorn ``post_worker_init`` hook ending live-reload streams on ``SIGTERM``.
+
+    Workers get ``SIGTERM`` on shutdown and when ``HUP`` replaces them; without this
+    they would sit out the graceful timeout waiting on open preview tabs.
+    """
+    handle_exit = worker.handle_exit
+
+    def handle_exit_and_end_streams(sig: int, frame: Any) -> None:
+        importlib.import_module("preview_server")._preview_events.close()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_exit_and_end_streams)
+
+
+def run_development_server(app: Flask, port: int) -> None:
+    """Start the Werkzeug development server (debugger and reloader on unless FLASK_DEBUG=0)."""
+    settings = get_settings()
+    if settings.is_production:
+        raise SystemExit("APP_ENV=production: use 'python serve.py' instead of the development server.")
+    debug = get_debug_flag() if "FLASK_DEBUG" in os.environ else True
+    app.run(host="0.0.0.0", port=port, debug=debug)
+
+
+def build_options(args: argparse.Namespace) -> Dict[str, Any]:
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": "gthread",
+        "preload_app": True,
+        "keepalive": args.keepalive,
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "accesslog": "-" if args.access_log else None,
+        "errorlog": "-",
+        "loglevel": args.log_level,
+        "proc_name": f"kingpins-{args.target}",
+    }
+    if args.target == "preview":
+        options["post_worker_init"] = end_event_streams_on_exit
+    if os.path.isdir("/dev/shm"):
+        # Heartbeat files on tmpfs so a slow disk cannot stall workers
+        options["worker_tmp_dir"] = "/dev/shm"
+    return options
+
+
+def load_app(target: str) -> Flask:
+    """Import the target app in the master process, before workers are forked."""
+    module_name, _ = TARGETS[target]
+    module = importlib.import_module(module_name)
+    app: Flask = module.app
+    settings = get_settings()
+    settings.assert_debug_allowed(app.debug)
+    app.debug = False
+    # Forked children must not share the master's sqlite/redis connections
+    if target == "preview":
+        module._preview_store.close()
+        module._blob_store.close()
+    else:
+        app.config["BLOB_STORE"].close()
+    return app
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("target", choices=sorted(TARGETS))
+    parser.add_argument("--bind", help="host:port (default 0.0.0.0 on the app's usual port)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")), help="preview server: one per CPU core by default; the API always runs one")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("SERVE_THREADS", "0")), help="threads per worker")
+    parser.add_argument("--keepalive", type=int, default=int(os.getenv("SERVE_KEEPALIVE", "5")), help="seconds to hold idle keep-alive connections")
+    parser.add_argument("--timeout", type=int, default=int(os.getenv("SERVE_TIMEOUT", "120")), help="seconds before a silent worker is restarted")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30")), help="seconds to finish in-flight requests on shutdown/reload")
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("SERVE_MAX_REQUESTS", "5000")), help="recycle a worker after this many requests (0 disables)")
+    parser.add_argument("--log-level", default=os.getenv("SERVE_LOG_LEVEL", "info"))
+    parser.add_argument("--access-log", action="store_true", default=os.getenv("SERVE_ACCESS_LOG") == "1")
+    args = parser.parse_args(argv)
+
+    _, port = TARGETS[args.target]
+    args.bind = args.bind or f"0.0.0.0:{port}"
+    args.workers = args.workers or default_workers(args.target)
+    args.threads = args.threads or default_threads(args.target)
+
+    settings = get_settings()
+    if args.target == "api" and args.workers > 1:
+        # A job polled through another worker would be unknown there and answer 404
+        logger.warning("Background jobs are kept in the API process that accepted them; running a single API worker. Raise --threads instead.")
+        args.workers = 1
+    if args.target == "preview" and settings.preview_store_backend == "memory" and args.workers > 1:
+        # Each worker would hold its own copy of the store and miss the others' previews
+        logger.warning("PREVIEW_STORE=memory is per process; running a single preview worker. Use sqlite or redis to scale out.")
+        args.workers = 1
+    if args.target == "preview" and not 0 < settings.preview_events_max_streams < args.threads:
+        logger.warning(
+            f"PREVIEW_EVENTS_MAX_STREAMS={settings.preview_events_max_streams} lets live-reload streams take all "
+            f"{args.threads} threads of a preview worker; keep it below --threads so previews can still be served."
+        )
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+    if BaseApplication is None:
+        print("gunicorn is not installed (pip install gunicorn; POSIX only).", file=sys.stderr)
+        return 1
+    if get_debug_flag():
+        print("FLASK_DEBUG is set; debug mode is never used by the production server. Unset it.", file=sys.stderr)
+        return 1
+
+    class KingPinsApplication(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in build_options(args).items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self) -> Flask:
+            return load_app(args.target)
+
+    logger.info(f"Serving {args.target} on {args.bind} with {args.workers} workers x {args.threads} threads")
+    KingPinsApplication().run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
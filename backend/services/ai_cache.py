@@ -0,0 +1,275 @@
+"""Two-level cache for AI lint results: exact source, then normalized fingerprint.
+
+The second level keys on the token stream without whitespace or comments (and,
+optionally, with identifiers alpha-renamed in order of first use), so reformatting,
+re-commenting or renaming a variable still finds the earlier answer. A fingerprint
+hit re-applies the cached ``formatted_code`` to the new input: identifiers and
+comments are mapped back from the new source, and the result is re-tokenized
+(and, for Python, re-parsed) before it is served. Anything that does not validate
+is treated as a miss. In JavaScript (and HTML, for inline scripts) a line break
+between two tokens is kept in the stream, since automatic semicolon insertion makes
+``return\n{}`` and ``return {}`` different programs.
+
+Exact hits are shared by everyone; the code is the same, so is the answer. Normalized
+entries are kept per user, because their explanation and issues may quote
+identifiers and comments of the code they were computed for.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import keyword
+import re
+import threading
+import tokenize
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.document import Document, load_document
+
+# (kind, text, start offset, end offset); kind is "name", "comment" or "code"
+Token = Tuple[str, str, int, int]
+
+JS_KEYWORDS = {
+    "await", "break", "case", "catch", "class", "const", "continue", "debugger", "default", "delete",
+    "do", "else", "export", "extends", "false", "finally", "for", "function", "if", "import", "in",
+    "instanceof", "let", "new", "null", "of", "return", "super", "switch", "this", "throw", "true",
+    "try", "typeof", "undefined", "var", "void", "while", "with", "yield", "async", "static",
+}
+
+_GENERIC_TOKEN = re.compile(
+    r"""(?P<comment>//[^\n]*|/\*.*?\*/|<!--.*?-->)"""
+    r"""|(?P<string>`(?:\\.|[^`\\])*`|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')"""
+    r"""|(?P<name>[A-Za-z_$][\w$]*)"""
+    r"""|(?P<space>\s+)"""
+    r"""|(?P<other>.)""",
+    re.DOTALL,
+)
+_PYTHON_SKIP = {tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER}
+# Languages whose token streams keep line breaks (ASI in scripts)
+_LINE_BREAK_LANGUAGES = {"javascript", "html"}
+_LINE_TERMINATOR = re.compile("[\n\r\u2028\u2029]")
+
+
+class NotTokenizable(ValueError):
+    """Raised when source cannot be tokenized; such inputs only use the exact cache."""
+
+
+def _python_tokens(document: Document) -> List[Token]:
+    if document.python_token_error is not None:
+        raise NotTokenizable(str(document.python_token_error))
+    offsets = document.line_starts
+    tokens: List[Token] = []
+    for token in document.python_tokens:
+        if token.type in _PYTHON_SKIP:
+            continue
+        start = offsets[token.start[0] - 1] + token.start[1]
+        end = offsets[token.end[0] - 1] + token.end[1] if token.end[0] <= len(offsets) else len(document.text)
+        if token.type == tokenize.COMMENT:
+            tokens.append(("comment", token.string, start, end))
+        elif token.type == tokenize.NAME and not keyword.iskeyword(token.string):
+            tokens.append(("name", token.string, start, end))
+        elif token.type in (tokenize.INDENT, tokenize.DEDENT, tokenize.NEWLINE):
+            # Block structure matters in Python, its exact whitespace does not
+            tokens.append(("code", tokenize.tok_name[token.type], start, end))
+        else:
+            tokens.append(("code", token.string, start, end))
+    return tokens
+
+
+def _generic_tokens(code: str, language: str) -> List[Token]:
+    tokens: List[Token] = []
+    keep_breaks = language in _LINE_BREAK_LANGUAGES
+    line_break: Optional[int] = None
+    seen_code = False
+    for match in _GENERIC_TOKEN.finditer(code):
+        kind = match.lastgroup
+        text = match.group(0)
+        if kind in ("space", "comment"):
+            # A comment spanning lines counts as a line break for ASI too
+            if keep_breaks and line_break is None and _LINE_TERMINATOR.search(text):
+                line_break = match.start()
+            if kind == "comment":
+                tokens.append(("comment", text, match.start(), match.end()))
+            continue
+        if line_break is not None and seen_code:
+            tokens.append(("code", "\n", line_break, line_break))
+        line_break, seen_code = None, True
+        if kind == "name" and language == "javascript" and text not in JS_KEYWORDS:
+            tokens.append(("name", text, match.start(), match.end()))
+        else:
+            tokens.append(("code", text, match.start(), match.end()))
+    return tokens
+
+
+def tokenize_source(code: str, language: str) -> List[Token]:
+    """Cache tokens for ``code``; computed once per shared ``Document``. Raises ``NotTokenizable``."""
+    document = load_document(code)
+    if language == "python":
+        return document.memo("cache_tokens:python", lambda: _python_tokens(document))
+    return document.memo(f"cache_tokens:{language}", lambda: _generic_tokens(code, language))
+
+
+def _first_use_order(tokens: List[Token]) -> List[str]:
+    seen: Dict[str, None] = {}
+    for kind, text, _, _ in tokens:
+        if kind == "name":
+            seen.setdefault(text, None)
+    return list(seen)
+
+
+def fingerprint(tokens: List[Token], rename: bool) -> str:
+    """Hash of the token stream without comments; names become ``v<n>`` when ``rename`` is set."""
+    canonical = {name: f"v{index}" for index, name in enumerate(_first_use_order(tokens))} if rename else {}
+    digest = hashlib.sha256()
+    for kind, text, _, _ in tokens:
+        if kind == "comment":
+            continue
+        digest.update(canonical.get(text, text).encode("utf-8") if kind == "name" else text.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _comments(tokens: List[Token]) -> List[str]:
+    return [text for kind, text, _, _ in tokens if kind == "comment"]
+
+
+def reapply(cached_code: str, cached_formatted: str, code: str, language: str, rename: bool) -> Optional[str]:
+    """Carry the fix ``cached_code -> cached_formatted`` over to ``code``, or ``None`` if unsafe."""
+    try:
+        old_tokens = tokenize_source(cached_code, language)
+        new_tokens = tokenize_source(code, language)
+        fixed_tokens = tokenize_source(cached_formatted, language)
+    except NotTokenizable:
+        return None
+
+    names = dict(zip(_first_use_order(old_tokens), _first_use_order(new_tokens))) if rename else {}
+    old_comments, new_comments = _comments(old_tokens), _comments(new_tokens)
+    comments = dict(zip(old_comments, new_comments)) if len(old_comments) == len(new_comments) else None
+    # Names the fix introduced must not collide with names the new source uses differently
+    introduced = {text for kind, text, _, _ in fixed_tokens if kind == "name"} - set(names)
+    if introduced & set(names.values()):
+        return None
+
+    parts: List[str] = []
+    position = 0
+    for kind, text, start, end in fixed_tokens:
+        if kind == "name" and text in names:
+            replacement = names[text]
+        elif kind == "comment" and text in old_comments:
+            if comments is None:
+                return None
+            replacement = comments[text]
+        else:
+            continue
+        parts.append(cached_formatted[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(cached_formatted[position:])
+    candidate = "".join(parts)
+
+    try:
+        candidate_tokens = tokenize_source(candidate, language)
+    except NotTokenizable:
+        return None
+    expected = [names.get(text, text) if kind == "name" else text for kind, text, _, _ in fixed_tokens if kind != "comment"]
+    actual = [text for kind, text, _, _ in candidate_tokens if kind != "comment"]
+    if expected != actual:
+        return None
+    if language == "python" and load_document(candidate).syntax_error is not None:
+        return None
+    return candidate
+
+
+@dataclass
+class _Entry:
+    code: str
+    language: str
+    output: Dict[str, Any]
+
+
+class SemanticCache:
+    """Bounded LRU of AI lint outputs with exact and normalized lookups."""
+
+    def __init__(self, max_entries: int = 512, rename_identifiers: bool = False):
+        self.max_entries = max_entries
+        self.rename_identifiers = rename_identifiers
+        self._exact: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._normalized: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"exactHits": 0, "normalizedHits": 0, "misses": 0, "rejected": 0, "stores": 0}
+
+    @staticmethod
+    def _exact_key(code: str, language: str) -> str:
+        return hashlib.sha256(f"{language}\x00{code}".encode("utf-8")).hexdigest()
+
+    def _normalized_key(self, code: str, language: str, owner: str) -> Optional[str]:
+        try:
+            return f"{owner}:{language}:{fingerprint(tokenize_source(code, language), self.rename_identifiers)}"
+        except NotTokenizable:
+            return None
+
+    @staticmethod
+    def _touch(table: "OrderedDict[str, _Entry]", key: str, entry: _Entry, limit: int) -> None:
+        table[key] = entry
+        table.move_to_end(key)
+        while len(table) > limit:
+            table.popitem(last=False)
+
+    def lookup(self, code: str, language: str, owner: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Return ``(output, "exact" | "normalized")`` for ``code`` or ``None`` on a miss.
+
+        Normalized hits only come from entries ``owner`` stored.
+        """
+        exact_key = self._exact_key(code, language)
+        with self._lock:
+            entry = self._exact.get(exact_key)
+            if entry is not None:
+                self._exact.move_to_end(exact_key)
+                self._stats["exactHits"] += 1
+                return copy.deepcopy(entry.output), "exact"
+
+        normalized_key = self._normalized_key(code, language, owner)
+        with self._lock:
+            entry = self._normalized.get(normalized_key) if normalized_key else None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._normalized.move_to_end(normalized_key)
+
+        output = copy.deepcopy(entry.output)
+        formatted = output.get("formatted_code")
+        if formatted:
+            rebased = reapply(entry.code, formatted, code, language, self.rename_identifiers)
+            if rebased is None:
+                with self._lock:
+                    self._stats["rejected"] += 1
+                    self._stats["misses"] += 1
+                return None
+            output["formatted_code"] = rebased
+        with self._lock:
+            self._stats["normalizedHits"] += 1
+        return output, "normalized"
+
+    def store(self, code: str, language: str, output: Dict[str, Any], owner: str) -> None:
+        entry = _Entry(code=code, language=language, output=copy.deepcopy(output))
+        normalized_key = self._normalized_key(code, language, owner)
+        with self._lock:
+            self._touch(self._exact, self._exact_key(code, language), entry, self.max_entries)
+            if normalized_key:
+                self._touch(self._normalized, normalized_key, entry, self.max_entries)
+            self._stats["stores"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["exactHits"] + self._stats["normalizedHits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._exact),
+                "maxEntries": self.max_entries,
+                "renameIdentifiers": self.rename_identifiers,
+                "upstreamCallsSaved": self._stats["exactHits"] + self._stats["normalizedHits"],
+                "hitRate": round((lookups - self._stats["misses"]) / lookups, 4) if lookups else 0.0,
+            }
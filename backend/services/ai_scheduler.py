@@ -0,0 +1,277 @@
+"""Per-user quotas and weighted fair queueing in front of the OpenAI calls."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional
+
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.supersede import CancelToken, Superseded
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceeded(Exception):
+    """Raised when a user is over quota; ``retry_after`` is in seconds."""
+
+    def __init__(self, uid: str, reason: str, retry_after: float):
+        super().__init__(f"AI quota exceeded for {uid}: {reason}")
+        self.uid = uid
+        self.reason = reason
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at ``rate`` per second."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if available now)."""
+        self._refill(now)
+        # Oversized requests only need a full bucket, otherwise they could never run.
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass
+class _Ticket:
+    uid: str
+    cost: float
+    finish_tag: float
+    enqueued_at: float
+    granted: bool = False
+
+
+@dataclass
+class _UserState:
+    requests: TokenBucket
+    tokens: TokenBucket
+    weight: float = 1.0
+    last_finish: float = 0.0
+    queue: Deque[_Ticket] = field(default_factory=deque)
+    active: int = 0
+    completed: int = 0
+    rejected: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    last_wait: float = 0.0
+    last_seen: float = field(default_factory=time.monotonic)
+
+
+class AIScheduler:
+    """Admits AI calls per user and dispatches them fairly onto a fixed number of slots.
+
+    Each user has a request bucket and a token bucket; a call that would overdraw
+    either is rejected immediately with a retry-after instead of queueing. Admitted
+    calls wait in a per-user FIFO and free slots go to the queued call with the
+    smallest virtual finish time (start-time fair queueing weighted by token cost),
+    so one user submitting many large files cannot starve everyone else.
+
+    All state lives in this process, so quotas and ``max_concurrency`` hold only
+    while the API runs as a single process (``serve.py`` enforces this). Users idle
+    for ``idle_timeout`` seconds with full buckets are forgotten, along with their
+    per-user stats.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        requests_per_minute: float = 30,
+        tokens_per_minute: float = 60000,
+        max_queue_per_user: int = 4,
+        queue_timeout: float = 60.0,
+        idle_timeout: float = 600.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self.idle_timeout = idle_timeout
+        self._users: Dict[str, _UserState] = {}
+        self._virtual_time = 0.0
+        self._active = 0
+        self._rejected = 0
+        self._last_sweep = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _user(self, uid: str) -> _UserState:
+        state = self._users.get(uid)
+        if state is None:
+            state = _UserState(
+                requests=TokenBucket(self.requests_per_minute, self.requests_per_minute / 60.0),
+                tokens=TokenBucket(self.tokens_per_minute, self.tokens_per_minute / 60.0),
+            )
+            self._users[uid] = state
+        return state
+
+    def _evict_idle(self, now: float) -> None:
+        if now - self._last_sweep < self.idle_timeout:
+            return
+        self._last_sweep = now
+        for uid, state in list(self._users.items()):
+            if state.queue or state.active or state.weight != 1.0 or now - state.last_seen < self.idle_timeout:
+                continue
+            # With full buckets a fresh state enforces exactly the same limits
+            if state.requests.full(now) and state.tokens.full(now):
+                del self._users[uid]
+
+    def _reject(self, state: _UserState) -> None:
+        state.rejected += 1
+        self._rejected += 1
+
+    def _refund(self, state: _UserState, ticket: _Ticket) -> None:
+        """Drop a queued ticket; it was never sent to OpenAI, so its tokens go back to the user."""
+        state.queue.remove(ticket)
+        state.tokens.give_back(ticket.cost)
+
+    def set_weight(self, uid: str, weight: float) -> None:
+        with self._cond:
+            self._user(uid).weight = max(weight, 0.01)
+
+    def _admit(self, uid: str, cost: float) -> _Ticket:
+        now = time.monotonic()
+        self._evict_idle(now)
+        state = self._user(uid)
+        state.last_seen = now
+        if len(state.queue) >= self.max_queue_per_user:
+            self._reject(state)
+            raise QuotaExceeded(uid, "too many queued requests", self.queue_timeout / max(self.max_queue_per_user, 1))
+        wait = max(state.requests.wait_time(1, now), state.tokens.wait_time(cost, now))
+        if wait > 0:
+            self._reject(state)
+            reason = "request rate" if state.requests.wait_time(1, now) > 0 else "token rate"
+            raise QuotaExceeded(uid, reason, wait)
+        state.requests.take(1)
+        state.tokens.take(cost)
+
+        start = max(self._virtual_time, state.last_finish)
+        state.last_finish = start + cost / state.weight
+        ticket = _Ticket(uid=uid, cost=cost, finish_tag=state.last_finish, enqueued_at=now)
+        state.queue.append(ticket)
+        return ticket
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrency:
+            heads = [state.queue[0] for state in self._users.values() if state.queue and not state.queue[0].granted]
+            if not heads:
+                return
+            ticket = min(heads, key=lambda t: t.finish_tag)
+            state = self._users[ticket.uid]
+            state.queue.popleft()
+            ticket.granted = True
+            self._virtual_time = max(self._virtual_time, ticket.finish_tag - ticket.cost / state.weight)
+            self._active += 1
+            state.active += 1
+            self._cond.notify_all()
+
+    def _wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def submit(
+        self,
+        uid: str,
+        cost: float,
+        fn: Callable[[], Any],
+        request_deadline: Optional[Deadline] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Any:
+        """Run ``fn`` once ``uid`` is admitted and a slot is free.
+
+        Raises ``QuotaExceeded`` (also when the call waits longer than
+        ``queue_timeout``), ``DeadlineExceeded`` if ``request_deadline`` passes
+        while the call is still queued, or ``Superseded`` if ``cancel`` is
+        cancelled before the call gets a slot. A call that never got a slot has
+        its token cost refunded.
+        """
+        if cancel is not None:
+            cancel.on_cancel(self._wake)
+        with self._cond:
+            ticket = self._admit(uid, cost)
+            self._dispatch()
+            deadline = ticket.enqueued_at + self.queue_timeout
+            if request_deadline is not None:
+                deadline = min(deadline, request_deadline.expires_at)
+            while not ticket.granted:
+                if cancel is not None and cancel.cancelled:
+                    self._refund(self._users[uid], ticket)
+                    raise Superseded("ai_queue")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    state = self._users[uid]
+                    self._refund(state, ticket)
+                    self._reject(state)
+                    if request_deadline is not None and request_deadline.expired:
+                        raise DeadlineExceeded("ai_queue")
+                    raise QuotaExceeded(uid, "queue wait timeout", 1)
+                self._cond.wait(remaining)
+            state = self._users[uid]
+            waited = time.monotonic() - ticket.enqueued_at
+            state.last_wait = waited
+            state.total_wait += waited
+            state.max_wait = max(state.max_wait, waited)
+
+        try:
+            return fn()
+        finally:
+            with self._cond:
+                self._active -= 1
+                state.active -= 1
+                state.completed += 1
+                state.last_seen = time.monotonic()
+                self._dispatch()
+
+    def stats(self, uid: Optional[str] = None) -> Dict[str, Any]:
+        with self._cond:
+            users = {}
+            for key, state in self._users.items():
+                if uid is not None and key != uid:
+                    continue
+                users[key] = {
+                    "queueDepth": len(state.queue),
+                    "active": state.active,
+                    "completed": state.completed,
+                    "rejected": state.rejected,
+                    "lastWaitMs": round(state.last_wait * 1000, 2),
+                    "avgWaitMs": round(state.total_wait / state.completed * 1000, 2) if state.completed else 0.0,
+                    "maxWaitMs": round(state.max_wait * 1000, 2),
+                    "weight": state.weight,
+                }
+            return {
+                "maxConcurrency": self.max_concurrency,
+                "active": self._active,
+                "queued": sum(len(state.queue) for state in self._users.values()),
+                "rejected": self._rejected,
+                "users": users,
+            }
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough OpenAI token estimate (~4 characters per token)."""
+    return max(1, sum(len(text) for text in texts) // 4)
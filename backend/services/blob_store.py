@@ -0,0 +1,123 @@
+"""Content-addressed source blobs so clients can send a hash instead of the code.
+
+Blobs are keyed by the SHA-256 of their UTF-8 text within the owner's namespace
+(the same one previews use), so one user cannot probe for another user's code.
+Storage reuses the preview store backends with their own byte budget and TTL;
+with the ``sqlite`` or ``redis`` backend the API and the preview server see the
+same blobs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+from services.preview_store import (
+    MemoryPreviewStore,
+    PreviewEntry,
+    PreviewStore,
+    PreviewTooLarge,
+    RedisPreviewStore,
+    SQLitePreviewStore,
+    namespace_for,
+)
+from utils.metrics import record_cache
+
+# Hex-encoded SHA-256
+DIGEST_LENGTH = 64
+MAX_CHECK_HASHES = 256
+
+
+class BlobMissing(KeyError):
+    """Raised when a ``code_ref`` names a blob the server does not hold (or no longer holds)."""
+
+    def __init__(self, digest: str):
+        super().__init__(digest)
+        self.digest = digest
+
+
+class BlobTooLarge(PreviewTooLarge):
+    """Raised when a blob is larger than the whole blob store budget."""
+
+
+def blob_digest(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def is_digest(value: Any) -> bool:
+    return isinstance(value, str) and len(value) == DIGEST_LENGTH and all(char in "0123456789abcdef" for char in value)
+
+
+class BlobStore:
+    def __init__(self, store: PreviewStore):
+        self.store = store
+
+    @staticmethod
+    def _key(owner: str, digest: str) -> str:
+        return f"blob:{namespace_for(owner)}:{digest}"
+
+    def get(self, owner: str, digest: str) -> Optional[str]:
+        entry = self.store.get(self._key(owner, digest)) if is_digest(digest) else None
+        record_cache("blob", entry is not None)
+        return entry.code if entry is not None else None
+
+    def missing(self, owner: str, digests: Iterable[str]) -> List[str]:
+        return [digest for digest in digests if not is_digest(digest) or self.store.get(self._key(owner, digest)) is None]
+
+    def put(self, owner: str, code: str, digest: Optional[str] = None) -> str:
+        """Store ``code`` and return its digest.
+
+        Raises ``ValueError`` if ``digest`` does not match and ``BlobTooLarge`` if the
+        blob exceeds the store budget.
+        """
+        actual = blob_digest(code)
+        if digest is not None and digest != actual:
+            raise ValueError(f"Content hashes to {actual}, not {digest}.")
+        entry = PreviewEntry(code=code, filename="", type="blob", code_hash=actual)
+        try:
+            self.store.put(self._key(owner, actual), entry)
+        except PreviewTooLarge as exc:
+            raise BlobTooLarge(f"Blob is {entry.size} bytes stored; blobs may take at most {self.store.max_bytes} (BLOB_MAX_BYTES).") from exc
+        return actual
+
+    def resolve(self, owner: str, payload: Dict[str, Any]) -> str:
+        """The request's source: inline ``code`` (remembered for next time) or the blob named by ``code_ref``.
+
+        Raises ``BlobMissing`` for an unknown reference.
+        """
+        code = payload.get("code")
+        if code:
+            if isinstance(code, str) and self.store.get(self._key(owner, blob_digest(code))) is None:
+                try:
+                    self.put(owner, code)
+                except PreviewTooLarge:
+                    pass  # still served inline, just not remembered
+            return code
+        reference = payload.get("code_ref")
+        if not reference:
+            return ""
+        stored = self.get(owner, reference)
+        if stored is None:
+            raise BlobMissing(reference)
+        return stored
+
+    def stats(self) -> Dict[str, Any]:
+        return self.store.stats()
+
+    def close(self) -> None:
+        self.store.close()
+
+
+def create_blob_store(backend: str, max_bytes: int, ttl: float, path: Optional[str] = None, redis_url: Optional[str] = None) -> BlobStore:
+    """Build the configured backend (``memory``, ``sqlite`` or ``redis``) for blobs."""
+    backend = (backend or "memory").lower()
+    if backend == "memory":
+        return BlobStore(MemoryPreviewStore(max_bytes=max_bytes, ttl=ttl))
+    if backend == "sqlite":
+        path = path or os.path.join(tempfile.gettempdir(), "kingpins-blobs.sqlite3")
+        return BlobStore(SQLitePreviewStore(path, max_bytes=max_bytes, ttl=ttl))
+    if backend == "redis":
+        return BlobStore(RedisPreviewStore(redis_url or "redis://localhost:6379/0", max_bytes=max_bytes, ttl=ttl, prefix="kingpins:blob:"))
+    raise ValueError(f"Unknown blob store backend: {backend}")
@@ -0,0 +1,184 @@
+"""Parsed view of one source text, shared by the stages that handle it.
+
+Lint rules, the AI cache's tokenizer, patch generation and line-delta updates all
+need some of the same derived data: line boundaries, Python tokens, the ``ast``
+tree. ``load_document`` hands every stage the same ``Document`` for the same
+text (a small LRU bounded by total characters), and each property is computed on
+first use only.
+"""
+
+from __future__ import annotations
+
+import ast
+import bisect
+import io
+import re
+import threading
+import tokenize
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.metrics import record_cache
+
+# Texts kept parsed across requests; derived data is several times the size of the text
+DOCUMENT_CACHE_ENTRIES = 32
+DOCUMENT_CACHE_CHARS = 4 * 1024 * 1024
+
+_DEFINITION_NODES = {ast.FunctionDef: "function", ast.AsyncFunctionDef: "function", ast.ClassDef: "class"}
+
+
+@dataclass(frozen=True)
+class Definition:
+    name: str
+    kind: str
+    # 1-based, inclusive; ``start`` includes decorators
+    start: int
+    end: int
+    node: ast.AST
+
+
+def _memoized(method: Callable[["Document"], Any]) -> property:
+    """Compute once per document, through ``Document.memo``.
+
+    Not ``functools.cached_property``: before Python 3.12 it holds one lock per
+    property for all instances, so parsing one large file would block every other
+    thread asking for the same property of a different document.
+    """
+    key = f"document.{method.__name__}"
+
+    @wraps(method)
+    def getter(self: "Document") -> Any:
+        return self.memo(key, lambda: method(self))
+
+    return property(getter)
+
+
+class Document:
+    def __init__(self, text: str):
+        self.text = text
+        self._memo: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    # ---------- lines ----------
+    @_memoized
+    def line_starts(self) -> List[int]:
+        """Offset of the first character of every line (lines end at line feeds)."""
+        return [0] + [match.end() for match in re.finditer("\n", self.text)]
+
+    @_memoized
+    def lines(self) -> List[str]:
+        """Lines with their line endings, split on line feeds only."""
+        return io.StringIO(self.text).readlines()
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """1-based ``(line, column)`` of a character offset."""
+        line = bisect.bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def offset(self, line: int, column: int = 1) -> int:
+        """Character offset of a 1-based ``(line, column)``."""
+        return self.line_starts[line - 1] + column - 1
+
+    # ---------- Python ----------
+    @_memoized
+    def _python_tokens(self) -> Tuple[List[tokenize.TokenInfo], Optional[Exception]]:
+        tokens: List[tokenize.TokenInfo] = []
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(self.text).readline):
+                tokens.append(token)
+        except (tokenize.TokenError, IndentationError, SyntaxError) as exc:
+            return tokens, exc
+        return tokens, None
+
+    @property
+    def python_tokens(self) -> List[tokenize.TokenInfo]:
+        """Tokens up to the first tokenizer error, if any (see ``python_token_error``)."""
+        return self._python_tokens[0]
+
+    @property
+    def python_token_error(self) -> Optional[Exception]:
+        return self._python_tokens[1]
+
+    @_memoized
+    def _python_tree(self) -> Tuple[Optional[ast.Module], Optional[SyntaxError]]:
+        try:
+            return ast.parse(self.text), None
+        except SyntaxError as exc:
+            return None, exc
+
+    @property
+    def tree(self) -> Optional[ast.Module]:
+        return self._python_tree[0]
+
+    @property
+    def syntax_error(self) -> Optional[SyntaxError]:
+        return self._python_tree[1]
+
+    @_memoized
+    def nodes(self) -> List[ast.AST]:
+        """Every node of ``tree`` in ``ast.walk`` order, walked once."""
+        return list(ast.walk(self.tree)) if self.tree is not None else []
+
+    @_memoized
+    def definitions(self) -> List[Definition]:
+        """Functions and classes, nested ones included, outer before inner (``ast.walk`` order)."""
+        spans = []
+        for node in self.nodes:
+            kind = _DEFINITION_NODES.get(type(node))
+            if kind is None:
+                continue
+            start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+            spans.append(Definition(node.name, kind, start, node.end_lineno or node.lineno, node))
+        return spans
+
+    # ---------- anything else ----------
+    def memo(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Cache derived data other modules compute from this text (masked source, cache tokens).
+
+        Threads asking for the same key of this document wait for one computation;
+        other keys and other documents are not blocked.
+        """
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._memo:
+                self._memo[key] = factory()
+        return self._memo[key]
+
+
+_cache: "OrderedDict[str, Document]" = OrderedDict()
+_cache_chars = 0
+_cache_lock = threading.Lock()
+
+
+def load_document(text: str) -> Document:
+    """The shared ``Document`` for ``text``, parsed lazily and kept while recently used."""
+    global _cache_chars
+    with _cache_lock:
+        document = _cache.get(text)
+        if document is not None:
+            _cache.move_to_end(text)
+            record_cache("document", True)
+            return document
+    record_cache("document", False)
+    document = Document(text)
+    if len(text) > DOCUMENT_CACHE_CHARS:
+        return document
+    with _cache_lock:
+        # Another thread may have cached the same text meanwhile; keep a single copy
+        existing = _cache.get(text)
+        if existing is not None:
+            return existing
+        _cache[text] = document
+        _cache_chars += len(text)
+        while len(_cache) > DOCUMENT_CACHE_ENTRIES or _cache_chars > DOCUMENT_CACHE_CHARS:
+            evicted, _ = _cache.popitem(last=False)
+            _cache_chars -= len(evicted)
+    return document
@@ -0,0 +1,557 @@
+"""Deterministic in-process formatters for ``/api/format`` and the language server.
+
+Python is formatted with black when it is installed and with the built-in
+re-indenter otherwise; CSS is re-flowed one declaration per line; JavaScript and
+HTML keep their line breaks and only have indentation, trailing whitespace and
+blank lines normalised. None of the built-in formatters change anything inside
+strings, comments, template literals or ``<pre>`` blocks. Results are memoised
+on the shared ``Document``, so formatting unchanged text again is a dict lookup.
+"""
+
+from __future__ import annotations
+
+import ast
+import bisect
+import logging
+import re
+import tokenize
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from services.document import Document, load_document
+from services.native_lint import VOID_ELEMENTS
+
+try:
+    import black
+except ImportError:  # optional: the built-in Python formatter is used instead
+    black = None
+
+logger = logging.getLogger(__name__)
+
+PYTHON_INDENT = "    "
+INDENT = "  "
+
+
+class FormatError(ValueError):
+    """Raised when the source cannot be parsed well enough to format it safely."""
+
+    def __init__(self, message: str, line: Optional[int] = None, column: Optional[int] = None):
+        super().__init__(message)
+        self.line = line
+        self.column = column
+
+
+@dataclass(frozen=True)
+class FormatResult:
+    formatted: str
+    formatter: str
+
+
+def _collapse_blank_lines(lines: List[str], keep: int, verbatim: Set[int] = frozenset()) -> str:
+    """Join ``lines`` (no line endings), keeping at most ``keep`` blank lines in a row and one final newline."""
+    output: List[str] = []
+    blank = 0
+    for number, line in enumerate(lines, start=1):
+        if not line and number not in verbatim:
+            blank += 1
+            if blank > keep or not output:
+                continue
+        else:
+            blank = 0
+        output.append(line)
+    while output and not output[-1]:
+        output.pop()
+    return "\n".join(output) + "\n" if output else ""
+
+
+# ---------- Python ----------
+def _format_python_black(document: Document) -> str:
+    try:
+        return black.format_str(document.text, mode=black.Mode())
+    except black.InvalidInput as exc:
+        raise FormatError(f"Cannot parse Python source: {exc}") from exc
+
+
+def _format_python_builtin(document: Document) -> str:
+    """Re-indent blocks to four spaces, strip trailing whitespace and cap blank lines at two."""
+    if document.syntax_error is not None:
+        error = document.syntax_error
+        raise FormatError(f"Cannot parse Python source: {error.msg}", error.lineno, error.offset)
+    lines = [line.rstrip("\r\n") for line in document.lines]
+    # Lines that start inside a multi-line string keep their indentation; lines that end inside one keep their trailing whitespace
+    keep_indent: Set[int] = set()
+    keep_end: Set[int] = set()
+    first_lines: Dict[int, int] = {}  # first line of each logical line -> its block depth
+    continuation: Dict[int, int] = {}  # other lines of a logical line -> its first line
+    depth = 0
+    first: Optional[int] = None
+    fstring_starts: List[Tuple[int, int]] = []
+    fstring_start = getattr(tokenize, "FSTRING_START", None)
+    fstring_end = getattr(tokenize, "FSTRING_END", None)
+    for token in document.python_tokens:
+        kind, (start_line, _), (end_line, _) = token.type, token.start, token.end
+        if kind == fstring_start:
+            fstring_starts.append(token.start)
+        elif kind == fstring_end and fstring_starts:
+            start_line = fstring_starts.pop()[0]
+        if kind in (tokenize.STRING, fstring_end) and end_line > start_line:
+            keep_end.update(range(start_line, end_line))
+            keep_indent.update(range(start_line + 1, end_line + 1))
+        if kind == tokenize.INDENT:
+            depth += 1
+        elif kind == tokenize.DEDENT:
+            depth -= 1
+        elif kind == tokenize.NEWLINE:
+            for line in range(first + 1, token.start[0] + 1) if first is not None else ():
+                continuation[line] = first
+            first = None
+        elif kind not in (tokenize.NL, tokenize.COMMENT, tokenize.ENCODING, tokenize.ENDMARKER) and first is None:
+            first = start_line
+            first_lines[first] = depth
+
+    def leading(line: str) -> int:
+        return len(line.expandtabs(8)) - len(line.expandtabs(8).lstrip())
+
+    # Comment-only lines follow the code line next to them at the same old indentation
+    code_lines = sorted(first_lines)
+    new_width = {number: first_lines[number] * len(PYTHON_INDENT) for number in code_lines}
+
+    def comment_indent(number: int, width: int) -> int:
+        position = bisect.bisect_left(code_lines, number)
+        following = code_lines[position] if position < len(code_lines) else None
+        preceding = code_lines[position - 1] if position > 0 else None
+        if following is not None and leading(lines[following - 1]) == width:
+            return new_width[following]
+        if preceding is not None and leading(lines[preceding - 1]) == width:
+            return new_width[preceding]
+        if width == 0 or following is None:
+            return 0
+        return new_width[following]
+
+    output = []
+    for number, line in enumerate(lines, start=1):
+        text = line if number in keep_end else line.rstrip()
+        if number in keep_indent or not text.strip():
+            output.append(text if number in keep_indent else "")
+            continue
+        body = text.lstrip()
+        if number in first_lines:
+            indent = first_lines[number] * len(PYTHON_INDENT)
+        elif number in continuation:
+            head = continuation[number]
+            shift = first_lines[head] * len(PYTHON_INDENT) - leading(lines[head - 1])
+            indent = max(0, leading(text) + shift)
+        else:  # comment-only line
+            indent = comment_indent(number, leading(text))
+        output.append(" " * indent + body)
+
+    formatted = _collapse_blank_lines(output, 2, keep_indent)
+    if formatted != document.text and ast.dump(ast.parse(formatted)) != ast.dump(document.tree):
+        # Never hand back code that means something else; this would be a formatter bug
+        logger.warning("Built-in Python formatter changed the AST; returning the source unchanged")
+        return document.text
+    return formatted
+
+
+# ---------- CSS ----------
+_CSS_TOKEN = re.compile(
+    r"""/\*.*?\*/|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'"""
+    # Parentheses are one token so ``;`` in ``url(data:...;base64,...)`` does not end the declaration
+    r"""|\((?:[^()"']|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')*\)|[{};]|[^{};"'/(]+|[/(]""",
+    re.DOTALL,
+)
+
+
+def _split_selectors(selector: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for char in selector:
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += char
+    return parts + [current.strip()]
+
+
+def _css_lines(document: Document) -> Tuple[List[str], Set[int]]:
+    """One selector, declaration and closing brace per line, two-space indentation.
+
+    Returns the lines and the (empty) set of lines to leave alone; multi-line
+    comments are kept as single entries so only their first line is indented.
+    """
+    lines: List[str] = []
+    pieces: List[str] = []
+    depth = 0
+
+    def pending() -> str:
+        # Collapse whitespace outside strings and comments
+        return "".join(piece if piece[:1] in "\"'(" or piece.startswith("/*") else re.sub(r"\s+", " ", piece) for piece in pieces).strip()
+
+    def emit(text: str) -> None:
+        lines.append(INDENT * depth + text)
+
+    def declaration(text: str) -> str:
+        if depth == 0 or text.startswith("@") or ":" not in text:
+            return text
+        name, value = text.split(":", 1)
+        return f"{name.strip()}: {value.strip()}"
+
+    for match in _CSS_TOKEN.finditer(document.text):
+        token = match.group(0)
+        if token.startswith("/*") and not pending():
+            pieces.clear()
+            emit(token)
+        elif token == "{":
+            selector = pending()
+            pieces.clear()
+            selectors = [selector] if selector.startswith("@") else _split_selectors(selector)
+            for part in selectors[:-1]:
+                emit(part + ",")
+            emit(f"{selectors[-1]} {{" if selectors[-1] else "{")
+            depth += 1
+        elif token == ";":
+            statement = pending()
+            pieces.clear()
+            if statement:
+                emit(declaration(statement) + ";")
+        elif token == "}":
+            statement = pending()
+            pieces.clear()
+            if statement:
+                emit(declaration(statement) + ";")
+            depth = max(0, depth - 1)
+            emit("}")
+            if depth == 0:
+                lines.append("")
+        else:
+            pieces.append(token)
+    if pending():
+        emit(pending())
+    return lines, set()
+
+
+def _format_css(document: Document) -> str:
+    lines, verbatim = _css_lines(document)
+    return _collapse_blank_lines(lines, 1, verbatim)
+
+
+# ---------- JavaScript ----------
+_JS_TOKEN = re.compile(
+    r"""(?P<newline>\n)|(?P<space>[ \t\r\f\v]+)|(?P<line_comment>//[^\n]*)|(?P<block_comment>/\*.*?(?:\*/|\Z))"""
+    r"""|(?P<string>"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?)|(?P<template>`)|(?P<open>[({\[])|(?P<close>[)}\]])"""
+    r"""|(?P<word>[\w$]+)|(?P<slash>/)|(?P<other>.)""",
+    re.DOTALL,
+)
+_JS_REGEX_BODY = re.compile(r"(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\[\n])+/[a-z]*")
+_JS_REGEX_AFTER = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else", "yield", "await"}
+_JS_CONTINUATION = re.compile(r"^(?:\.(?!\.\.)|\?\.|\?\?|\?|&&|\|\|)")
+_JS_CASE = re.compile(r"^(?:case\b.*|default\s*):")
+
+
+def _scan_template(text: str, index: int) -> Tuple[int, bool]:
+    """Index after the template part starting at ``index`` and whether it stopped at ``${``."""
+    while index < len(text):
+        char = text[index]
+        if char == "\\":
+            index += 2
+        elif char == "`":
+            return index + 1, False
+        elif text.startswith("${", index):
+            return index + 2, True
+        else:
+            index += 1
+    return index, False
+
+
+def _javascript_lines(document: Document) -> Tuple[List[str], Set[int]]:
+    """Re-indent by bracket nesting (two spaces), keeping the author's line breaks.
+
+    A line is indented one level deeper than the line that opened its innermost
+    bracket, so ``foo(function () {`` indents its body once, and a line starting
+    with closing brackets lines up with the line that opened them. Returns the
+    lines and the numbers of lines that start inside a comment, template literal
+    or string continued with a backslash, which are left as they are.
+    """
+    text = document.text
+    starts_verbatim: Set[int] = set()  # lines that start inside a block comment, template literal or string
+    ends_verbatim: Set[int] = set()  # lines that end inside a template literal or string
+    # Open brackets as (kind, line opened on); kinds are "(", "[", "{", "${",
+    # "switch" (its brace) and "case" (the body after a case label)
+    stack: List[Tuple[str, int]] = []
+    frames_at: Dict[int, Tuple[Tuple[str, int], ...]] = {1: ()}
+    line = 1
+    previous = ""  # last significant token, to tell a regex from a division
+    switch_pending = False
+    index = 0
+    while index < len(text):
+        match = _JS_TOKEN.match(text, index)
+        kind, token = match.lastgroup, match.group(0)
+        if kind == "template" or (token == "}" and stack and stack[-1][0] == "${"):
+            if kind != "template":
+                stack.pop()
+            end, interpolation = _scan_template(text, match.end())
+            newlines = text.count("\n", index, end)
+            for offset in range(newlines):
+                ends_verbatim.add(line + offset)
+                starts_verbatim.add(line + offset + 1)
+            line += newlines
+            if interpolation:
+                stack.append(("${", line))
+            frames_at.setdefault(line, tuple(stack))
+            index = end
+            previous = "`"
+            continue
+        if kind == "slash" and (not previous or previous in _JS_REGEX_AFTER or not re.match(r"[\w$)\]}`\"']", previous[-1])):
+            regex = _JS_REGEX_BODY.match(text, match.end())
+            if regex:
+                index = regex.end()
+                previous = "regex"
+                continue
+        if kind == "newline":
+            line += 1
+            frames_at[line] = tuple(stack)
+        elif kind == "block_comment":
+            starts_verbatim.update(range(line + 1, line + token.count("\n") + 1))
+            line += token.count("\n")
+            frames_at.setdefault(line, tuple(stack))
+        elif kind == "string" and "\n" in token:
+            # Continued with a backslash-newline: the whitespace around the break is part of the value
+            newlines = token.count("\n")
+            ends_verbatim.update(range(line, line + newlines))
+            starts_verbatim.update(range(line + 1, line + newlines + 1))
+            line += newlines
+            frames_at.setdefault(line, tuple(stack))
+        elif kind == "open":
+            stack.append(("switch" if token == "{" and switch_pending else token, line))
+            if token == "{":
+                switch_pending = False
+        elif kind == "close":
+            if stack and stack[-1][0] == "case":
+                stack.pop()
+            if stack:
+                stack.pop()
+        elif kind == "word" and token == "switch":
+            switch_pending = True
+        elif kind == "word" and token in ("case", "default") and stack and stack[-1][0] in ("switch", "case"):
+            if stack[-1][0] == "case":
+                stack.pop()
+            stack.append(("case", line))
+        if kind not in ("newline", "space", "line_comment", "block_comment"):
+            previous = token
+        index = match.end()
+
+    output = []
+    levels: Dict[int, int] = {}
+    previous_code, previous_line = "", 0
+    for number, raw in enumerate(document.lines, start=1):
+        content = raw.rstrip("\r\n")
+        if number in starts_verbatim:
+            output.append(content if number in ends_verbatim else content.rstrip())
+            continue
+        body = content.lstrip() if number in ends_verbatim else content.strip()
+        if not body:
+            output.append("")
+            continue
+        frames = list(frames_at.get(number, ()))
+        closed = None
+        for char in re.match(r"[)}\]\s]*", body).group(0):
+            if char.isspace() or not frames:
+                continue
+            if frames[-1][0] == "case":
+                frames.pop()
+            if frames:
+                closed = frames.pop()
+        if _JS_CASE.match(body) and frames and frames[-1][0] == "case":
+            frames.pop()
+        if closed is not None:
+            level = levels.get(closed[1], 0)
+        elif frames:
+            level = levels.get(frames[-1][1], 0) + 1
+        else:
+            level = 0
+        continued = _JS_CONTINUATION.match(body) or (
+            previous_code.endswith(("=", "=>", "&&", "||", "?", "+", "-"))
+            and not previous_code.endswith(("==", "!=", "<=", ">=", "++", "--"))
+        )
+        # A bracket opened on the previous line already indents this one
+        if continued and closed is None and not (frames and frames[-1][1] == previous_line):
+            level += 1
+        levels[number] = level
+        output.append(INDENT * level + body)
+        if not body.startswith(("//", "/*", "*")):
+            previous_code, previous_line = body, number
+    return output, starts_verbatim
+
+
+def _format_javascript(document: Document) -> str:
+    lines, verbatim = _javascript_lines(document)
+    return _collapse_blank_lines(lines, 1, verbatim)
+
+
+# ---------- HTML ----------
+_BLOCK_ELEMENTS = {
+    "address", "article", "aside", "blockquote", "div", "dl", "fieldset", "figure", "footer", "form",
+    "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "main", "nav", "ol", "p", "pre", "section", "table", "ul",
+}
+# Opening the key implicitly closes these elements when they are the innermost open one
+_IMPLIED_END = {
+    "li": {"li"}, "dt": {"dt", "dd"}, "dd": {"dt", "dd"}, "option": {"option"},
+    "td": {"td", "th"}, "th": {"td", "th"}, "tr": {"tr", "td", "th"},
+    "thead": {"tbody", "tfoot"}, "tbody": {"thead", "tbody", "tr", "td", "th"}, "tfoot": {"thead", "tbody", "tr", "td", "th"},
+}
+_VERBATIM_ELEMENTS = {"pre", "textarea"}
+_EMBEDDED = {"script": "javascript", "style": "css"}
+_EMBEDDED_LINES = {"javascript": _javascript_lines, "css": _css_lines}
+
+
+class _HTMLLayout(HTMLParser):
+    """Records the element depth at the start of every line and the spans to leave alone."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack: List[str] = []
+        self.depth_at: Dict[int, int] = {1: 0}
+        # Lines whose events so far are all end tags -> depth after them
+        self.leading_ends: Dict[int, int] = {}
+        self.continued: Dict[int, int] = {}  # lines inside a multi-line tag or comment -> the line it starts on
+        self.verbatim: Set[int] = set()
+        self.embedded: List[Tuple[str, int, int, int, str]] = []  # (language, open line, close line, depth, content)
+        self._line = 1
+        self._busy_lines: Set[int] = set()
+        self._open_verbatim: Optional[Tuple[str, int]] = None
+        self._open_embedded: Optional[Tuple[str, int, int, List[str]]] = None
+
+    def _fill(self, line: int) -> None:
+        while self._line < line:
+            self._line += 1
+            self.depth_at[self._line] = len(self.stack)
+
+    def _advance(self, kind: str, span: str = "") -> int:
+        line = self.getpos()[0]
+        self._fill(line)
+        if kind != "end" and (kind != "data" or span.strip()):
+            self._busy_lines.add(line)
+            self.leading_ends.pop(line, None)
+        if kind != "data":
+            for offset in range(1, span.count("\n") + 1):
+                self.continued.setdefault(line + offset, line)
+        return line
+
+    def handle_starttag(self, tag, attrs):
+        text = self.get_starttag_text() or ""
+        # Earlier lines are still inside the elements this tag closes implicitly
+        self._fill(self.getpos()[0] - 1)
+        while self.stack and (self.stack[-1] in _IMPLIED_END.get(tag, ()) or (self.stack[-1] == "p" and tag in _BLOCK_ELEMENTS)):
+            self.stack.pop()
+        line = self._advance("start", text) + text.count("\n")
+        if tag in _VERBATIM_ELEMENTS:
+            self._open_verbatim = (tag, line)
+        if tag in _EMBEDDED and (tag == "style" or (dict(attrs).get("type") or "") in ("", "module", "text/javascript", "application/javascript")):
+            self._open_embedded = (_EMBEDDED[tag], line, len(self.stack), [])
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._advance("start", self.get_starttag_text() or "")
+
+    def handle_endtag(self, tag):
+        line = self._advance("end")
+        if self._open_verbatim and self._open_verbatim[0] == tag:
+            self.verbatim.update(range(self._open_verbatim[1] + 1, line + 1))
+            self._open_verbatim = None
+        if self._open_embedded is not None and tag in _EMBEDDED:
+            language, start, depth, parts = self._open_embedded
+            content = "".join(parts)
+            # Only bodies that start on their own line after the open tag
+            if line > start + 1 and not content.split("\n", 1)[0].strip():
+                self.embedded.append((language, start, line, depth, content))
+            self._open_embedded = None
+        if tag in self.stack:
+            while self.stack.pop() != tag:
+                pass
+        if line not in self._busy_lines:
+            self.leading_ends[line] = len(self.stack)
+
+    def handle_data(self, data):
+        self._advance("data", data if self._open_embedded is None else "")
+        if self._open_embedded is not None:
+            self._open_embedded[3].append(data)
+
+    def handle_comment(self, data):
+        self._advance("comment", data)
+
+    def handle_decl(self, decl):
+        self._advance("decl", decl)
+
+
+def _format_html(document: Document) -> str:
+    """Re-indent by element nesting (two spaces); ``<script>``/``<style>`` bodies go through the JS/CSS formatters."""
+    layout = _HTMLLayout()
+    layout.feed(document.text)
+    layout.close()
+    lines = [line.rstrip("\r\n") for line in document.lines]
+
+    # <script>/<style> bodies: first body line -> (formatted lines, indices of those to leave alone)
+    replaced: Dict[int, Tuple[List[str], Set[int]]] = {}
+    for language, start, end, element_depth, content in layout.embedded:
+        body, verbatim = _EMBEDDED_LINES[language](load_document(content.strip("\n")))
+        while body and not body[-1] and len(body) not in verbatim:
+            body.pop()
+        prefix = INDENT * (element_depth + 1)
+        replaced[start + 1] = ([row if index in verbatim or not row else prefix + row for index, row in enumerate(body, start=1)], verbatim)
+        for number in range(start + 2, end):
+            replaced[number] = ([], set())
+
+    output: List[str] = []
+    keep: Set[int] = set()  # output line numbers (1-based) not to touch
+    new_indent: Dict[int, int] = {}
+    depth = 0
+    for number, line in enumerate(lines, start=1):
+        depth = layout.depth_at.get(number, depth)
+        if number in replaced:
+            body_lines, verbatim = replaced[number]
+            keep.update(len(output) + index for index in verbatim)
+            output.extend(body_lines)
+            continue
+        if number in layout.verbatim:
+            output.append(line)
+            keep.add(len(output))
+            continue
+        body = line.strip()
+        if not body:
+            output.append("")
+            continue
+        if number in layout.continued:
+            head = layout.continued[number]
+            shift = new_indent.get(head, 0) - (len(lines[head - 1]) - len(lines[head - 1].lstrip()))
+            indent = max(0, len(line) - len(line.lstrip()) + shift)
+        else:
+            indent = len(INDENT) * layout.leading_ends.get(number, depth)
+        new_indent[number] = indent
+        output.append(" " * indent + body)
+    return _collapse_blank_lines(output, 1, keep)
+
+
+FORMATTERS: Dict[str, Callable[[Document], str]] = {
+    "python": _format_python_black if black is not None else _format_python_builtin,
+    "javascript": _format_javascript,
+    "css": _format_css,
+    "html": _format_html,
+}
+FORMATTER_NAMES = {"python": "black" if black is not None else "builtin"}
+
+
+def format_code(code: str, language: str) -> FormatResult:
+    """Format ``code``; raises ``FormatError`` for unparsable Python and ``KeyError`` for unknown languages."""
+    formatter = FORMATTERS[language]
+    document = load_document(code)
+    formatted = document.memo(f"formatted:{language}", lambda: formatter(document))
+    if formatted != code:
+        # Formatting is idempotent: the editor will send the output back once applied
+        load_document(formatted).memo(f"formatted:{language}", lambda: formatted)
+    return FormatResult(formatted=formatted, formatter=FORMATTER_NAMES.get(language, "builtin"))
@@ -0,0 +1,203 @@
+"""Background worker pool for long-running lint and AI jobs."""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+from utils.metrics import record_stage
+
+logger = logging.getLogger(__name__)
+
+# (current_user, payload) -> (response body, HTTP status the synchronous endpoint would use)
+JobHandler = Callable[[Dict[str, Any], Dict[str, Any]], Tuple[Dict[str, Any], int]]
+
+TERMINAL_STATES = ("succeeded", "failed")
+
+
+class QueueFull(RuntimeError):
+    """Raised when too many jobs are waiting for a worker."""
+
+
+@dataclass
+class Job:
+    id: str
+    owner: str
+    kind: str
+    current_user: Dict[str, Any]
+    payload: Dict[str, Any]
+    status: str = "queued"
+    result: Optional[Dict[str, Any]] = None
+    http_status: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+    # Bumped on every state change so watchers can tell whether they missed one
+    version: int = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "jobId": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "httpStatus": self.http_status,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "expiresAt": self.expires_at,
+            "version": self.version,
+        }
+
+
+class JobQueue:
+    """FIFO queue served by a fixed pool of worker threads.
+
+    Results are kept for ``result_ttl`` seconds after a job finishes. Workers are
+    started on the first submit in each process, so a master that preloads the
+    app and forks workers never owns threads of its own.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        result_ttl: float = 600.0,
+        max_pending: int = 100,
+        context_factory: Optional[Callable[[], ContextManager]] = None,
+    ):
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.max_pending = max_pending
+        self._context_factory = context_factory or nullcontext
+        self._handlers: Dict[str, JobHandler] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._pending: "queue.Queue[str]" = queue.Queue()
+        self._cond = threading.Condition()
+        self._started_pid: Optional[int] = None
+        self._completed = 0
+        self._failed = 0
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def kinds(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def _ensure_workers(self) -> None:
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        self._pending = queue.Queue()
+        for index in range(self.workers):
+            threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True).start()
+
+    def submit(self, current_user: Dict[str, Any], kind: str, payload: Dict[str, Any]) -> Job:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind '{kind}'. Expected one of: {', '.join(self.kinds())}")
+        owner = current_user.get("uid") or "anonymous"
+        with self._cond:
+            self._purge_expired(time.time())
+            self._ensure_workers()
+            pending = sum(1 for job in self._jobs.values() if job.status == "queued")
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs are already waiting")
+            job = Job(id=uuid.uuid4().hex, owner=owner, kind=kind, current_user=current_user, payload=payload)
+            self._jobs[job.id] = job
+            self._pending.put(job.id)
+        logger.info(f"Queued {kind} job {job.id} for {owner}")
+        return job
+
+    def get(self, job_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a job, or ``None`` if it is unknown, expired or belongs to someone else."""
+        with self._cond:
+            self._purge_expired(time.time())
+            job = self._jobs.get(job_id)
+            if job is None or job.owner != owner:
+                return None
+            return job.to_dict()
+
+    def wait(self, job_id: str, owner: str, version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """Block until the job moves past ``version`` (or ``timeout``) and return its snapshot."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id].version != version,
+                timeout,
+            )
+            job = self._jobs.get(job_id)
+            if job is None or job.owner != owner:
+                return None
+            return job.to_dict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            self._purge_expired(time.time())
+            by_status: Dict[str, int] = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+            for job in self._jobs.values():
+                by_status[job.status] += 1
+            return {
+                "workers": self.workers,
+                "maxPending": self.max_pending,
+                "resultTtlSeconds": self.result_ttl,
+                "jobs": by_status,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [job_id for job_id, job in self._jobs.items() if job.expires_at is not None and job.expires_at <= now]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _update(self, job: Job, **changes: Any) -> None:
+        with self._cond:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._cond.notify_all()
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._pending.get()
+            with self._cond:
+                job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            started = time.time()
+            record_stage("job_queue", started - job.created_at)
+            self._update(job, status="running", started_at=started)
+            try:
+                with self._context_factory():
+                    result, http_status = self._handlers[job.kind](job.current_user, job.payload)
+            except Exception as exc:  # noqa: BLE001 - a failing job must not kill the worker
+                logger.exception(f"Job {job.id} ({job.kind}) crashed")
+                result, http_status = {"error": str(exc)}, 500
+            finished = time.time()
+            failed = http_status >= 400
+            with self._cond:
+                if failed:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+            self._update(
+                job,
+                status="failed" if failed else "succeeded",
+                result=result,
+                http_status=http_status,
+                error=result.get("error") if failed else None,
+                finished_at=finished,
+                expires_at=finished + self.result_ttl,
+            )
@@ -2,42 +2,164 @@
 
 from __future__ import annotations
 
+import json
+import os
+import shutil
+import signal
 import subprocess
 import tempfile
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from services.native_lint import run_native_checks
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.metrics import stage
+from utils.supersede import CancelToken, Superseded
+
+ENGINES = ("subprocess", "native", "auto")
+
+LANGUAGES_BY_SUFFIX = {
+    ".py": "python",
+    ".js": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".jsx": "javascript",
+    ".css": "css",
+    ".html": "html",
+    ".htm": "html",
+}
+
+TOOLS = {"python": "pylint", "javascript": "eslint"}
+
+_PYLINT_SEVERITY = {"fatal": "error", "error": "error", "warning": "warning"}
+_ESLINT_SEVERITY = {2: "error", 1: "warning"}
+
+
+def language_for_path(path: str | Path) -> Optional[str]:
+    return LANGUAGES_BY_SUFFIX.get(Path(path).suffix.lower())
+
+
+def resolve_engine(engine: str, language: str) -> str:
+    """``auto`` uses the external tool when it is installed and the native checks otherwise.
+
+    Languages without an external tool (CSS, HTML) always get the native checks.
+    """
+    tool = TOOLS.get(language)
+    if tool is None:
+        return "native"
+    if engine != "auto":
+        return engine
+    return "subprocess" if shutil.which(tool) else "native"
+
+
+def is_placeholder(report: List[Dict[str, object]]) -> bool:
+    """True for the stand-in result of a ``subprocess`` run whose linter could not run."""
+    return len(report) == 1 and report[0].get("ruleId") == "no-console" and "details" in report[0]
 
 
 def _write_temp_file(code: str, suffix: str) -> Path:
     temp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, mode="w", encoding="utf-8")
     temp.write(code)
     temp.flush()
+    temp.close()
     return Path(temp.name)
 
 
-def run_lint_checks(code: str, language: str = "javascript") -> List[Dict[str, str]]:
-    """
-    Executes language-specific lint commands.
-    Currently returns a mocked response if CLI tools are unavailable.
-    """
+def _parse_report(stdout: str, language: str) -> Optional[List[Dict[str, object]]]:
+    """Turn pylint/eslint JSON output into lint report items; ``None`` if it is not JSON."""
+    try:
+        report = json.loads(stdout)
+    except json.JSONDecodeError:
+        return None
+    if language == "python":
+        return [
+            {
+                "ruleId": item.get("symbol") or item.get("message-id"),
+                "severity": _PYLINT_SEVERITY.get(item.get("type"), "info"),
+                "message": item.get("message", ""),
+                "line": item.get("line") or 1,
+                "column": (item.get("column") or 0) + 1,
+            }
+            for item in report
+        ]
+    return [
+        {
+            "ruleId": message.get("ruleId") or "syntax-error",
+            "severity": _ESLINT_SEVERITY.get(message.get("severity"), "info"),
+            "message": message.get("message", ""),
+            "line": message.get("line") or 1,
+            "column": message.get("column") or 1,
+        }
+        for result in report
+        for message in result.get("messages", [])
+    ]
+
+
+def _kill(process: subprocess.Popen) -> None:
+    """Kill the linter and whatever it spawned; a wrapper's children would keep the output pipes open."""
+    if os.name != "posix":
+        process.kill()
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass  # already exited
+
+
+def _run_tool(code: str, language: str, deadline: Optional[Deadline] = None, cancel: Optional[CancelToken] = None) -> List[Dict[str, object]]:
+    file_path = None
     try:
+        if cancel is not None:
+            cancel.check("lint_subprocess")
         suffix = ".py" if language == "python" else ".js"
         file_path = _write_temp_file(code, suffix)
         if language == "python":
-            cmd = ["pylint", file_path.name, "--disable=all", "--enable=unused-import,unused-variable,bad-indentation"]
+            cmd = [
+                "pylint", file_path.name, "--disable=all",
+                "--enable=unused-import,unused-variable,bad-indentation", "--output-format=json",
+            ]
         else:
             cmd = ["eslint", file_path.name, "--format", "json"]
-        completed = subprocess.run(cmd, cwd=file_path.parent, capture_output=True, text=True, check=False)
-        if completed.returncode != 0 and not completed.stdout:
-            raise RuntimeError(completed.stderr)
+        timeout = deadline.timeout("lint_subprocess") if deadline else None
+        with stage("lint_subprocess"):
+            process = subprocess.Popen(
+                cmd,
+                cwd=file_path.parent,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                start_new_session=os.name == "posix",
+            )
+            # A newer revision of the document kills the linter instead of waiting for it
+            unregister = cancel.on_cancel(lambda: _kill(process)) if cancel is not None else None
+            try:
+                stdout, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                _kill(process)
+                process.communicate()
+                raise
+            finally:
+                if unregister is not None:
+                    unregister()
+        if cancel is not None:
+            cancel.check("lint_subprocess")
+        if process.returncode != 0 and not stdout:
+            raise RuntimeError(stderr)
+        parsed = _parse_report(stdout, language) if stdout else []
+        if parsed is not None:
+            return parsed
         return [
             {
                 "ruleId": "process",
                 "severity": "info",
-                "message": completed.stdout or "Lint completed with warnings.",
+                "message": stdout or "Lint completed with warnings.",
                 "line": 1,
             }
         ]
+    except subprocess.TimeoutExpired as exc:
+        raise DeadlineExceeded("lint_subprocess") from exc
+    except (DeadlineExceeded, Superseded):
+        raise
     except Exception as exc:  # noqa: BLE001 - fallback to mocked payload
         return [
             {
@@ -48,4 +170,29 @@ def run_lint_checks(code: str, language: str = "javascript") -> List[Dict[str, s
                 "details": str(exc),
             }
         ]
+    finally:
+        if file_path is not None:
+            file_path.unlink(missing_ok=True)
 
+
+def run_lint_checks(
+    code: str,
+    language: str = "javascript",
+    engine: str = "subprocess",
+    deadline: Optional[Deadline] = None,
+    cancel: Optional[CancelToken] = None,
+) -> List[Dict[str, object]]:
+    """
+    Lints ``code`` with the selected engine:
+    ``subprocess`` runs pylint/eslint (mocked response if the CLI tools are unavailable),
+    ``native`` runs the in-process checks from ``native_lint`` and ``auto`` picks per language;
+    CSS and HTML always use the native checks.
+    The linter process is killed and ``DeadlineExceeded`` raised if ``deadline`` runs out,
+    or ``Superseded`` if ``cancel`` is cancelled by a newer revision of the document.
+    """
+    if resolve_engine(engine, language) == "native":
+        if cancel is not None:
+            cancel.check("lint_native")
+        with stage("lint_native"):
+            return run_native_checks(code, language)
+    return _run_tool(code, language, deadline, cancel)
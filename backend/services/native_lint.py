@@ -0,0 +1,284 @@
+"""In-process lint checks for Python, JavaScript, CSS and HTML.
+
+The rules mirror what the subprocess engine enables (unused imports/variables and
+bad indentation for Python) plus a few cheap checks for the web languages, so lint
+results are available without pylint/eslint installed and without a process spawn.
+"""
+
+from __future__ import annotations
+
+import ast
+import re
+import tokenize
+from html.parser import HTMLParser
+from typing import Dict, List, Set
+
+from services.document import Document, load_document
+
+# Bump whenever a rule changes so cached results are invalidated
+ENGINE_VERSION = "3"
+
+INDENT_SIZE = 4
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr",
+}
+# Elements whose end tag may be omitted
+OPTIONAL_END_ELEMENTS = {"p", "li", "dt", "dd", "tr", "td", "th", "thead", "tbody", "tfoot", "option", "colgroup"}
+
+
+def diagnostic(rule_id: str, severity: str, message: str, line: int, column: int = 1) -> Dict[str, object]:
+    return {"ruleId": rule_id, "severity": severity, "message": message, "line": line, "column": column}
+
+
+# ---------- Python ----------
+class _NameUsage(ast.NodeVisitor):
+    def __init__(self):
+        self.loaded: Set[str] = set()
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if isinstance(node.ctx, (ast.Load, ast.Del)):
+            self.loaded.add(node.id)
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> None:
+        # ``n += 1`` reads ``n`` before it rebinds it
+        if isinstance(node.target, ast.Name):
+            self.loaded.add(node.target.id)
+        self.generic_visit(node)
+
+
+class _LocalAssignments(ast.NodeVisitor):
+    """Names a function body assigns and declares ``global``/``nonlocal``, without entering nested scopes.
+
+    Nested functions and classes are checked (or not) on their own, so descending
+    into them would report their variables twice or as the outer function's.
+    """
+
+    def __init__(self):
+        self.declared: Set[str] = set()
+        self.assigned: Dict[str, ast.Name] = {}
+
+    def _skip(self, node: ast.AST) -> None:
+        pass
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_Lambda = _skip
+
+    def _bind(self, targets: List[ast.AST]) -> None:
+        for target in targets:
+            if isinstance(target, ast.Name) and target.id not in self.assigned:
+                self.assigned[target.id] = target
+
+    def visit_Global(self, node: ast.Global) -> None:
+        self.declared.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        self._bind(node.targets)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        self._bind([node.target])
+        self.generic_visit(node)
+
+    visit_AugAssign = visit_AnnAssign
+
+    def visit_withitem(self, node: ast.withitem) -> None:
+        if node.optional_vars is not None:
+            self._bind([node.optional_vars])
+        self.generic_visit(node)
+
+
+def _used_names(document: Document) -> Set[str]:
+    """Loaded names, plus strings that are identifiers: names in ``__all__`` or string annotations count as used."""
+    used: Set[str] = set()
+    for node in document.nodes:
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Load, ast.Del)):
+            used.add(node.id)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value.isidentifier():
+            used.add(node.value)
+    return used
+
+
+def _python_unused_imports(document: Document) -> List[Dict[str, object]]:
+    used = _used_names(document)
+    results = []
+    for node in document.nodes:
+        if isinstance(node, ast.ImportFrom) and node.module == "__future__":
+            continue
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            continue
+        for alias in node.names:
+            if alias.name == "*":
+                continue
+            bound = alias.asname or alias.name.split(".")[0]
+            if bound not in used:
+                results.append(diagnostic("unused-import", "warning", f"Unused import {alias.name}", node.lineno, node.col_offset + 1))
+    return results
+
+
+def _python_unused_variables(document: Document) -> List[Dict[str, object]]:
+    results = []
+    for definition in document.definitions:
+        if definition.kind != "function":
+            continue
+        function = definition.node
+        local = _LocalAssignments()
+        usage = _NameUsage()
+        for statement in function.body:
+            # Loads in nested functions still count: a closure may read the variable
+            usage.visit(statement)
+            local.visit(statement)
+        for name, node in local.assigned.items():
+            if name.startswith("_") or name in local.declared or name in usage.loaded:
+                continue
+            results.append(diagnostic("unused-variable", "warning", f"Unused variable '{name}'", node.lineno, node.col_offset + 1))
+    return results
+
+
+def _python_bad_indentation(document: Document) -> List[Dict[str, object]]:
+    results = []
+    for token in document.python_tokens:
+        if token.type == tokenize.INDENT and "\t" not in token.string and len(token.string) % INDENT_SIZE:
+            results.append(diagnostic(
+                "bad-indentation",
+                "warning",
+                f"Bad indentation. Found {len(token.string)} spaces, expected a multiple of {INDENT_SIZE}",
+                token.start[0],
+            ))
+    return results
+
+
+def check_python(document: Document) -> List[Dict[str, object]]:
+    exc = document.syntax_error
+    if exc is not None:
+        return [diagnostic("syntax-error", "error", exc.msg, exc.lineno or 1, exc.offset or 1)]
+    return _python_unused_imports(document) + _python_unused_variables(document) + _python_bad_indentation(document)
+
+
+# ---------- JavaScript ----------
+_JS_MASK = re.compile(r"""//[^\n]*|/\*.*?\*/|`(?:\\.|[^`\\])*`|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'""", re.DOTALL)
+_JS_RULES = [
+    (re.compile(r"\bvar\s"), "no-var", "warning", "Unexpected var, use let or const instead"),
+    (re.compile(r"(?<![=!<>])[=!]=(?!=)"), "eqeqeq", "warning", "Expected '===' / '!==' instead of '==' / '!='"),
+    (re.compile(r"\bconsole\.\w+\s*\("), "no-console", "warning", "Unexpected console statement"),
+    (re.compile(r"\bdebugger\b"), "no-debugger", "error", "Unexpected 'debugger' statement"),
+]
+
+
+def _mask_literals(code: str) -> str:
+    """Blank out comments and string literals, keeping offsets and line breaks."""
+    return _JS_MASK.sub(lambda match: re.sub(r"[^\n]", " ", match.group(0)), code)
+
+
+def _trailing_whitespace(document: Document, rule_id: str) -> List[Dict[str, object]]:
+    results = []
+    for number, line in enumerate(document.lines, start=1):
+        stripped = line.rstrip("\n").rstrip("\r")
+        if stripped != stripped.rstrip():
+            results.append(diagnostic(rule_id, "info", "Trailing whitespace", number, len(stripped.rstrip()) + 1))
+    return results
+
+
+def check_javascript(document: Document) -> List[Dict[str, object]]:
+    masked = document.memo("js_masked", lambda: _mask_literals(document.text))
+    results = []
+    for pattern, rule_id, severity, message in _JS_RULES:
+        for match in pattern.finditer(masked):
+            line, column = document.position(match.start())
+            results.append(diagnostic(rule_id, severity, message, line, column))
+    results.extend(_trailing_whitespace(document, "no-trailing-spaces"))
+    return sorted(results, key=lambda item: (item["line"], item["column"]))
+
+
+# ---------- CSS ----------
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+
+
+def _mask_css_comments(code: str) -> str:
+    return _CSS_COMMENT.sub(lambda match: re.sub(r"[^\n]", " ", match.group(0)), code)
+
+
+def check_css(document: Document) -> List[Dict[str, object]]:
+    masked = document.memo("css_masked", lambda: _mask_css_comments(document.text))
+    results = []
+    opened: List[int] = []
+    for match in re.finditer(r"[{}]", masked):
+        index = match.start()
+        if match.group(0) == "{":
+            opened.append(index)
+        elif not opened:
+            line, column = document.position(index)
+            results.append(diagnostic("syntax-error", "error", "Unexpected '}'", line, column))
+        else:
+            start = opened.pop()
+            if not masked[start + 1:index].strip():
+                line, column = document.position(start)
+                results.append(diagnostic("block-no-empty", "warning", "Unexpected empty block", line, column))
+    for index in opened:
+        line, column = document.position(index)
+        results.append(diagnostic("syntax-error", "error", "Unclosed block", line, column))
+    results.extend(_trailing_whitespace(document, "no-trailing-spaces"))
+    return sorted(results, key=lambda item: (item["line"], item["column"]))
+
+
+# ---------- HTML ----------
+class _TagBalance(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[tuple] = []
+        self.results: List[Dict[str, object]] = []
+
+    def handle_starttag(self, tag, attrs):
+        line, column = self.getpos()
+        if tag == "img" and not any(name == "alt" for name, _ in attrs):
+            self.results.append(diagnostic("img-alt", "warning", "<img> is missing an alt attribute", line, column + 1))
+        if tag not in VOID_ELEMENTS:
+            self.stack.append((tag, line, column + 1))
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "img" and not any(name == "alt" for name, _ in attrs):
+            line, column = self.getpos()
+            self.results.append(diagnostic("img-alt", "warning", "<img> is missing an alt attribute", line, column + 1))
+
+    def handle_endtag(self, tag):
+        line, column = self.getpos()
+        if tag in VOID_ELEMENTS:
+            return
+        if not any(open_tag == tag for open_tag, _, _ in self.stack):
+            self.results.append(diagnostic("tag-pair", "error", f"Unexpected closing tag </{tag}>", line, column + 1))
+            return
+        while self.stack:
+            open_tag, open_line, open_column = self.stack.pop()
+            if open_tag == tag:
+                break
+            if open_tag not in OPTIONAL_END_ELEMENTS:
+                self.results.append(diagnostic("tag-pair", "error", f"<{open_tag}> is not closed", open_line, open_column))
+
+
+def check_html(document: Document) -> List[Dict[str, object]]:
+    parser = _TagBalance()
+    parser.feed(document.text)
+    parser.close()
+    results = parser.results
+    for tag, line, column in parser.stack:
+        if tag not in OPTIONAL_END_ELEMENTS and tag not in ("html", "body", "head"):
+            results.append(diagnostic("tag-pair", "error", f"<{tag}> is not closed", line, column))
+    results.extend(_trailing_whitespace(document, "no-trailing-spaces"))
+    return sorted(results, key=lambda item: (item["line"], item["column"]))
+
+
+CHECKS = {
+    "python": check_python,
+    "javascript": check_javascript,
+    "css": check_css,
+    "html": check_html,
+}
+
+
+def run_native_checks(code: str, language: str) -> List[Dict[str, object]]:
+    check = CHECKS.get(language)
+    if check is None:
+        return []
+    return check(load_document(code))
@@ -0,0 +1,62 @@
+"""Unified diffs between a source text and its rewritten version."""
+
+from __future__ import annotations
+
+import difflib
+from typing import List, Optional
+
+from services.document import load_document
+from utils.deadline import Deadline
+
+CONTEXT_LINES = 3
+
+
+class _DeadlineMatcher(difflib.SequenceMatcher):
+    """``SequenceMatcher`` that gives up once the request deadline has passed.
+
+    Matching is where a diff spends its time, and ``difflib.unified_diff`` does all
+    of it before yielding the first line; on files with many repeated lines it is
+    quadratic. ``find_longest_match`` runs once per unmatched region, so checking
+    there abandons a diff within milliseconds of the budget running out.
+    """
+
+    def __init__(self, a: List[str], b: List[str], deadline: Optional[Deadline]):
+        self.deadline = deadline
+        super().__init__(None, a, b)
+
+    def find_longest_match(self, alo=0, ahi=None, blo=0, bhi=None):
+        if self.deadline is not None:
+            self.deadline.check("patch")
+        return super().find_longest_match(alo, ahi, blo, bhi)
+
+
+def _unified_range(start: int, length: int) -> str:
+    # Same range format as ``difflib.unified_diff``
+    beginning = start + 1
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def make_patch(original: str, fixed: str, deadline: Optional[Deadline] = None) -> str:
+    """``difflib.unified_diff`` of the two texts; raises ``DeadlineExceeded`` if ``deadline`` runs out."""
+    if deadline is not None:
+        deadline.check("patch")
+    a, b = load_document(original).lines, load_document(fixed).lines
+    lines: List[str] = []
+    for group in _DeadlineMatcher(a, b, deadline).get_grouped_opcodes(CONTEXT_LINES):
+        if not lines:
+            lines += ["--- a/file\n", "+++ b/file\n"]
+        first, last = group[0], group[-1]
+        lines.append(f"@@ -{_unified_range(first[1], last[2] - first[1])} +{_unified_range(first[3], last[4] - first[3])} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line for line in a[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                lines.extend("-" + line for line in a[i1:i2])
+            if tag in ("replace", "insert"):
+                lines.extend("+" + line for line in b[j1:j2])
+    return "".join(lines)
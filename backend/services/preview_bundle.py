@@ -0,0 +1,93 @@
+"""Multi-file preview bundles: path handling, manifests and asset fingerprinting."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import posixpath
+import re
+from typing import Any, Dict, Tuple
+
+MAX_BUNDLE_FILES = 500
+# Stored file keys are "<bundle key>//<path>"; plain preview ids may not contain "//".
+FILE_KEY_SEPARATOR = "//"
+
+_ASSET_REF = re.compile(r"""(\b(?:src|href)\s*=\s*)(["'])([^"'#?]+)\2""", re.IGNORECASE)
+
+
+class BundleError(ValueError):
+    """Raised for malformed bundle uploads."""
+
+
+def file_key(bundle_key: str, path: str) -> str:
+    return f"{bundle_key}{FILE_KEY_SEPARATOR}{path}"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def asset_version(file_hash: str) -> str:
+    """Short fingerprint appended as ``?v=`` to references of bundle assets."""
+    return file_hash[:12]
+
+
+def normalize_path(path: str) -> str:
+    """Validate a bundle-relative path and return its canonical form."""
+    if not isinstance(path, str) or not path or "\\" in path or "\x00" in path:
+        raise BundleError(f"Invalid file path: {path!r}")
+    normalized = posixpath.normpath(path)
+    if normalized.startswith(("/", "../")) or normalized in (".", "..") or "//" in path:
+        raise BundleError(f"File path must be relative and stay inside the bundle: {path!r}")
+    return normalized
+
+
+def decode_file(spec: Any) -> Tuple[bytes | None, str | None]:
+    """Return ``(content, None)`` for an upload or ``(None, hash)`` for an unchanged file.
+
+    A file is either a string, ``{"content": str, "encoding": "utf-8" | "base64"}``
+    or ``{"hash": "<sha256>"}`` to keep the version already on the server.
+    """
+    if isinstance(spec, str):
+        return spec.encode("utf-8"), None
+    if isinstance(spec, dict):
+        if "content" in spec:
+            if spec.get("encoding") == "base64":
+                try:
+                    return base64.b64decode(spec["content"], validate=True), None
+                except (ValueError, TypeError) as exc:
+                    raise BundleError(f"Invalid base64 content: {exc}") from exc
+            if isinstance(spec["content"], str):
+                return spec["content"].encode("utf-8"), None
+        if isinstance(spec.get("hash"), str):
+            return None, spec["hash"]
+    raise BundleError("Each file must be a string, {content, encoding} or {hash}.")
+
+
+def manifest_etag(entry: str, files: Dict[str, str]) -> str:
+    """Version of the whole bundle; changes whenever any file or the entry changes."""
+    manifest = json.dumps({"entry": entry, "files": files}, sort_keys=True).encode("utf-8")
+    return content_hash(manifest)[:32]
+
+
+def fingerprint_asset_refs(document: str, document_path: str, files: Dict[str, str]) -> str:
+    """Append ``?v=<hash>`` to src/href references that point at files in the bundle.
+
+    Fingerprinted URLs change whenever the file does, so they can be served as
+    immutable and cached by the browser indefinitely.
+    """
+    base_dir = posixpath.dirname(document_path)
+
+    def replace(match: re.Match) -> str:
+        target = match.group(3)
+        if ":" in target or target.startswith("/"):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(base_dir, target))
+        file_hash = files.get(resolved)
+        if file_hash is None:
+            return match.group(0)
+        quote = match.group(2)
+        return f"{match.group(1)}{quote}{target}?v={asset_version(file_hash)}{quote}"
+
+    return _ASSET_REF.sub(replace, document)
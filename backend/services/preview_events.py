@@ -0,0 +1,119 @@
+"""Live-reload notifications for open preview tabs (Server-Sent Events)."""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+_STYLE_BLOCK = re.compile(r"(<style\b[^>]*>)(.*?)(</style\s*>)", re.IGNORECASE | re.DOTALL)
+
+# Injected into every rendered preview. It listens on /events for its preview id and
+# either swaps <style> contents in place or reloads the page (which revalidates via ETag).
+LIVE_RELOAD_SCRIPT = """<script data-kp-live-reload>
+(function () {
+    if (!window.EventSource) return;
+    var version = %(version)s;
+    var source = new EventSource("/events?preview_id=" + encodeURIComponent(%(preview_id)s) + "&version=" + version);
+    source.addEventListener("update", function (event) {
+        var update = JSON.parse(event.data);
+        if (update.version === version) return;
+        var styles = document.querySelectorAll("style");
+        if (update.mode === "css" && styles.length === update.css.length) {
+            for (var i = 0; i < styles.length; i++) {
+                if (styles[i].textContent !== update.css[i]) styles[i].textContent = update.css[i];
+            }
+            version = update.version;
+        } else {
+            source.close();
+            window.location.reload();
+        }
+    });
+})();
+</script>"""
+
+
+def inject_live_reload(document: str, preview_id: str, version: str) -> str:
+    # Escaping "</" keeps user-controlled ids from closing the script element early.
+    script = LIVE_RELOAD_SCRIPT % {
+        "version": json.dumps(version),
+        "preview_id": json.dumps(preview_id).replace("</", "<\\/"),
+    }
+    index = document.lower().rfind("</body>")
+    if index == -1:
+        return document + script
+    return document[:index] + script + document[index:]
+
+
+def style_blocks(document: str) -> List[str]:
+    return [match.group(2) for match in _STYLE_BLOCK.finditer(document)]
+
+
+def css_only_change(old: str, new: str) -> Optional[List[str]]:
+    """Return the new <style> contents if ``old`` -> ``new`` only touched stylesheets."""
+    if _STYLE_BLOCK.sub(r"\1\3", old) != _STYLE_BLOCK.sub(r"\1\3", new):
+        return None
+    return style_blocks(new)
+
+
+class PreviewEventHub:
+    """Wakes SSE streams in this process whenever a preview is stored.
+
+    Streams re-check the store after every wake-up and also poll it on a timeout,
+    so updates posted to another worker (shared sqlite/redis store) still arrive
+    within the poll interval. Each open stream parks a server thread, so at most
+    ``max_streams`` (0: unlimited) may be open at once, and ``close()`` ends them
+    all when the worker shuts down.
+    """
+
+    def __init__(self, max_streams: int = 0):
+        self._cond = threading.Condition()
+        self._sequence = 0
+        self._streams = 0
+        self._closed = False
+        self.max_streams = max_streams
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def open_stream(self) -> bool:
+        """Claim a stream slot; ``False`` if all are taken or the hub is closed."""
+        with self._cond:
+            if self._closed or (self.max_streams and self._streams >= self.max_streams):
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self) -> None:
+        with self._cond:
+            self._streams -= 1
+
+    def open_streams(self) -> int:
+        with self._cond:
+            return self._streams
+
+    def sequence(self) -> int:
+        with self._cond:
+            return self._sequence
+
+    def publish(self) -> None:
+        with self._cond:
+            self._sequence += 1
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        """Wake every stream for good so in-flight responses finish and the worker can exit."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def wait(self, sequence: int, timeout: float) -> None:
+        """Block until something is published after ``sequence``, the hub closes or ``timeout`` elapses."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._sequence != sequence, timeout)
+
+
+def format_event(event: str, payload: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
@@ -0,0 +1,612 @@
+"""Bounded storage for preview content with TTL, LRU eviction and per-user ids.
+
+Three interchangeable backends share the ``PreviewStore`` interface:
+
+* ``MemoryPreviewStore`` - per-process dict, the default for a single worker.
+* ``SQLitePreviewStore`` - one memory-mapped SQLite file shared by every worker on a host.
+* ``RedisPreviewStore`` - any Redis-protocol server, for running on several nodes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import socket
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+_SCOPED_ID = re.compile(r"^([0-9a-f]{12})\.(.+)$")
+# Keys of ``PreviewStore.stats()`` for every backend; ``None`` where a backend cannot tell
+STATS_KEYS = ("entries", "bytes", "maxBytes", "ttlSeconds", "evictions", "expirations", "hits", "misses", "serverUsedMemory")
+# Seconds the SQLite store batches read bookkeeping (LRU timestamps, hit/miss counters) before writing it
+ACCESS_FLUSH_INTERVAL = 1.0
+# Rough per-entry bookkeeping cost (dict slot, dataclass, key) on top of the payload.
+_ENTRY_OVERHEAD = 256
+
+
+class PreviewTooLarge(ValueError):
+    """Raised when a single preview does not fit in the store's byte budget."""
+
+
+@dataclass
+class PreviewEntry:
+    code: str
+    filename: str
+    type: str
+    # sha256 of ``code``; clients send it back as the base for delta uploads.
+    code_hash: str = ""
+    # Rendered response body, its content hash and precompressed variants by encoding.
+    body: bytes = b""
+    etag: str = ""
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    expires_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        payload = len(self.code.encode("utf-8")) + len(self.body) + sum(len(v) for v in self.encoded.values())
+        return payload + len(self.filename) + len(self.type) + _ENTRY_OVERHEAD
+
+    def to_bytes(self) -> bytes:
+        """Serialize as a length-prefixed JSON header followed by the raw bodies."""
+        encodings = sorted(self.encoded)
+        header = json.dumps({
+            "code": self.code,
+            "filename": self.filename,
+            "type": self.type,
+            "code_hash": self.code_hash,
+            "etag": self.etag,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at,
+            "lengths": [len(self.body)] + [len(self.encoded[name]) for name in encodings],
+            "encodings": encodings,
+        }).encode("utf-8")
+        return b"".join([struct.pack(">I", len(header)), header, self.body, *(self.encoded[name] for name in encodings)])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PreviewEntry":
+        (header_len,) = struct.unpack(">I", data[:4])
+        header = json.loads(data[4:4 + header_len])
+        offset = 4 + header_len
+        blobs = []
+        for length in header["lengths"]:
+            blobs.append(data[offset:offset + length])
+            offset += length
+        return cls(
+            code=header["code"],
+            filename=header["filename"],
+            type=header["type"],
+            code_hash=header.get("code_hash", ""),
+            body=blobs[0],
+            etag=header["etag"],
+            encoded=dict(zip(header["encodings"], blobs[1:])),
+            created_at=header["created_at"],
+            expires_at=header["expires_at"],
+        )
+
+
+def namespace_for(owner: str) -> str:
+    """Stable, non-reversible namespace for a user id or client address."""
+    return hashlib.sha256(owner.encode("utf-8")).hexdigest()[:12]
+
+
+def scoped_preview_id(preview_id: str, owner: str) -> str:
+    """Prefix ``preview_id`` with the owner's namespace unless it already carries it.
+
+    Ids scoped to someone else's namespace are treated as plain ids and re-scoped,
+    so a client can never write into another user's previews.
+    """
+    namespace = namespace_for(owner)
+    match = _SCOPED_ID.match(preview_id)
+    if match and match.group(1) == namespace:
+        return preview_id
+    return f"{namespace}.{preview_id}"
+
+
+def resolve_preview_id(preview_id: str, owner: str) -> str:
+    """Map an id from a view URL to a store key; already scoped ids are used as-is."""
+    if _SCOPED_ID.match(preview_id):
+        return preview_id
+    return f"{namespace_for(owner)}.{preview_id}"
+
+
+class PreviewStore:
+    """Storage interface for previews; keys are already namespaced preview ids."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def _check_size(self, entry: PreviewEntry) -> int:
+        size = entry.size
+        if size > self.max_bytes:
+            raise PreviewTooLarge(f"Preview is {size} bytes; the store holds at most {self.max_bytes}.")
+        return size
+
+    def put(self, key: str, entry: PreviewEntry) -> None:
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[PreviewEntry]:
+        raise NotImplementedError
+
+    def etag(self, key: str) -> Optional[str]:
+        """ETag of the live entry at ``key``; cheaper than ``get`` and not counted as a hit or miss."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _stats(self, backend: str, **values: Any) -> Dict[str, Any]:
+        return {**dict.fromkeys(STATS_KEYS), "maxBytes": self.max_bytes, "ttlSeconds": self.ttl, **values, "backend": backend}
+
+    def close(self) -> None:
+        """Release connections held by the calling thread (e.g. before forking workers)."""
+
+
+class MemoryPreviewStore(PreviewStore):
+    """Thread-safe LRU of previews bounded by total bytes, with a per-entry TTL."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600.0):
+        super().__init__(max_bytes, ttl)
+        self._entries: "OrderedDict[str, PreviewEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._evictions = 0
+        self._expirations = 0
+        self._hits = 0
+        self._misses = 0
+
+    def _remove(self, key: str) -> Optional[PreviewEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            self._remove(key)
+            self._expirations += 1
+
+    def put(self, key: str, entry: PreviewEntry) -> None:
+        size = self._check_size(entry)
+        now = time.time()
+        entry.expires_at = now + self.ttl
+        with self._lock:
+            self._remove(key)
+            self._purge_expired(now)
+            while self._entries and self._bytes + size > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._evictions += 1
+                logger.info(f"Evicted preview {evicted_key} to stay within {self.max_bytes} bytes")
+            self._entries[key] = entry
+            self._bytes += size
+
+    def get(self, key: str) -> Optional[PreviewEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def etag(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.etag if entry is not None and entry.expires_at > time.time() else None
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._remove(key) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purge_expired(time.time())
+            return self._stats(
+                "memory",
+                entries=len(self._entries),
+                bytes=self._bytes,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                hits=self._hits,
+                misses=self._misses,
+            )
+
+
+class SQLitePreviewStore(PreviewStore):
+    """Previews in one SQLite file so every worker process on the host sees the same data.
+
+    The database runs in WAL mode with a memory-mapped read path; LRU order is
+    tracked by ``last_access`` and counters live in the same file so stats cover
+    all workers. Reads do not write: their ``last_access`` updates and hit/miss
+    counts are kept per process and written in one transaction at most every
+    ``access_flush_interval`` seconds (and before every ``put`` and ``stats``), so
+    polling a preview does not commit on every request.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600.0, access_flush_interval: float = ACCESS_FLUSH_INTERVAL):
+        super().__init__(max_bytes, ttl)
+        self.path = path
+        self.access_flush_interval = access_flush_interval
+        self._local = threading.local()
+        self._pending_access: Dict[str, float] = {}
+        self._pending_counts: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS previews ("
+                "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL, etag TEXT NOT NULL DEFAULT '')"
+            )
+            if "etag" not in {row[1] for row in conn.execute("PRAGMA table_info(previews)")}:
+                # Files written before entries kept their ETag in a column
+                conn.execute("ALTER TABLE previews ADD COLUMN etag TEXT NOT NULL DEFAULT ''")
+            conn.execute("CREATE INDEX IF NOT EXISTS previews_lru ON previews (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={max(self.max_bytes * 2, 64 * 1024 * 1024)}")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str, amount: int = 1) -> None:
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def _record_read(self, key: Optional[str], counter: str, now: float) -> None:
+        with self._pending_lock:
+            if key is not None:
+                self._pending_access[key] = now
+            self._pending_counts[counter] = self._pending_counts.get(counter, 0) + 1
+            due = now - self._last_flush >= self.access_flush_interval
+        if due:
+            self._flush_reads()
+
+    def _write_pending(self, conn: sqlite3.Connection) -> None:
+        """Write batched read bookkeeping inside the caller's transaction."""
+        with self._pending_lock:
+            accesses, counts = self._pending_access, self._pending_counts
+            self._pending_access, self._pending_counts = {}, {}
+            self._last_flush = time.time()
+        if accesses:
+            conn.executemany(
+                "UPDATE previews SET last_access = MAX(last_access, ?) WHERE key = ?",
+                [(accessed, key) for key, accessed in accesses.items()],
+            )
+        for name, amount in counts.items():
+            self._bump(conn, name, amount)
+
+    def _flush_reads(self) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as exc:
+            # Busy for longer than the connection timeout: keep the batch for the next flush
+            logger.warning(f"Deferring preview store access bookkeeping: {exc}")
+            with self._pending_lock:
+                self._last_flush = time.time()
+            return
+        try:
+            self._write_pending(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def put(self, key: str, entry: PreviewEntry) -> None:
+        size = self._check_size(entry)
+        now = time.time()
+        entry.expires_at = now + self.ttl
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Eviction below picks victims by last_access, so bring it up to date first
+            self._write_pending(conn)
+            conn.execute("DELETE FROM previews WHERE key = ?", (key,))
+            expired = conn.execute("DELETE FROM previews WHERE expires_at <= ?", (now,)).rowcount
+            if expired:
+                self._bump(conn, "expirations", expired)
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM previews").fetchone()[0]
+            if total + size > self.max_bytes:
+                evicted = 0
+                for victim, victim_size in conn.execute("SELECT key, size FROM previews ORDER BY last_access").fetchall():
+                    if total + size <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM previews WHERE key = ?", (victim,))
+                    total -= victim_size
+                    evicted += 1
+                self._bump(conn, "evictions", evicted)
+            conn.execute(
+                "INSERT INTO previews (key, data, size, expires_at, last_access, etag) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry.to_bytes(), size, entry.expires_at, now, entry.etag),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key: str) -> Optional[PreviewEntry]:
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT data, expires_at FROM previews WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            if row is not None and conn.execute("DELETE FROM previews WHERE key = ? AND expires_at <= ?", (key, now)).rowcount:
+                self._record_read(None, "expirations", now)
+            self._record_read(None, "misses", now)
+            return None
+        self._record_read(key, "hits", now)
+        return PreviewEntry.from_bytes(row[0])
+
+    def etag(self, key: str) -> Optional[str]:
+        row = self._connect().execute("SELECT etag FROM previews WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row is not None else None
+
+    def delete(self, key: str) -> bool:
+        return self._connect().execute("DELETE FROM previews WHERE key = ?", (key,)).rowcount > 0
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_pending(conn)
+            expired = conn.execute("DELETE FROM previews WHERE expires_at <= ?", (time.time(),)).rowcount
+            if expired:
+                self._bump(conn, "expirations", expired)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM previews").fetchone()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        return self._stats(
+            "sqlite",
+            entries=entries,
+            bytes=total,
+            evictions=counters.get("evictions", 0),
+            expirations=counters.get("expirations", 0),
+            hits=counters.get("hits", 0),
+            misses=counters.get("misses", 0),
+        )
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._flush_reads()
+            conn.close()
+            self._local.conn = None
+
+
+class RespError(RuntimeError):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespClient:
+    """Minimal blocking RESP2 client, enough for the preview store.
+
+    Works with Redis, Valkey, KeyDB or a local stand-in speaking the same protocol.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = None
+        self._reader = None
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise RespError(f"Unexpected reply type: {line!r}")
+
+    @staticmethod
+    def _encode(args: Sequence[Any]) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _call(self, *args: Any) -> Any:
+        self._sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def execute(self, *args: Any) -> Any:
+        return self.pipeline(args)[0]
+
+    def pipeline(self, *commands: Sequence[Any]) -> List[Any]:
+        """Send several commands in one round trip and return their replies in order."""
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._open()
+                    self._sock.sendall(b"".join(self._encode(command) for command in commands))
+                    replies: List[Any] = []
+                    error: Optional[RespError] = None
+                    for _ in commands:
+                        # Read every reply even after an error so the connection stays in step
+                        try:
+                            replies.append(self._read_reply())
+                        except RespError as exc:
+                            error = error or exc
+                            replies.append(None)
+                    if error is not None:
+                        raise error
+                    return replies
+                except (ConnectionError, OSError):
+                    self.close()
+                    if attempt == 2:
+                        raise
+
+
+class RedisPreviewStore(PreviewStore):
+    """Previews in a Redis-protocol server shared by every node.
+
+    Expiry uses native key TTLs; the byte budget and LRU eviction are left to the
+    server (``maxmemory`` with ``allkeys-lru``), so ``max_bytes`` only caps single
+    entries here. A read is one round trip: hit/miss counts are kept per process
+    and sent along with a later ``GET`` at most every ``access_flush_interval``
+    seconds (and before ``stats`` and ``close``).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 3600.0,
+        prefix: str = "kingpins:preview:",
+        access_flush_interval: float = ACCESS_FLUSH_INTERVAL,
+    ):
+        super().__init__(max_bytes, ttl)
+        self.prefix = prefix
+        self.client = RespClient(url)
+        self.access_flush_interval = access_flush_interval
+        self._pending_counts: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.time()
+
+    def _take_counts(self, force: bool) -> List[Tuple[Any, ...]]:
+        """``INCRBY`` commands for the batched counters, if a flush is due (or ``force``)."""
+        with self._pending_lock:
+            now = time.time()
+            if not self._pending_counts or not (force or now - self._last_flush >= self.access_flush_interval):
+                return []
+            counts, self._pending_counts = self._pending_counts, {}
+            self._last_flush = now
+        return [("INCRBY", f"{self.prefix}__stats:{name}", amount) for name, amount in counts.items()]
+
+    def put(self, key: str, entry: PreviewEntry) -> None:
+        self._check_size(entry)
+        entry.expires_at = time.time() + self.ttl
+        ttl_ms = int(self.ttl * 1000)
+        self.client.pipeline(
+            ("SET", self.prefix + key, entry.to_bytes(), "PX", ttl_ms),
+            ("SET", f"{self.prefix}__etag:{key}", entry.etag, "PX", ttl_ms),
+        )
+
+    def get(self, key: str) -> Optional[PreviewEntry]:
+        data = self.client.pipeline(("GET", self.prefix + key), *self._take_counts(force=False))[0]
+        counter = "hits" if data is not None else "misses"
+        with self._pending_lock:
+            self._pending_counts[counter] = self._pending_counts.get(counter, 0) + 1
+        return PreviewEntry.from_bytes(data) if data is not None else None
+
+    def etag(self, key: str) -> Optional[str]:
+        etag = self.client.execute("GET", f"{self.prefix}__etag:{key}")
+        return etag.decode("utf-8") if etag is not None else None
+
+    def delete(self, key: str) -> bool:
+        return bool(self.client.pipeline(("DEL", self.prefix + key), ("DEL", f"{self.prefix}__etag:{key}"))[0])
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = self.client.pipeline(
+            *self._take_counts(force=True), ("MGET", f"{self.prefix}__stats:hits", f"{self.prefix}__stats:misses")
+        )[-1]
+        info: Dict[str, str] = {}
+        try:
+            for line in (self.client.execute("INFO", "memory") or b"").decode().splitlines():
+                name, _, value = line.partition(":")
+                info[name] = value
+        except RespError:
+            pass
+        # Entries share the server with other data and expire natively, so only hits and misses are known here
+        return self._stats(
+            "redis",
+            hits=int(hits or 0),
+            misses=int(misses or 0),
+            serverUsedMemory=int(info["used_memory"]) if "used_memory" in info else None,
+        )
+
+    def close(self) -> None:
+        counts = self._take_counts(force=True)
+        if counts:
+            try:
+                self.client.pipeline(*counts)
+            except (RespError, OSError) as exc:
+                logger.warning(f"Dropping preview store counters: {exc}")
+        self.client.close()
+
+
+def create_preview_store(backend: str, max_bytes: int, ttl: float, path: Optional[str] = None, redis_url: Optional[str] = None) -> PreviewStore:
+    """Build the configured backend (``memory``, ``sqlite`` or ``redis``)."""
+    backend = (backend or "memory").lower()
+    if backend == "memory":
+        return MemoryPreviewStore(max_bytes=max_bytes, ttl=ttl)
+    if backend == "sqlite":
+        path = path or os.path.join(tempfile.gettempdir(), "kingpins-previews.sqlite3")
+        return SQLitePreviewStore(path, max_bytes=max_bytes, ttl=ttl)
+    if backend == "redis":
+        return RedisPreviewStore(redis_url or "redis://localhost:6379/0", max_bytes=max_bytes, ttl=ttl)
+    raise ValueError(f"Unknown preview store backend: {backend}")
@@ -3,28 +3,55 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import requests
 from flask import current_app
 
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.metrics import stage
+from utils.supersede import CancelToken, Superseded, abortable_session
+
 logger = logging.getLogger(__name__)
 
 
-def request_suggestions(code: str, lint_report: List[Dict[str, Any]], language: str = "javascript") -> Dict[str, Any]:
+# Upper bound for one inference call, further limited by the request deadline
+SUGGESTION_TIMEOUT = 15
+
+
+def request_suggestions(
+    code: str,
+    lint_report: List[Dict[str, Any]],
+    language: str = "javascript",
+    deadline: Optional[Deadline] = None,
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
     settings = current_app.config["SETTINGS"]
+    timeout = deadline.timeout("codet5", cap=SUGGESTION_TIMEOUT) if deadline else SUGGESTION_TIMEOUT
     payload = {
         "code": code,
         "language": language,
         "lintReport": lint_report,
         "model": "codet5-small",
     }
+    if cancel is not None:
+        cancel.check("codet5")
+    # With a cancel token a newer revision of the document aborts the call mid-flight
+    http = abortable_session(cancel) if cancel is not None else requests
     try:
-        response = requests.post(settings.suggestion_service_url, json=payload, timeout=15)
-        response.raise_for_status()
-        return response.json()
+        with stage("codet5", upstream="codet5"):
+            response = http.post(settings.suggestion_service_url, json=payload, timeout=timeout)
+            response.raise_for_status()
+        with stage("parse"):
+            return response.json()
     except requests.RequestException as exc:  # noqa: PERF203
-        logger.exception("Suggestion service request failed")
+        if cancel is not None and cancel.cancelled:
+            raise Superseded("codet5") from exc
+        if isinstance(exc, requests.Timeout) and timeout < SUGGESTION_TIMEOUT:
+            # The deadline, not the service's own limit, cut this call short
+            raise DeadlineExceeded("codet5") from exc
+        # Expected whenever the service is down; a traceback per call would flood the logs
+        logger.warning(f"Suggestion service request failed: {exc}")
         return {
             "suggestions": [],
             "metadata": {
@@ -32,4 +59,7 @@ def request_suggestions(code: str, lint_report: List[Dict[str, Any]], language:
                 "details": str(exc),
             },
         }
+    finally:
+        if http is not requests:
+            http.close()
 
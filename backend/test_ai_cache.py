@@ -0,0 +1,45 @@
+"""Tests for the exact and normalized AI lint cache (services/ai_cache.py)."""
+
+from services.ai_cache import SemanticCache, fingerprint, tokenize_source
+
+JS = "function total(items) {\n  // sum prices\n  var sum = 0;\n  for (const item of items) sum += item.price;\n  return sum;\n}\n"
+JS_FIXED = "function total(items) {\n  // sum prices\n  let sum = 0;\n  for (const item of items) sum += item.price;\n  return sum;\n}\n"
+OUTPUT = {"issues": [{"line": 3, "message": "Use let"}], "explanation": "Prefer let.", "formatted_code": JS_FIXED}
+
+
+def js_fingerprint(code: str) -> str:
+    return fingerprint(tokenize_source(code, "javascript"), rename=False)
+
+
+def test_exact_hits_are_shared_between_users():
+    cache = SemanticCache()
+    cache.store(JS, "javascript", OUTPUT, "alice")
+    assert cache.lookup(JS, "javascript", "bob") == (OUTPUT, "exact")
+
+
+def test_normalized_hit_reapplies_the_fix_for_the_same_user_only():
+    cache = SemanticCache()
+    cache.store(JS, "javascript", OUTPUT, "alice")
+    reformatted = JS.replace("  ", "    ").replace("// sum prices", "// add up")
+    output, level = cache.lookup(reformatted, "javascript", "alice")
+    assert level == "normalized"
+    assert "// add up" in output["formatted_code"] and "let sum = 0;" in output["formatted_code"]
+    # Bob must not be served Alice's explanation of her code
+    assert cache.lookup(reformatted, "javascript", "bob") is None
+    assert cache.stats()["normalizedHits"] == 1
+
+
+def test_renamed_identifiers_are_mapped_when_enabled():
+    cache = SemanticCache(rename_identifiers=True)
+    cache.store("def f(x):\n    return x+1\n", "python", {"formatted_code": "def f(x):\n    return x + 1\n"}, "alice")
+    output, level = cache.lookup("def g(y):\n    return y+1\n", "python", "alice")
+    assert (level, output["formatted_code"]) == ("normalized", "def g(y):\n    return y + 1\n")
+
+
+def test_javascript_line_breaks_that_change_meaning_are_kept():
+    # ASI turns the first into "return; {a: 1}"
+    assert js_fingerprint("function f() {\n  return\n  {a: 1}\n}\n") != js_fingerprint("function f() {\n  return {a: 1}\n}\n")
+    assert js_fingerprint("a = b\n++c\n") != js_fingerprint("a = b++\nc\n")
+    assert js_fingerprint("x = 1 /* one\n */\ny = 2\n") != js_fingerprint("x = 1 /* one */ y = 2\n")
+    # Indentation, blank lines and comments still do not matter
+    assert js_fingerprint("if (a) {\n  b();\n}\n") == js_fingerprint("\n// check\nif (a) {\n\n        b();\n}")
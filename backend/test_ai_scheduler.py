@@ -0,0 +1,96 @@
+"""Tests for per-user quotas and fair queueing in services/ai_scheduler.py."""
+
+import threading
+import time
+
+import pytest
+
+from services.ai_scheduler import AIScheduler, QuotaExceeded
+from utils.supersede import CancelToken, Superseded
+
+
+def hold_slot(scheduler: AIScheduler, uid: str = "holder"):
+    """Occupy the scheduler's only slot until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def run():
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=scheduler.submit, args=(uid, 1, run))
+    thread.start()
+    assert started.wait(5)
+    return release, thread
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_small_requests_are_not_starved_by_a_heavy_user():
+    scheduler = AIScheduler(max_concurrency=1, max_queue_per_user=10)
+    release, holder = hold_slot(scheduler)
+    order = []
+    threads = []
+    for uid, cost in [("heavy", 5000), ("heavy", 5000), ("heavy", 5000), ("light", 100)]:
+        thread = threading.Thread(target=scheduler.submit, args=(uid, cost, lambda uid=uid: order.append(uid)))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: scheduler.stats()["queued"] == len(threads))
+    release.set()
+    for thread in [holder, *threads]:
+        thread.join(5)
+    # The light user's call finishes earliest in virtual time, so it overtakes the queued heavy calls
+    assert order.index("light") < 2
+    assert order.count("heavy") == 3
+
+
+def test_over_quota_is_rejected_with_retry_after():
+    scheduler = AIScheduler(requests_per_minute=2, tokens_per_minute=1000)
+    assert scheduler.submit("alice", 10, lambda: "ok") == "ok"
+    assert scheduler.submit("alice", 10, lambda: "ok") == "ok"
+    with pytest.raises(QuotaExceeded) as excinfo:
+        scheduler.submit("alice", 10, lambda: "ok")
+    assert excinfo.value.reason == "request rate"
+    assert excinfo.value.retry_after >= 1
+    assert scheduler.submit("bob", 10, lambda: "ok") == "ok"
+    with pytest.raises(QuotaExceeded, match="alice"):
+        scheduler.submit("alice", 10, lambda: "ok")
+    assert scheduler.stats()["rejected"] == 2
+
+
+def test_queue_timeout_refunds_tokens():
+    scheduler = AIScheduler(max_concurrency=1, tokens_per_minute=1000, queue_timeout=0.05)
+    release, holder = hold_slot(scheduler)
+    with pytest.raises(QuotaExceeded, match="queue wait timeout"):
+        scheduler.submit("alice", 900, lambda: "never")
+    release.set()
+    holder.join(5)
+    # Had the 900 tokens not been refunded, this call would be over the token rate
+    assert scheduler.submit("alice", 900, lambda: "ok") == "ok"
+    assert scheduler.stats("alice")["users"]["alice"]["rejected"] == 1
+
+
+def test_cancelled_call_refunds_tokens():
+    scheduler = AIScheduler(max_concurrency=1, tokens_per_minute=1000)
+    release, holder = hold_slot(scheduler)
+    cancel = CancelToken("alice", "doc", revision=1)
+    threading.Timer(0.05, cancel.cancel, args=(2,)).start()
+    with pytest.raises(Superseded):
+        scheduler.submit("alice", 900, lambda: "never", cancel=cancel)
+    release.set()
+    holder.join(5)
+    assert scheduler.submit("alice", 900, lambda: "ok") == "ok"
+
+
+def test_idle_users_are_forgotten():
+    scheduler = AIScheduler(requests_per_minute=6000, tokens_per_minute=600000, idle_timeout=0.05)
+    scheduler.submit("alice", 1, lambda: None)
+    assert "alice" in scheduler.stats()["users"]
+    time.sleep(0.1)
+    scheduler.submit("bob", 1, lambda: None)
+    assert list(scheduler.stats()["users"]) == ["bob"]
+    assert scheduler.stats()["rejected"] == 0
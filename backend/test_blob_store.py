@@ -0,0 +1,69 @@
+"""Tests for content-addressed source blobs (services/blob_store.py, /api/blobs and /blobs)."""
+
+import pytest
+from flask import Flask
+
+import preview_server
+from routes.blobs import blobs_bp
+from services.blob_store import BlobMissing, BlobStore, BlobTooLarge, blob_digest
+from services.preview_store import MemoryPreviewStore
+from utils.jwt_utils import generate_jwt
+
+
+def small_store(max_bytes: int = 500) -> BlobStore:
+    return BlobStore(MemoryPreviewStore(max_bytes=max_bytes, ttl=60))
+
+
+@pytest.fixture
+def api():
+    app = Flask(__name__)
+    app.config["BLOB_STORE"] = small_store()
+    app.register_blueprint(blobs_bp)
+    with app.app_context():
+        token = generate_jwt({"uid": "alice"})
+    return app.test_client(), {"Authorization": f"Bearer {token}"}
+
+
+def test_inline_code_is_remembered_per_owner():
+    store = small_store()
+    code = "print('hi')\n"
+    assert store.resolve("alice", {"code": code}) == code
+    assert store.resolve("alice", {"code_ref": blob_digest(code)}) == code
+    assert store.missing("alice", [blob_digest(code)]) == []
+    with pytest.raises(BlobMissing):
+        store.resolve("bob", {"code_ref": blob_digest(code)})
+
+
+def test_put_rejects_wrong_digest_and_oversized_blobs():
+    store = small_store()
+    with pytest.raises(ValueError):
+        store.put("alice", "a = 1\n", "0" * 64)
+    with pytest.raises(BlobTooLarge, match="Blob is"):
+        store.put("alice", "x" * 2000)
+    # Too large to remember, but still served inline
+    assert store.resolve("alice", {"code": "y" * 2000}) == "y" * 2000
+
+
+def test_api_put_oversized_blob_is_413(api):
+    client, headers = api
+    code = "x" * 2000
+    response = client.put(f"/api/blobs/{blob_digest(code)}", data=code, headers=headers)
+    assert response.status_code == 413
+    assert "Blob is" in response.get_json()["error"]
+
+
+def test_api_put_and_check(api):
+    client, headers = api
+    code = "const a = 1;\n"
+    digest = blob_digest(code)
+    assert client.put(f"/api/blobs/{'0' * 64}", data=code, headers=headers).status_code == 400
+    assert client.put(f"/api/blobs/{digest}", data=code, headers=headers).status_code == 201
+    checked = client.post("/api/blobs/check", json={"hashes": [digest, "1" * 64]}, headers=headers).get_json()
+    assert checked == {"present": [digest], "missing": ["1" * 64]}
+
+
+def test_preview_server_put_oversized_blob_is_413(monkeypatch):
+    monkeypatch.setattr(preview_server, "_blob_store", small_store())
+    code = "x" * 2000
+    response = preview_server.app.test_client().put(f"/blobs/{blob_digest(code)}", data=code)
+    assert response.status_code == 413
@@ -0,0 +1,61 @@
+"""Tests for the shared ``Document`` cache and per-document memoisation (services/document.py)."""
+
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from services import document
+from services.document import load_document
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(document, "_cache", OrderedDict())
+    monkeypatch.setattr(document, "_cache_chars", 0)
+
+
+def test_the_same_text_shares_one_document():
+    first = load_document("x = 1\n")
+    assert load_document("x = 1\n") is first
+    assert first.lines is first.lines
+    assert load_document("x = 2\n") is not first
+
+
+def test_least_recently_used_documents_are_evicted(monkeypatch):
+    monkeypatch.setattr(document, "DOCUMENT_CACHE_ENTRIES", 2)
+    a, b = load_document("a"), load_document("b")
+    load_document("a")
+    load_document("c")
+    assert load_document("a") is a
+    assert load_document("b") is not b
+
+
+def test_cache_is_bounded_by_characters(monkeypatch):
+    monkeypatch.setattr(document, "DOCUMENT_CACHE_CHARS", 10)
+    big = load_document("x" * 11)
+    assert load_document("x" * 11) is not big
+    load_document("a" * 6)
+    load_document("b" * 6)
+    assert list(document._cache) == ["b" * 6] and document._cache_chars == 6
+
+
+def test_memo_computes_each_key_once_across_threads():
+    doc = load_document("def f():\n    pass\n")
+    calls = []
+    gate = threading.Event()
+
+    def factory():
+        calls.append(1)
+        gate.wait(5)
+        return "masked"
+
+    threads = [threading.Thread(target=doc.memo, args=("masked", factory)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert doc.memo("masked", factory) == "masked"
+    assert len(calls) == 1
+    assert [definition.name for definition in doc.definitions] == ["f"]
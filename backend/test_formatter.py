@@ -0,0 +1,17 @@
+"""Regression checks for the built-in formatters in services/formatter.py."""
+
+from services.formatter import format_code
+
+
+def test_javascript_keeps_backslash_continued_strings():
+    source = "function f() {\n        var s = 'abc\\\n        def';\n}\n"
+    formatted = format_code(source, "javascript").formatted
+    assert formatted == "function f() {\n  var s = 'abc\\\n        def';\n}\n"
+    assert format_code(formatted, "javascript").formatted == formatted
+
+
+def test_html_script_keeps_backslash_continued_strings():
+    source = '<script>\nfunction f() {\n        var s = "abc\\\n        def";\n}\n</script>\n'
+    formatted = format_code(source, "html").formatted
+    assert formatted == '<script>\n  function f() {\n    var s = "abc\\\n        def";\n  }\n</script>\n'
+    assert format_code(formatted, "html").formatted == formatted
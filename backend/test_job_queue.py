@@ -0,0 +1,77 @@
+"""Tests for the background job queue (services/job_queue.py) and how serve.py runs it."""
+
+import threading
+import time
+
+import pytest
+
+import serve
+from services.job_queue import JobQueue, QueueFull
+
+ALICE = {"uid": "alice"}
+
+
+def finished(queue: JobQueue, job_id: str, owner: str = "alice") -> dict:
+    snapshot = queue.get(job_id, owner)
+    while snapshot["status"] not in ("succeeded", "failed"):
+        snapshot = queue.wait(job_id, owner, snapshot["version"], timeout=5)
+    return snapshot
+
+
+def test_job_runs_and_reports_result():
+    queue = JobQueue(workers=1)
+    queue.register("echo", lambda user, payload: ({"uid": user["uid"], **payload}, 200))
+    job = queue.submit(ALICE, "echo", {"n": 1})
+    snapshot = finished(queue, job.id)
+    assert snapshot["status"] == "succeeded"
+    assert snapshot["result"] == {"uid": "alice", "n": 1}
+    assert snapshot["httpStatus"] == 200
+    assert queue.get(job.id, "bob") is None
+
+
+def test_error_status_and_crash_fail_the_job():
+    queue = JobQueue(workers=1)
+    queue.register("reject", lambda user, payload: ({"error": "quota"}, 429))
+    queue.register("crash", lambda user, payload: 1 / 0)
+    rejected = finished(queue, queue.submit(ALICE, "reject", {}).id)
+    assert (rejected["status"], rejected["httpStatus"], rejected["error"]) == ("failed", 429, "quota")
+    crashed = finished(queue, queue.submit(ALICE, "crash", {}).id)
+    assert (crashed["status"], crashed["httpStatus"]) == ("failed", 500)
+    assert queue.stats()["failed"] == 2
+
+
+def test_unknown_kind_and_full_queue():
+    started, release = threading.Event(), threading.Event()
+
+    def block(user, payload):
+        started.set()
+        release.wait(5)
+        return {}, 200
+
+    queue = JobQueue(workers=1, max_pending=1)
+    queue.register("block", block)
+    with pytest.raises(ValueError):
+        queue.submit(ALICE, "nope", {})
+    queue.submit(ALICE, "block", {})
+    assert started.wait(5)
+    queue.submit(ALICE, "block", {})
+    with pytest.raises(QueueFull):
+        queue.submit(ALICE, "block", {})
+    release.set()
+
+
+def test_results_expire_after_ttl():
+    queue = JobQueue(workers=1, result_ttl=0)
+    queue.register("echo", lambda user, payload: ({}, 200))
+    job = queue.submit(ALICE, "echo", {})
+    deadline = time.time() + 5
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.status == "succeeded"
+    assert queue.get(job.id, "alice") is None
+
+
+def test_serve_runs_one_api_worker():
+    # Jobs are per process, so a job polled through a second worker would be a 404
+    assert serve.parse_args(["api", "--workers", "5"]).workers == 1
+    assert serve.parse_args(["api"]).threads >= 16
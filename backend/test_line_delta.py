@@ -0,0 +1,51 @@
+"""Tests for incremental preview uploads (``apply_line_delta`` and ``POST /preview`` with a delta)."""
+
+import hashlib
+
+import pytest
+
+import preview_server
+from preview_server import apply_line_delta
+
+BASE = "<h1>Title</h1>\r\n<p>one</p>\n<p>two</p>\n<p>three</p>"
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def test_edits_replace_base_line_ranges():
+    delta = [{"start": 0, "end": 1, "text": "<h1>New</h1>\n"}, {"start": 2, "end": 2, "text": "<hr>\n"}, {"start": 3, "end": 4, "text": ""}]
+    assert apply_line_delta(BASE, delta) == "<h1>New</h1>\n<p>one</p>\n<hr>\n<p>two</p>\n"
+    assert apply_line_delta(BASE, []) == BASE
+
+
+@pytest.mark.parametrize("delta", [
+    [{"start": 1, "end": 2, "text": ""}, {"start": 0, "end": 1, "text": ""}],
+    [{"start": 2, "end": 1, "text": ""}],
+    [{"start": 0, "end": 5, "text": ""}],
+])
+def test_unordered_or_out_of_bounds_edits_are_rejected(delta):
+    with pytest.raises(ValueError):
+        apply_line_delta(BASE, delta)
+
+
+def test_delta_upload_falls_back_to_full_code_when_it_cannot_apply():
+    client = preview_server.app.test_client()
+    full = client.post("/preview", json={"preview_id": "delta-test", "code": BASE, "filename": "index.html", "type": "html"})
+    assert full.status_code == 200
+    base_hash = full.get_json()["code_hash"]
+
+    edit = [{"start": 1, "end": 2, "text": "<p>uno</p>\n"}]
+    expected = BASE.replace("one", "uno")
+    updated = client.post("/preview", json={"preview_id": "delta-test", "base_hash": base_hash, "delta": edit, "code_hash": code_hash(expected)})
+    assert updated.status_code == 200 and updated.get_json()["code_hash"] == code_hash(expected)
+
+    # The base moved on, the hash disagrees, or the edit is malformed: the client must resend
+    for body in (
+        {"base_hash": base_hash, "delta": edit},
+        {"base_hash": code_hash(expected), "delta": edit, "code_hash": "0" * 64},
+        {"base_hash": code_hash(expected), "delta": [{"start": 1}]},
+    ):
+        response = client.post("/preview", json={"preview_id": "delta-test", **body})
+        assert response.status_code == 409 and response.get_json()["status"] == "send_full"
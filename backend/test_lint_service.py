@@ -0,0 +1,30 @@
+"""Tests for engine selection in services/lint_service.py, the native checks and lint_cli caching."""
+
+import lint_cli
+from services import lint_service
+from services.lint_service import resolve_engine, run_lint_checks
+
+
+def test_augmented_assignment_reads_the_variable():
+    code = "def count(items):\n    n = 0\n    for _ in items:\n        n += 1\n    unused = 2\n"
+    messages = [finding["message"] for finding in run_lint_checks(code, "python", engine="native")]
+    assert messages == ["Unused variable 'unused'"]
+
+
+def test_languages_without_a_tool_never_reach_the_subprocess_engine(monkeypatch):
+    def run_tool(*args):
+        raise AssertionError("ran an external linter")
+
+    monkeypatch.setattr(lint_service, "_run_tool", run_tool)
+    assert resolve_engine("subprocess", "css") == "native"
+    assert resolve_engine("subprocess", "javascript") == "subprocess"
+    assert run_lint_checks("a { color: red; }", "css", engine="subprocess") == run_lint_checks("a { color: red; }", "css", engine="native")
+
+
+def test_placeholder_results_are_not_cached(tmp_path, monkeypatch):
+    (tmp_path / "app.js").write_text("console.log(1);\n")
+    monkeypatch.setenv("PATH", str(tmp_path))  # no eslint
+    cache = lint_cli.LintCache(None, "test")
+    report = lint_cli.lint_paths([tmp_path], "subprocess", 1, cache, [], tmp_path)
+    assert lint_service.is_placeholder(report["results"][0]["diagnostics"])
+    assert cache.results == {} and cache.files == {}
@@ -0,0 +1,55 @@
+"""Tests for document sync and code actions in lsp_server.py."""
+
+import io
+import json
+import threading
+import time
+
+import lsp_server
+from lsp_server import LanguageServer, TextDocument, split_lines
+
+
+def test_lines_split_only_where_lsp_does():
+    text = "a = 1  # \x0c form feed\r\nb = ' '\rc\n"
+    assert split_lines(text) == ["a = 1  # \x0c form feed\r\n", "b = ' '\r", "c\n"]
+    assert split_lines("") == []
+    document = TextDocument("file:///a.py", "python", 1, text)
+    document.apply_change({"range": {"start": {"line": 2, "character": 0}, "end": {"line": 2, "character": 1}}, "text": "d"})
+    assert document.lines == ["a = 1  # \x0c form feed\r\n", "b = ' '\r", "d\n"]
+
+
+def messages(output: io.BytesIO) -> list:
+    body = output.getvalue().decode("utf-8")
+    return [json.loads(part[part.index("{"):]) for part in body.split("Content-Length")[1:]]
+
+
+def test_code_action_does_not_block_document_sync(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def slow_suggestions(code, report, language):
+        calls.append(code)
+        release.wait(5)
+        return {"suggestions": [{"line": 1, "message": "Use const", "replacement": "const x = 1;"}]}
+
+    monkeypatch.setattr(lsp_server, "request_suggestions", slow_suggestions)
+    output = io.BytesIO()
+    server = LanguageServer(output, engine="native", debounce=0)
+    server.handle({"id": 1, "method": "initialize", "params": {}})
+    uri = "file:///a.js"
+    server.handle({"method": "textDocument/didOpen", "params": {"textDocument": {"uri": uri, "languageId": "javascript", "version": 1, "text": "var x = 1;\n"}}})
+    action = {"textDocument": {"uri": uri}, "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 0}}}
+    server.handle({"id": 2, "method": "textDocument/codeAction", "params": action})
+    server.handle({"id": 3, "method": "textDocument/codeAction", "params": action})
+    # The dispatch loop is free while the suggestion service is still answering
+    server.handle({"id": 4, "method": "textDocument/formatting", "params": {"textDocument": {"uri": uri}}})
+    assert any(message.get("id") == 4 for message in messages(output))
+    release.set()
+    deadline = time.monotonic() + 5
+    results = {}
+    while not {2, 3} <= results.keys() and time.monotonic() < deadline:
+        time.sleep(0.01)
+        results = {message["id"]: message["result"] for message in messages(output) if "id" in message}
+    assert results[2] == results[3]
+    assert results[2][0]["edit"]["changes"][uri][0]["newText"] == "const x = 1;"
+    assert len(calls) == 1
@@ -0,0 +1,107 @@
+"""Tests for the preview store backends (services/preview_store.py)."""
+
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeRespServer
+from services.preview_store import (
+    STATS_KEYS,
+    MemoryPreviewStore,
+    PreviewEntry,
+    PreviewTooLarge,
+    RedisPreviewStore,
+    SQLitePreviewStore,
+)
+
+
+def entry(code: str, etag: str = "") -> PreviewEntry:
+    return PreviewEntry(code=code, filename="index.html", type="html", body=code.encode(), etag=etag or f"e-{code[:8]}")
+
+
+@pytest.fixture(scope="module")
+def resp_server():
+    server = FakeRespServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def make_store(request, tmp_path, resp_server):
+    def make(**options):
+        if request.param == "memory":
+            return MemoryPreviewStore(**options)
+        if request.param == "sqlite":
+            return SQLitePreviewStore(str(tmp_path / "previews.db"), **options)
+        return RedisPreviewStore(resp_server.url, prefix=f"test:{time.monotonic_ns()}:", **options)
+
+    return make
+
+
+def test_put_get_delete_and_etag(make_store):
+    store = make_store()
+    assert store.get("a") is None and store.etag("a") is None
+    store.put("a", entry("<p>a</p>", etag="v1"))
+    assert store.get("a").code == "<p>a</p>"
+    assert store.etag("a") == "v1"
+    assert store.delete("a")
+    assert store.get("a") is None and store.etag("a") is None
+
+
+def test_entries_expire(make_store):
+    store = make_store(ttl=0.05)
+    store.put("a", entry("<p>a</p>"))
+    time.sleep(0.1)
+    assert store.get("a") is None and store.etag("a") is None
+
+
+def test_stats_have_the_same_keys_and_count_reads_but_not_etag_polls(make_store):
+    store = make_store()
+    store.put("a", entry("<p>a</p>"))
+    store.get("a")
+    store.get("a")
+    store.get("missing")
+    store.etag("a")
+    stats = store.stats()
+    assert set(stats) == set(STATS_KEYS) | {"backend"}
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    with pytest.raises(PreviewTooLarge):
+        store.put("big", entry("x" * (store.max_bytes + 1)))
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_least_recently_used_entries_are_evicted(backend, tmp_path):
+    size = entry("x" * 1000).size
+    options = {"max_bytes": 3 * size}
+    store = MemoryPreviewStore(**options) if backend == "memory" else SQLitePreviewStore(str(tmp_path / "lru.db"), access_flush_interval=0, **options)
+    for key in "abc":
+        store.put(key, entry(key * 1000))
+        time.sleep(0.01)
+    store.get("a")
+    store.put("d", entry("d" * 1000))
+    assert store.get("b") is None
+    assert all(store.get(key) is not None for key in "acd")
+    assert store.stats()["evictions"] == 1
+
+
+def test_sqlite_reads_are_batched(tmp_path):
+    store = SQLitePreviewStore(str(tmp_path / "batched.db"), access_flush_interval=3600)
+    store.put("a", entry("<p>a</p>"))
+    store.get("a")
+    other = SQLitePreviewStore(str(tmp_path / "batched.db"))
+    # Not written yet, then flushed by stats() in the reading process
+    assert other.stats()["hits"] == 0
+    assert store.stats()["hits"] == 1
+
+
+def test_redis_read_is_one_round_trip(resp_server):
+    store = RedisPreviewStore(resp_server.url, prefix="test:round-trips:", access_flush_interval=0)
+    store.put("a", entry("<p>a</p>"))
+    calls = []
+    pipeline = store.client.pipeline
+    store.client.pipeline = lambda *commands: calls.append([command[0] for command in commands]) or pipeline(*commands)
+    store.get("a")
+    store.get("a")
+    # The first read's hit rides along with the second GET
+    assert calls == [["GET"], ["GET", "INCRBY"]]
+    assert store.stats()["hits"] == 2
@@ -0,0 +1,60 @@
+"""Tests for on-demand request profiles (utils/profiling.py)."""
+
+import threading
+import tracemalloc
+
+from flask import Flask
+
+from utils.profiling import _OVERLAP, CPU_SCOPE, ProfileStore, RequestProfiler
+
+
+def run_profile(mode: str, fn=lambda: [0] * 10000):
+    store = ProfileStore()
+    with Flask(__name__).test_request_context("/api/format"):
+        RequestProfiler(store, {}).run("format", mode, "header", {"uid": "alice"}, fn)
+    return store.summaries()[0]["id"], store
+
+
+def test_memory_profile_reports_its_own_peak():
+    profile_id, store = run_profile("all")
+    profile = store.get(profile_id)
+    assert profile["peakMemoryBytes"] > 0
+    assert (profile["cpuScope"], profile["memoryScope"]) == (CPU_SCOPE, "process")
+    assert not tracemalloc.is_tracing()
+
+
+def test_an_existing_tracer_keeps_its_peak():
+    tracemalloc.start()
+    try:
+        before = [0] * 100000
+        peak = tracemalloc.get_traced_memory()[1]
+        del before
+        profile_id, store = run_profile("memory")
+        assert tracemalloc.get_traced_memory()[1] >= peak
+        assert store.get(profile_id)["peakMemoryBytes"] is None
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_requests_running_alongside_a_profile_are_counted():
+    started, release = threading.Event(), threading.Event()
+
+    def other_request():
+        _OVERLAP.enter()
+        started.set()
+        release.wait(5)
+        _OVERLAP.leave()
+
+    thread = threading.Thread(target=other_request)
+    thread.start()
+    assert started.wait(5)
+    _OVERLAP.enter()  # the profiled request itself, as profiled() does
+    try:
+        profile_id, store = run_profile("cpu", release.set)
+    finally:
+        _OVERLAP.leave()
+    thread.join(5)
+    assert store.get(profile_id)["overlappingRequests"] == 1
+    profile_id, store = run_profile("cpu")
+    assert store.get(profile_id)["overlappingRequests"] == 0
@@ -0,0 +1,105 @@
+"""Content-encoding helpers (gzip always, brotli when the package is installed)."""
+
+from __future__ import annotations
+
+import gzip
+from typing import Dict, Iterable, Optional
+
+from flask import Flask, Response, request
+
+from utils.metrics import stage
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are not worth the CPU or the extra header bytes.
+MIN_COMPRESS_BYTES = 512
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/javascript", "image/svg+xml")
+
+
+def available_encodings() -> list[str]:
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        if brotli is None:
+            raise ValueError("brotli is not installed")
+        # Quality 5 keeps per-update cost low while still beating gzip on HTML/CSS.
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def precompress(body: bytes) -> Dict[str, bytes]:
+    """Return every available encoding of ``body`` that is actually smaller."""
+    if len(body) < MIN_COMPRESS_BYTES:
+        return {}
+    variants = {}
+    for encoding in available_encodings():
+        encoded = compress(body, encoding)
+        if len(encoded) < len(body):
+            variants[encoding] = encoded
+    return variants
+
+
+def negotiate_encoding(accept_encoding: str, available: Iterable[str]) -> Optional[str]:
+    """Pick the best of ``available`` the client accepts (brotli preferred), or None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _compressible(response: Response) -> bool:
+    mimetype = response.mimetype or ""
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def init_compression(app: Flask, min_bytes: int = MIN_COMPRESS_BYTES) -> None:
+    """Compress buffered text/JSON responses of ``app`` above ``min_bytes`` per ``Accept-Encoding``.
+
+    Streamed responses (Server-Sent Events, file passthrough) are left untouched.
+    """
+
+    @app.after_request
+    def _compress_response(response: Response) -> Response:
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or not _compressible(response)
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        body = response.get_data()
+        if len(body) < min_bytes:
+            return response
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""), available_encodings())
+        if encoding is None:
+            return response
+        with stage("compress"):
+            encoded = compress(body, encoding)
+        if len(encoded) >= len(body):
+            return response
+        response.set_data(encoded)
+        response.headers["Content-Encoding"] = encoding
+        return response
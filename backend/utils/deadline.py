@@ -0,0 +1,72 @@
+"""Per-request deadlines shared by every stage of a request.
+
+Clients send their remaining budget in ``X-Request-Timeout-Ms``; otherwise the
+configured default applies. Each stage asks the deadline for its timeout instead
+of using a fixed one, and raises ``DeadlineExceeded`` when the budget runs out so
+the route can return whatever finished in time.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+from flask import Flask, g, has_request_context, request
+
+from utils.metrics import REGISTRY
+
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+DEADLINES_EXCEEDED = REGISTRY.counter("kingpins_deadline_exceeded_total", "Request stages cut short by the request deadline.")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised by a stage that could not finish within the request deadline."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+        DEADLINES_EXCEEDED.inc(stage=stage)
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_header(cls, value: Optional[str], default: float, maximum: float) -> "Deadline":
+        try:
+            seconds = int(value) / 1000 if value else default
+        except ValueError:
+            seconds = default
+        return cls(min(max(seconds, 0.0), maximum))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, stage: str, cap: Optional[float] = None) -> float:
+        """Time ``stage`` may take: what is left of the budget, at most ``cap``."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(stage)
+        return min(remaining, cap) if cap is not None else remaining
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the current request; ``None`` outside requests (e.g. background jobs)."""
+    return g.get("deadline") if has_request_context() else None
+
+
+def init_deadlines(app: Flask, default_seconds: float, max_seconds: float) -> None:
+    @app.before_request
+    def _start_deadline():
+        g.deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER), default_seconds, max_seconds)
@@ -10,6 +10,8 @@ from typing import Any, Callable, Dict, Tuple
 import jwt
 from flask import Request, current_app, jsonify, request
 
+from utils.metrics import stage
+
 logger = logging.getLogger(__name__)
 
 def generate_jwt(payload: Dict[str, Any]) -> str:
@@ -42,6 +44,11 @@ def _extract_bearer_token(req: Request) -> Tuple[bool, str | None]:
         return True, auth_header.split(" ", 1)[1]
     return False, None
 
+def is_admin(current_user: Dict[str, Any]) -> bool:
+    settings = current_app.config.get("SETTINGS")
+    admin_uids = settings.admin_uids if settings else []
+    return current_user.get("role") == "admin" or current_user.get("uid") in admin_uids
+
 def require_jwt(fn: Callable) -> Callable:
     @wraps(fn)
     def wrapper(*args, **kwargs):
@@ -49,7 +56,8 @@ def require_jwt(fn: Callable) -> Callable:
         if not is_bearer or not token:
             return jsonify({"error": "Missing Authorization header"}), 401
         try:
-            payload = decode_jwt(token)
+            with stage("jwt"):
+                payload = decode_jwt(token)
         except jwt.PyJWTError as e:
             return jsonify({"error": "Invalid or expired token"}), 401
         return fn(*args, current_user=payload, **kwargs)
@@ -0,0 +1,211 @@
+"""Per-stage timing, Server-Timing headers and Prometheus-format metrics."""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, Response, g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelKey, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge (or counter) whose samples are read from a callback at scrape time."""
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], Dict[LabelKey, float]], kind: str = "gauge"):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            samples = self.callback()
+        except Exception:  # noqa: BLE001 - a broken collector must not break the scrape
+            logger.exception(f"Metrics callback for {self.name} failed")
+            return lines
+        for key, value in sorted(samples.items()):
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(key)} {float(value):g}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def gauge_callback(self, name: str, help_text: str, callback: Callable[[], Dict[LabelKey, float]], kind: str = "gauge") -> None:
+        with self._lock:
+            self._metrics[name] = CallbackGauge(name, help_text, callback, kind)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter("kingpins_http_requests_total", "HTTP requests by service, endpoint and status.")
+HTTP_ERRORS = REGISTRY.counter("kingpins_http_errors_total", "HTTP responses with status >= 500.")
+HTTP_LATENCY = REGISTRY.histogram("kingpins_http_request_seconds", "End-to-end request latency.")
+STAGE_LATENCY = REGISTRY.histogram("kingpins_stage_seconds", "Time spent in each request stage.")
+UPSTREAM_LATENCY = REGISTRY.histogram("kingpins_upstream_seconds", "Latency of calls to upstream services.")
+UPSTREAM_ERRORS = REGISTRY.counter("kingpins_upstream_errors_total", "Failed calls to upstream services.")
+CACHE_EVENTS = REGISTRY.counter("kingpins_cache_events_total", "Cache lookups by cache and result (hit/miss).")
+
+
+def labels(**values: Any) -> LabelKey:
+    """Label key for samples returned from ``gauge_callback`` callbacks."""
+    return _label_key(values)
+
+
+def record_stage(name: str, seconds: float, upstream: Optional[str] = None) -> None:
+    """Record a finished stage in the histograms and, inside a request, in Server-Timing."""
+    STAGE_LATENCY.observe(seconds, stage=name)
+    if upstream:
+        UPSTREAM_LATENCY.observe(seconds, upstream=upstream)
+    if has_request_context():
+        timings = g.setdefault("server_timings", {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str, upstream: Optional[str] = None) -> Iterator[None]:
+    """Time a block as a named stage; ``upstream`` also feeds the upstream histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if upstream:
+            UPSTREAM_ERRORS.inc(upstream=upstream)
+        raise
+    finally:
+        record_stage(name, time.perf_counter() - started, upstream)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_EVENTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def init_metrics(app: Flask, service: str, registry: MetricsRegistry = REGISTRY) -> None:
+    """Time every request of ``app``, add Server-Timing headers and serve ``/metrics``."""
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response: Response) -> Response:
+        started = g.pop("request_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+        HTTP_REQUESTS.inc(service=service, method=request.method, endpoint=endpoint, status=response.status_code)
+        HTTP_LATENCY.observe(elapsed, service=service, endpoint=endpoint)
+        if response.status_code >= 500:
+            HTTP_ERRORS.inc(service=service, endpoint=endpoint)
+        response.headers["Server-Timing"] = server_timing_header(g.get("server_timings", {}), elapsed)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
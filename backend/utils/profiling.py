@@ -0,0 +1,320 @@
+"""On-demand and sampled profiling of individual requests.
+
+Handlers decorated with ``@profiled(name)`` (below ``@require_jwt``) run under
+cProfile and/or tracemalloc when an admin asks for it with ``X-Profile`` or
+``?profile=`` (``cpu``, ``memory`` or ``all``), or when the request is picked by
+the endpoint's sample rate. The profile is stored in memory and its id returned
+in ``X-Profile-Id``; ``GET /api/profiles/<id>?format=collapsed`` serves folded
+stacks that flamegraph.pl, speedscope or inferno render directly.
+
+Neither tool can be limited to one thread: tracemalloc always traces the whole
+process, and so does cProfile from Python 3.12 on. Each profile therefore records
+its ``cpuScope``/``memoryScope`` and how many other profiled-endpoint requests ran
+while it did (``overlappingRequests``); treat those with overlap as process-wide.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import Flask, current_app, g, request
+
+from utils.jwt_utils import is_admin
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+MODES = {"cpu": (True, False), "memory": (False, True), "all": (True, True)}
+# Folded stacks deeper than this are cut off; their remaining time is charged to the last frame
+MAX_STACK_DEPTH = 64
+# Stack branches that account for less than this (seconds) are dropped
+MIN_BRANCH_SECONDS = 1e-6
+TOP_ENTRIES = 25
+
+PROFILES_TOTAL = REGISTRY.counter("kingpins_profiles_total", "Requests profiled, by endpoint, mode and trigger.")
+
+# cProfile and tracemalloc hook the interpreter globally on newer Pythons, so one profile runs at a time
+_PROFILE_LOCK = threading.Lock()
+
+# cProfile hooks only the calling thread before 3.12, every thread after
+CPU_SCOPE = "process" if sys.version_info >= (3, 12) else "thread"
+
+FuncKey = Tuple[str, int, str]
+
+
+class _Overlap:
+    """Counts requests to profiled endpoints so a profile can tell how many ran alongside it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._seen: Optional[int] = None
+
+    def enter(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            if self._seen is not None:
+                self._seen += 1
+
+    def leave(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def start(self) -> None:
+        with self._lock:
+            # Requests already running, less the one being profiled
+            self._seen = max(0, self._in_flight - 1)
+
+    def stop(self) -> int:
+        with self._lock:
+            seen, self._seen = self._seen or 0, None
+            return seen
+
+
+_OVERLAP = _Overlap()
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """``"lint=0.01,suggest=0.005"`` -> ``{"lint": 0.01, "suggest": 0.005}``."""
+    rates: Dict[str, float] = {}
+    for item in value.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def _label(func: FuncKey) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{lineno})"
+    # ';' separates frames and the last space separates the count in folded stacks
+    return label.replace(";", ",")
+
+
+def collapse_stats(stats: pstats.Stats) -> List[str]:
+    """Folded stacks (``root;child;leaf <microseconds>``) rebuilt from cProfile's caller graph.
+
+    cProfile only records caller/callee pairs, so a function called from several
+    places has its time split between its callers in proportion to the time each
+    pair accounts for.
+    """
+    raw = stats.stats  # type: ignore[attr-defined]
+    callees: Dict[FuncKey, Dict[FuncKey, float]] = defaultdict(dict)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+
+    folded: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def walk(func: FuncKey, path: Tuple[str, ...], on_path: frozenset, share: float) -> None:
+        _, _, self_time, total_time, _ = raw[func]
+        path = path + (_label(func),)
+        if len(path) >= MAX_STACK_DEPTH:
+            folded[path] += total_time * share
+            return
+        folded[path] += self_time * share
+        for callee, edge_time in callees.get(func, {}).items():
+            callee_total = raw[callee][3]
+            if callee in on_path or callee_total <= 0 or edge_time * share < MIN_BRANCH_SECONDS:
+                continue
+            walk(callee, path, on_path | {callee}, share * edge_time / callee_total)
+
+    for func, (_, _, _, _, callers) in raw.items():
+        if not callers:
+            walk(func, (), frozenset({func}), 1.0)
+
+    lines = []
+    for path, seconds in folded.items():
+        microseconds = int(round(seconds * 1_000_000))
+        if microseconds > 0:
+            lines.append(f"{';'.join(path)} {microseconds}")
+    return sorted(lines)
+
+
+def _top_functions(stats: pstats.Stats) -> List[Dict[str, Any]]:
+    raw = stats.stats  # type: ignore[attr-defined]
+    ranked = sorted(raw.items(), key=lambda item: item[1][3], reverse=True)[:TOP_ENTRIES]
+    return [
+        {
+            "function": _label(func),
+            "calls": calls,
+            "selfMs": round(self_time * 1000, 3),
+            "cumulativeMs": round(total_time * 1000, 3),
+        }
+        for func, (_, calls, self_time, total_time, _) in ranked
+    ]
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+    return [
+        {"location": f"{frame.filename}:{frame.lineno}", "sizeBytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:TOP_ENTRIES]
+        for frame in stat.traceback[:1]
+    ]
+
+
+class ProfileStore:
+    """Bounded, insertion-ordered store of finished profiles (oldest dropped first)."""
+
+    def __init__(self, max_entries: int = 100):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            self._profiles[profile["id"]] = profile
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        keys = ("id", "endpoint", "uid", "mode", "trigger", "startedAt", "durationMs", "peakMemoryBytes", "overlappingRequests")
+        return [{key: profile.get(key) for key in keys} for profile in reversed(profiles)]
+
+
+class RequestProfiler:
+    def __init__(self, store: ProfileStore, sample_rates: Dict[str, float], sample_mode: str = "cpu"):
+        if sample_mode not in MODES:
+            raise ValueError(f"Unknown profile mode '{sample_mode}'. Expected one of: {', '.join(MODES)}")
+        self.store = store
+        self.sample_rates = sample_rates
+        self.sample_mode = sample_mode
+
+    def choose(self, endpoint: str, current_user: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """``(mode, trigger)`` if this request should be profiled, else ``None``."""
+        requested = request.headers.get(PROFILE_HEADER) or request.args.get("profile")
+        if requested:
+            mode = "all" if requested.lower() in ("1", "true", "yes") else requested.lower()
+            if mode in MODES and is_admin(current_user):
+                return mode, "requested"
+        rate = self.sample_rates.get(endpoint, 0.0)
+        if rate > 0 and random.random() < rate:
+            return self.sample_mode, "sampled"
+        return None
+
+    def run(self, endpoint: str, mode: str, trigger: str, current_user: Dict[str, Any], fn: Callable[[], Any]) -> Any:
+        if not _PROFILE_LOCK.acquire(blocking=False):
+            logger.info(f"Skipping {mode} profile of {endpoint}: another profile is running")
+            return fn()
+        cpu, memory = MODES[mode]
+        profiler = cProfile.Profile() if cpu else None
+        owns_tracemalloc = False
+        baseline = 0
+        _OVERLAP.start()
+        try:
+            if memory:
+                owns_tracemalloc = not tracemalloc.is_tracing()
+                if owns_tracemalloc:
+                    tracemalloc.start()
+                else:
+                    # Someone else's trace: its peak is theirs to reset, so none is reported
+                    logger.info(f"tracemalloc was already tracing; profiling {endpoint} without a peak")
+                baseline = tracemalloc.get_traced_memory()[0]
+            started_at = time.time()
+            started = time.perf_counter()
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except ValueError as exc:
+                    # Another profiler (a debugger, coverage) owns the hook on Python 3.12+
+                    logger.warning(f"cProfile unavailable for {endpoint}: {exc}")
+                    profiler = None
+                    if not memory:
+                        return fn()
+            try:
+                result = fn()
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+            duration = time.perf_counter() - started
+            overlapping = _OVERLAP.stop()
+
+            profile: Dict[str, Any] = {
+                "id": uuid.uuid4().hex,
+                "endpoint": endpoint,
+                "uid": current_user.get("uid"),
+                "mode": mode,
+                "trigger": trigger,
+                "path": request.path,
+                "startedAt": started_at,
+                "durationMs": round(duration * 1000, 3),
+                "peakMemoryBytes": None,
+                "cpuScope": CPU_SCOPE if profiler is not None else None,
+                "memoryScope": "process" if memory else None,
+                "overlappingRequests": overlapping,
+            }
+            if memory:
+                if owns_tracemalloc:
+                    profile["peakMemoryBytes"] = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+                profile["topAllocations"] = _top_allocations(tracemalloc.take_snapshot())
+            if profiler is not None:
+                stats = pstats.Stats(profiler)
+                profile["topFunctions"] = _top_functions(stats)
+                profile["collapsed"] = collapse_stats(stats)
+        finally:
+            _OVERLAP.stop()
+            if owns_tracemalloc:
+                tracemalloc.stop()
+            _PROFILE_LOCK.release()
+
+        self.store.add(profile)
+        g.profile_id = profile["id"]
+        PROFILES_TOTAL.inc(endpoint=endpoint, mode=mode, trigger=trigger)
+        logger.info(f"Stored {mode} profile {profile['id']} of {endpoint} ({profile['durationMs']} ms)")
+        return result
+
+
+def profiled(endpoint: str) -> Callable:
+    """Profile the wrapped handler on request or by sampling; place it below ``@require_jwt``."""
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, current_user, **kwargs):
+            profiler: Optional[RequestProfiler] = current_app.config.get("PROFILER")
+            _OVERLAP.enter()
+            try:
+                choice = profiler.choose(endpoint, current_user) if profiler else None
+                if choice is None:
+                    return fn(*args, current_user=current_user, **kwargs)
+                mode, trigger = choice
+                return profiler.run(endpoint, mode, trigger, current_user, lambda: fn(*args, current_user=current_user, **kwargs))
+            finally:
+                _OVERLAP.leave()
+
+        return wrapper
+
+    return decorator
+
+
+def init_profiling(app: Flask, max_entries: int, sample_rates: Dict[str, float], sample_mode: str) -> None:
+    app.config["PROFILER"] = RequestProfiler(ProfileStore(max_entries), sample_rates, sample_mode)
+
+    @app.after_request
+    def _profile_header(response):
+        profile_id = g.get("profile_id")
+        if profile_id:
+            response.headers[PROFILE_ID_HEADER] = profile_id
+        return response
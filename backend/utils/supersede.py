@@ -0,0 +1,246 @@
+"""Cancel in-flight work for a document once a newer revision of it arrives.
+
+Editors send ``documentId`` and ``revision`` (in the body, or ``X-Document-Id`` /
+``X-Document-Revision``) with every lint/suggest request. Handlers decorated with
+``@supersedable(name)`` (below ``@require_jwt``) register a ``CancelToken`` for
+``(user, document)``; a request carrying a higher revision cancels every older
+one still running. Cancelling runs the callbacks each stage registered (kill the
+linter, shut the upstream socket) and the stage raises ``Superseded``, which the
+decorator turns into a small 409 ``{"status": "superseded"}`` response.
+
+Requests for the same revision (a lint and a suggest for the same text) do not
+cancel each other. The registry is per process: with several gunicorn workers
+only requests that land on the same worker supersede one another.
+"""
+
+from __future__ import annotations
+
+import logging
+import socket
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import requests
+from flask import Flask, current_app, g, has_request_context, jsonify, request
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_HEADER = "X-Document-Id"
+REVISION_HEADER = "X-Document-Revision"
+# Documents remembered per process; idle ones are forgotten oldest first
+MAX_DOCUMENTS = 10_000
+
+SUPERSEDED_TOTAL = REGISTRY.counter("kingpins_superseded_total", "Requests cancelled by a newer revision of the same document, by endpoint and stage.")
+
+
+class Superseded(Exception):
+    """Raised by a stage whose request was cancelled by a newer revision."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Superseded during {stage}")
+        self.stage = stage
+
+
+class CancelToken:
+    def __init__(self, uid: str, document_id: str, revision: int):
+        self.uid = uid
+        self.document_id = document_id
+        self.revision = revision
+        self.superseded_by: Optional[int] = None
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, revision: int) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.superseded_by = revision
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:  # noqa: BLE001 - one failing callback must not keep the others from running
+                logger.exception(f"Cancel callback failed for document {self.document_id}")
+
+    def on_cancel(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """Run ``callback`` when cancelled (now, if already cancelled); returns a function that unregisters it."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback: Callable[[], Any]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self, stage: str) -> None:
+        if self.cancelled:
+            raise Superseded(stage)
+
+
+@dataclass
+class _DocumentState:
+    latest: int
+    active: Set[CancelToken] = field(default_factory=set)
+
+
+class SupersedeRegistry:
+    def __init__(self, max_documents: int = MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        self._documents: "OrderedDict[Tuple[str, str], _DocumentState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, uid: str, document_id: str, revision: int) -> CancelToken:
+        """Register a request for ``revision``; it arrives already cancelled if a newer one was seen."""
+        token = CancelToken(uid, document_id, revision)
+        key = (uid, document_id)
+        stale: List[CancelToken] = []
+        with self._lock:
+            state = self._documents.get(key)
+            if state is None:
+                state = self._documents[key] = _DocumentState(latest=revision)
+            self._documents.move_to_end(key)
+            if revision > state.latest:
+                state.latest = revision
+                stale = [other for other in state.active if other.revision < revision]
+            latest = state.latest
+            state.active.add(token)
+            self._evict()
+        if revision < latest:
+            token.cancel(latest)
+        for other in stale:
+            logger.info(f"Revision {revision} of {document_id} supersedes revision {other.revision}")
+            other.cancel(revision)
+        return token
+
+    def end(self, token: CancelToken) -> None:
+        with self._lock:
+            state = self._documents.get((token.uid, token.document_id))
+            if state is not None:
+                state.active.discard(token)
+
+    def _evict(self) -> None:
+        if len(self._documents) <= self.max_documents:
+            return
+        for key in [key for key, state in self._documents.items() if not state.active]:
+            del self._documents[key]
+            if len(self._documents) <= self.max_documents:
+                return
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "documents": len(self._documents),
+                "active": sum(len(state.active) for state in self._documents.values()),
+            }
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    """Cancel token of the current request; ``None`` if it named no document (or outside requests)."""
+    return g.get("cancel_token") if has_request_context() else None
+
+
+def _tracking_pool(pool_cls: type, sockets: Set[socket.socket]) -> type:
+    class Connection(pool_cls.ConnectionCls):  # type: ignore[name-defined, misc]
+        def _new_conn(self):
+            sock = super()._new_conn()
+            sockets.add(sock)
+            return sock
+
+    return type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": Connection})
+
+
+def abortable_session(token: CancelToken) -> requests.Session:
+    """A ``requests`` session whose in-flight calls fail as soon as ``token`` is cancelled.
+
+    Closing a session only drops idle connections, so the socket a call is blocked
+    on is shut down directly; the call then raises ``requests.ConnectionError``.
+    """
+    sockets: Set[socket.socket] = set()
+    adapter = HTTPAdapter()
+    adapter.poolmanager.pool_classes_by_scheme = {
+        "http": _tracking_pool(HTTPConnectionPool, sockets),
+        "https": _tracking_pool(HTTPSConnectionPool, sockets),
+    }
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def abort() -> None:
+        for sock in list(sockets):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # already closed
+
+    token.on_cancel(abort)
+    return session
+
+
+def _document_revision() -> Tuple[Optional[str], Any]:
+    payload = request.get_json(force=True, silent=True)
+    payload = payload if isinstance(payload, dict) else {}
+    document_id = payload.get("documentId") or request.headers.get(DOCUMENT_HEADER)
+    revision = payload.get("revision", request.headers.get(REVISION_HEADER))
+    return (str(document_id) if document_id else None), revision
+
+
+def superseded_response(token: CancelToken, stage: str):
+    return jsonify({
+        "status": "superseded",
+        "documentId": token.document_id,
+        "revision": token.revision,
+        "supersededBy": token.superseded_by,
+        "stage": stage,
+    }), 409
+
+
+def supersedable(endpoint: str) -> Callable:
+    """Let newer revisions of the request's document cancel it; place it below ``@require_jwt``."""
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, current_user, **kwargs):
+            registry: Optional[SupersedeRegistry] = current_app.config.get("SUPERSEDE")
+            document_id, revision = _document_revision()
+            if registry is None or document_id is None:
+                return fn(*args, current_user=current_user, **kwargs)
+            try:
+                revision = int(revision)
+            except (TypeError, ValueError):
+                return jsonify({"error": "revision must be an integer when documentId is given."}), 400
+
+            token = registry.begin(current_user.get("uid") or "anonymous", document_id, revision)
+            g.cancel_token = token
+            try:
+                token.check("queued")
+                return fn(*args, current_user=current_user, **kwargs)
+            except Superseded as exc:
+                SUPERSEDED_TOTAL.inc(endpoint=endpoint, stage=exc.stage)
+                return superseded_response(token, exc.stage)
+            finally:
+                registry.end(token)
+
+        return wrapper
+
+    return decorator
+
+
+def init_supersede(app: Flask, max_documents: int = MAX_DOCUMENTS) -> None:
+    app.config["SUPERSEDE"] = SupersedeRegistry(max_documents)
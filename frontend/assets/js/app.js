@@ -45,11 +45,49 @@ const postWithAuth = async (endpoint, payload) => {
     });
     if (!response.ok) {
         const errorPayload = await response.json().catch(() => ({}));
-        throw new Error(errorPayload.error || 'API call failed');
+        const error = new Error(errorPayload.error || 'API call failed');
+        error.status = response.status;
+        error.payload = errorPayload;
+        throw error;
     }
     return response.json();
 };
 
+// SHA-256 hex of the UTF-8 source (the server's blob id); null without Web Crypto
+const sha256Hex = async (text) => {
+    if (!window.crypto?.subtle) return null;
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+};
+
+// Hashes of sources the API has already received; it keeps inline code under its hash
+const knownCodeRefs = new Set();
+
+// Like postWithAuth, but sends `code` as a `code_ref` when the server already holds it,
+// and inline again if it answers 409 send_full.
+// `revision` for supersedable requests: increasing within the page and across reloads
+// (the server remembers the latest revision per document), so newer runs cancel older ones.
+let lastRevision = 0;
+const nextRevision = () => {
+    lastRevision = Math.max(Date.now(), lastRevision + 1);
+    return lastRevision;
+};
+
+const postCodeWithAuth = async (endpoint, code, payload) => {
+    const hash = await sha256Hex(code);
+    if (hash && knownCodeRefs.has(hash)) {
+        try {
+            return await postWithAuth(endpoint, { ...payload, code_ref: hash });
+        } catch (error) {
+            if (error.status !== 409 || error.payload?.status !== 'send_full') throw error;
+            knownCodeRefs.delete(hash);
+        }
+    }
+    const result = await postWithAuth(endpoint, { ...payload, code });
+    if (hash) knownCodeRefs.add(hash);
+    return result;
+};
+
 function toggleDropdown() {
     dropdownMenu?.classList.toggle('open');
     dropdownTrigger?.setAttribute('aria-expanded', dropdownMenu?.classList.contains('open'));
@@ -153,15 +191,18 @@ async function runSuggestionPipeline() {
     placeholder.innerHTML = `<strong>[pending]</strong> Running CodeT5-small inference…`;
     suggestionListPanel.prepend(placeholder);
 
+    // Lint and suggest of one run share a revision; a later run supersedes both
+    const documentRevision = { documentId: userCodeBlock.dataset.filename || 'editor', revision: nextRevision() };
     try {
         appendConsoleMessage('Running lint checks…');
-        const lintResponse = await postWithAuth('/api/lint', { code, language: 'javascript' });
+        const lintResponse = await postCodeWithAuth('/api/lint', code, { language: 'javascript', ...documentRevision });
         appendConsoleMessage('Lint complete. Requesting suggestions…');
 
-        const suggestionResponse = await postWithAuth('/api/suggest', {
-            code,
+        // Same source as the lint call, so this one goes by reference
+        const suggestionResponse = await postCodeWithAuth('/api/suggest', code, {
             lintReport: lintResponse.lintReport ?? [],
             language: 'javascript',
+            ...documentRevision,
         });
 
         const suggestions = suggestionResponse.suggestions?.suggestions ?? [];
@@ -181,6 +222,11 @@ async function runSuggestionPipeline() {
             .join('');
         appendConsoleMessage('Suggestions updated.');
     } catch (error) {
+        if (error.payload?.status === 'superseded') {
+            // A newer run is in flight and will fill the panel
+            placeholder.remove();
+            return;
+        }
         console.error(error);
         placeholder.innerHTML = `<strong>Error</strong> ${error.message}`;
         appendConsoleMessage(error.message);
@@ -598,10 +598,84 @@ body {
     }
 }
 
+// Split keeping line endings, on "\n" only (the preview server does the same).
+function splitLines(text) {
+    return text.match(/[^\n]*\n|[^\n]+$/g) || [];
+}
+
+// Single line-range replacement turning `previous` into `next`, as
+// [{ start, end, text }] over the lines of `previous` (end exclusive).
+function computeLineDelta(previous, next) {
+    const oldLines = splitLines(previous);
+    const newLines = splitLines(next);
+    let prefix = 0;
+    while (prefix < oldLines.length && prefix < newLines.length && oldLines[prefix] === newLines[prefix]) {
+        prefix++;
+    }
+    let suffix = 0;
+    while (
+        suffix < oldLines.length - prefix &&
+        suffix < newLines.length - prefix &&
+        oldLines[oldLines.length - 1 - suffix] === newLines[newLines.length - 1 - suffix]
+    ) {
+        suffix++;
+    }
+    if (prefix === oldLines.length && prefix === newLines.length) {
+        return [];
+    }
+    return [{
+        start: prefix,
+        end: oldLines.length - suffix,
+        text: newLines.slice(prefix, newLines.length - suffix).join('')
+    }];
+}
+
+// SHA-256 of the UTF-8 source as lowercase hex, the id the servers' blob stores use.
+// null where Web Crypto is unavailable (non-secure origins); the code is then sent inline.
+async function sha256Hex(text) {
+    if (!globalThis.crypto?.subtle) return null;
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+}
+
+// Per server origin, hashes of sources it has already received (it keeps inline code under its hash)
+const knownBlobs = new Map();
+
+// POST `payload` plus the source to `url`: as `code_ref` when the server already holds
+// this text, inline otherwise, and inline again if it answers 409 send_full.
+async function postCode(url, code, payload, headers) {
+    const origin = new URL(url).origin;
+    if (!knownBlobs.has(origin)) knownBlobs.set(origin, new Set());
+    const known = knownBlobs.get(origin);
+    const hash = await sha256Hex(code);
+    const send = (body) => fetch(url, { method: 'POST', headers, body: JSON.stringify(body) });
+
+    if (hash && known.has(hash)) {
+        const response = await send({ ...payload, code_ref: hash });
+        if (response.status !== 409) return response;
+        const body = await response.clone().json().catch(() => ({}));
+        if (body.status !== 'send_full') return response;
+        // Evicted or expired on the server
+        known.delete(hash);
+    }
+    const response = await send({ ...payload, code });
+    if (hash && response.ok) known.add(hash);
+    return response;
+}
+
+// `revision` for supersedable requests: increasing within the page and across reloads
+// (the server remembers the latest revision per document), so newer requests cancel older ones.
+let lastRevision = 0;
+function nextRevision() {
+    lastRevision = Math.max(Date.now(), lastRevision + 1);
+    return lastRevision;
+}
+
 class PreviewManager {
     constructor() {
         this.previewFrame = null;
         this.currentPreviewId = null;
+        this.lastUpload = null;
     }
 
     init() {
@@ -656,28 +730,45 @@ class PreviewManager {
             
             console.log('Preview server is available, sending code...');
             
-            // Send code to preview server
-            const response = await fetch(`${PREVIEW_SERVER_URL}/preview`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    code: content,
-                    filename: filename,
-                    type: this.getFileType(filename),
-                    preview_id: 'current'
-                })
-            });
+            // Send code to preview server (the JWT scopes preview ids to this user)
+            const headers = { 'Content-Type': 'application/json' };
+            const jwtToken = localStorage.getItem('kingpins.jwt');
+            if (jwtToken) {
+                headers['Authorization'] = `Bearer ${jwtToken}`;
+            }
+            const payload = {
+                filename: filename,
+                type: this.getFileType(filename),
+                preview_id: 'current'
+            };
+            const delta = this.buildPreviewDelta(content, filename);
+            let response = null;
+            if (delta) {
+                response = await fetch(`${PREVIEW_SERVER_URL}/preview`, {
+                    method: 'POST',
+                    headers,
+                    body: JSON.stringify({ ...payload, ...delta })
+                });
+            }
+            if (!response || response.status === 409) {
+                // No delta, or the server no longer has our base version: send the whole
+                // file, by reference when the server already holds this exact text
+                response = await postCode(`${PREVIEW_SERVER_URL}/preview`, content, payload, headers);
+            }
 
             console.log('Preview server response status:', response.status);
 
             if (response.ok) {
                 const data = await response.json();
+                this.lastUpload = { filename, code: content, hash: data.code_hash };
                 console.log('Preview data received:', data);
                 this.currentPreviewId = data.preview_id;
-                // Load preview in iframe
-                const previewUrl = `${PREVIEW_SERVER_URL}/view?preview_id=${data.preview_id}`;
+                // Load preview in iframe; once loaded, the page's live-reload channel
+                // picks up further updates without re-navigating the frame
+                const previewUrl = `${PREVIEW_SERVER_URL}/view?preview_id=${encodeURIComponent(data.preview_id)}`;
+                if (this.previewFrame.src === previewUrl) {
+                    return;
+                }
                 console.log('Loading preview URL:', previewUrl);
                 this.previewFrame.src = previewUrl;
                 
@@ -703,6 +794,20 @@ class PreviewManager {
         }
     }
 
+    // `{ base_hash, delta }` against the last upload, or null when a full upload is due
+    buildPreviewDelta(content, filename) {
+        const last = this.lastUpload;
+        if (!last || !last.hash || last.filename !== filename) {
+            return null;
+        }
+        const delta = computeLineDelta(last.code, content);
+        // Only worth it when the edited lines are a small part of the file
+        if (JSON.stringify(delta).length >= content.length / 2) {
+            return null;
+        }
+        return { base_hash: last.hash, delta };
+    }
+
     getFileType(filename) {
         if (filename.endsWith('.html')) return 'html';
         if (filename.endsWith('.css')) return 'css';
@@ -818,20 +923,24 @@ class SuggestionManager {
             const language = this.getLanguageFromFilename(filename);
 
             // Call backend API
-            const response = await fetch(`${API_BASE_URL}/api/suggest`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${jwtToken}`
-                },
-                body: JSON.stringify({
-                    code: code,
-                    filename: filename,
-                    language: language,
-                    lintReport: []
-                })
+            const response = await postCode(`${API_BASE_URL}/api/suggest`, code, {
+                filename: filename,
+                language: language,
+                lintReport: [],
+                documentId: filename,
+                revision: nextRevision()
+            }, {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${jwtToken}`
             });
 
+            if (response.status === 409) {
+                const body = await response.clone().json().catch(() => ({}));
+                if (body.status === 'superseded') {
+                    // A newer request for this file is already running and will render its result
+                    return;
+                }
+            }
             if (!response.ok) {
                 throw new Error(`API error: ${response.status}`);
             }